@@ -1,12 +1,15 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from django.db.models import Count, F, Q, Avg, ExpressionWrapper, FloatField, Sum, Case, When, Value
+from django.db.models import Count, F, Q, Avg, Max, ExpressionWrapper, FloatField, Sum, Case, When, Value
 from django.db.models.functions import TruncDay
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from apps.lessons.models import Lesson, Exercise
 from apps.progress.models import LessonProgress, ExerciseSubmission
 from apps.sandbox.models import ExecutionRequest, ExecutionResult
+from apps.sandbox.output import decompress_text
+from apps.sandbox.retention import get_archived_totals, get_archived_trend
 from apps.common.permissions import IsAdminOrInstructor
 from .serializers import (
     LessonAnalyticsSerializer,
@@ -200,7 +203,7 @@ class ExerciseAnalyticsAPIView(APIView):
                 ],
                 'common_error_types': [
                     {
-                        'error_type': item['error_type'][:100],  # Limit error text to reasonable length
+                        'error_type': decompress_text(item['error_type'])[:100],  # Limit error text to reasonable length (values() returns large errors compressed)
                         'count': item['count']
                     }
                     for item in error_types
@@ -228,25 +231,34 @@ class SandboxAnalyticsAPIView(APIView):
 
     def get(self, request):
         try:
-            # Get basic counts
-            total_executions = ExecutionRequest.objects.count()
-            successful_executions = ExecutionRequest.objects.filter(status='completed').count()
-            failed_executions = ExecutionRequest.objects.filter(status='failed').count()
+            # Get basic counts (archived executions only remain as ArchivedExecutionStats counters)
+            archived = get_archived_totals()
+            total_executions = ExecutionRequest.objects.count() + archived['total']
+            successful_executions = ExecutionRequest.objects.filter(status='completed').count() + archived['completed']
+            failed_executions = ExecutionRequest.objects.filter(status='failed').count() + archived['failed']
             success_rate = (successful_executions / total_executions) * 100 if total_executions > 0 else 0
 
-            # Calculate average execution time if available - Fixed to safely check for field existence
-            avg_execution_time = None
-            try:
-                # Check if the field exists in the model, not just as a property
-                if ExecutionResult.objects.exists() and hasattr(ExecutionResult, 'execution_time'):
-                    # Check if it's a database field, not just an attribute
-                    if 'execution_time' in [f.name for f in ExecutionResult._meta.get_fields()]:
-                        avg_execution_time = ExecutionResult.objects.aggregate(
-                            avg_time=Avg('execution_time')
-                        )['avg_time']
-            except Exception as field_error:
-                logger.warning(f"Error accessing execution_time field: {str(field_error)}")
-                # Continue without the average time
+            # Timing and resource usage recorded on each ExecutionResult (None for results without measurements),
+            # results served from the result cache did not run and are left out
+            resource_stats = ExecutionResult.objects.filter(cached=False).aggregate(
+                time_total=Sum('execution_time'),
+                time_count=Count('execution_time'),
+                cpu_time_total=Sum('cpu_time'),
+                cpu_time_count=Count('cpu_time'),
+                peak_memory_total=Sum('peak_memory'),
+                peak_memory_count=Count('peak_memory'),
+                max_peak_memory=Max('peak_memory'),
+                killed=Count('id', filter=Q(signal__isnull=False) & ~Q(signal='')),
+            )
+
+            def combined_average(field, archived_field):
+                count = resource_stats[f'{field}_count'] + archived[f'{archived_field}_count']
+                return ((resource_stats[f'{field}_total'] or 0) + archived[f'{archived_field}_total']) / count if count else None
+
+            avg_execution_time = combined_average('time', 'execution_time')
+            avg_cpu_time = combined_average('cpu_time', 'cpu_time')
+            avg_peak_memory = combined_average('peak_memory', 'peak_memory')
+            peak_memories = [value for value in (resource_stats['max_peak_memory'], archived['peak_memory_max']) if value is not None]
 
             # Get trend data for the last 30 days
             thirty_days_ago = datetime.now() - timedelta(days=30)
@@ -259,6 +271,18 @@ class SandboxAnalyticsAPIView(APIView):
                 successful=Sum(Case(When(status='completed', then=1), default=0)),
                 failed=Sum(Case(When(status='failed', then=1), default=0))
             ).order_by('day')
+            trend = {
+                item['day'].date(): {'day': item['day'], 'total': item['total'], 'successful': item['successful'], 'failed': item['failed']}
+                for item in trend_data
+            }
+            for day, counts in get_archived_trend(thirty_days_ago.date()).items(): # Archived days are merged into the live ones
+                item = trend.setdefault(day, {
+                    'day': timezone.make_aware(datetime.combine(day, datetime.min.time())),
+                    'total': 0, 'successful': 0, 'failed': 0,
+                })
+                item['total'] += counts['total']
+                item['successful'] += counts['completed']
+                item['failed'] += counts['failed']
 
             # Get common error types from execution results
             error_types = ExecutionResult.objects.filter(
@@ -295,20 +319,16 @@ class SandboxAnalyticsAPIView(APIView):
                     'successful_executions': successful_executions,
                     'failed_executions': failed_executions,
                     'success_rate': round(success_rate, 2),
-                    'avg_execution_time_seconds': round(avg_execution_time, 3) if avg_execution_time else None
+                    'avg_execution_time_seconds': round(avg_execution_time, 3) if avg_execution_time else None,
+                    'avg_cpu_time_seconds': round(avg_cpu_time, 3) if avg_cpu_time is not None else None,
+                    'avg_peak_memory_bytes': round(avg_peak_memory) if avg_peak_memory is not None else None,
+                    'max_peak_memory_bytes': max(peak_memories) if peak_memories else None,
+                    'killed_executions': resource_stats['killed'] + archived['killed'],
                 },
-                'execution_trend': [
-                    {
-                        'day': item['day'],
-                        'total': item['total'],
-                        'successful': item['successful'],
-                        'failed': item['failed']
-                    }
-                    for item in trend_data
-                ],
+                'execution_trend': [trend[day] for day in sorted(trend)],
                 'common_error_types': [
                     {
-                        'error_type': item['error_type'][:100],  # Limit error text to reasonable length
+                        'error_type': decompress_text(item['error_type'])[:100],  # Limit error text to reasonable length (values() returns large errors compressed)
                         'count': item['count']
                     }
                     for item in error_types
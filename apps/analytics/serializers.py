@@ -77,6 +77,10 @@ class SandboxStatsSerializer(serializers.Serializer):
     failed_executions = serializers.IntegerField()
     success_rate = serializers.FloatField()
     avg_execution_time_seconds = serializers.FloatField(allow_null=True)
+    avg_cpu_time_seconds = serializers.FloatField(allow_null=True)
+    avg_peak_memory_bytes = serializers.IntegerField(allow_null=True)
+    max_peak_memory_bytes = serializers.IntegerField(allow_null=True)
+    killed_executions = serializers.IntegerField()
 
 
 class SandboxTrendSerializer(serializers.Serializer):
@@ -10,6 +10,9 @@ from .utils import award_badge_to_user
 
 logger = logging.getLogger('badges')
 
+# Badges awarded when a user's number of completed lessons reaches the key
+LESSON_BADGES = {1: "Lesson Starter", 5: "Lesson Master"}
+
 @receiver(post_save, sender=LessonProgress)
 def check_lesson_badges(sender, instance, created, **kwargs):
     """
@@ -25,13 +28,10 @@ def check_lesson_badges(sender, instance, created, **kwargs):
     completed_lessons_count = LessonProgress.objects.filter(user=user).count()
     logger.debug(f"User {user.username} has completed {completed_lessons_count} lessons")
 
-    if completed_lessons_count == 1:
-        result = award_badge_to_user(user, "Lesson Starter")
-        logger.info(f"'Lesson Starter' badge processing - Result: {bool(result)}")
-
-    elif completed_lessons_count == 5:
-        result = award_badge_to_user(user, "Lesson Master")
-        logger.info(f"'Lesson Master' badge processing - Result: {bool(result)}")
+    badge_name = LESSON_BADGES.get(completed_lessons_count)
+    if badge_name:
+        result = award_badge_to_user(user, badge_name)
+        logger.info(f"'{badge_name}' badge processing - Result: {bool(result)}")
 
 
 @receiver(post_save, sender=ExerciseSubmission)
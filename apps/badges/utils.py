@@ -35,3 +35,30 @@ def award_badge_to_user(user, badge_name):
     except Exception as e:
         logger.exception(f"Error awarding badge '{badge_name}' to user '{user.username}': {e}")
         return None
+
+
+def award_badges_in_bulk(awards):
+    """
+    Awards badges to many users with a fixed number of queries, skipping badges already earned.
+
+    Args:
+        awards (iterable): (user_id, badge_name) pairs.
+
+    Returns:
+        int: Number of badges newly awarded.
+    """
+    awards = set(awards)
+    if not awards:
+        return 0
+    badges = {badge.name: badge for badge in Badge.objects.filter(name__in={badge_name for _, badge_name in awards})}
+    for badge_name in {badge_name for _, badge_name in awards} - badges.keys():
+        logger.warning(f"Badge with name '{badge_name}' not found, cannot award badge.")
+
+    candidates = {(user_id, badges[badge_name].id) for user_id, badge_name in awards if badge_name in badges}
+    earned = set(UserBadge.objects.filter(
+        user_id__in={user_id for user_id, _ in candidates}, badge_id__in={badge_id for _, badge_id in candidates}
+    ).values_list('user_id', 'badge_id'))
+    new_badges = [UserBadge(user_id=user_id, badge_id=badge_id) for user_id, badge_id in candidates - earned]
+    UserBadge.objects.bulk_create(new_badges, ignore_conflicts=True) # A concurrent award may have won the race
+    logger.info(f"Awarded {len(new_badges)} badge(s) in bulk.")
+    return len(new_badges)
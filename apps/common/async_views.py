@@ -0,0 +1,60 @@
+"""
+Base class for native async JSON API views.
+
+DRF's APIView is synchronous, so under ASGI every DRF request occupies a worker thread for its whole
+duration. Views built on AsyncAPIView are plain async Django views: they authenticate the JWT and
+apply throttles the way DRF would, then await their handler on the event loop.
+"""
+import json
+import logging
+import math
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import Throttled
+from .authentication import aauthenticate_jwt
+
+logger = logging.getLogger("common")
+
+
+def throttled_response(wait):
+    """Returns the 429 response DRF sends for a throttled request."""
+    response = JsonResponse({"detail": Throttled(wait=wait).detail}, status=429)
+    if wait is not None:
+        response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+@method_decorator(csrf_exempt, name='dispatch') # Token-authenticated API, like DRF's APIView
+class AsyncAPIView(View):
+    """
+    Async view requiring a valid JWT access token, with DRF-compatible throttling.
+
+    Subclasses define async handlers (async def post/get) that return JsonResponse objects; the parsed
+    JSON body is available as request.data. Throttled raised by a handler becomes a 429 response.
+    """
+    throttle_classes = []
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await aauthenticate_jwt(request)
+        if request.user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+        try:
+            request.data = json.loads(request.body or b'{}') if request.method in ('POST', 'PUT', 'PATCH') else {}
+        except ValueError as e:
+            return JsonResponse({"detail": f"JSON parse error - {e}"}, status=400)
+        if not isinstance(request.data, dict):
+            return JsonResponse({"detail": "Expected a JSON object."}, status=400)
+
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await sync_to_async(throttle.allow_request)(request, self):
+                return throttled_response(throttle.wait())
+
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Throttled as e:
+            return throttled_response(e.wait)
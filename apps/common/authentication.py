@@ -0,0 +1,29 @@
+"""
+JWT authentication for native async Django views, which run outside DRF's request cycle.
+"""
+import logging
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+logger = logging.getLogger("common")
+
+
+async def aauthenticate_jwt(request):
+    """
+    Returns the user authenticated by the JWT access token in the request's Authorization header, or None.
+    Access tokens are never read from the URL, where they would end up in access logs and browser history.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(validated_token)
+    except (InvalidToken, AuthenticationFailed) as e:
+        logger.debug(f"aauthenticate_jwt: Rejected token: {e}")
+        return None
@@ -0,0 +1,201 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.contrib.auth import get_user_model
+from apps.common.throttling import ExecutionRateThrottle, TokenBucket, execution_slot, cache_lock, LOCK_TIMEOUT
+from apps.sandbox.api_views import ExecutionRequestAPIView
+from apps.sandbox.models import ExecutionRequest
+from apps.lessons.models import Exercise, Lesson
+import threading
+import time
+
+User = get_user_model()
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "throttling-tests"}}
+NO_LIMITS = {"user": None, "role": {}, "global": None}
+
+
+@override_settings(CACHES=LOCAL_CACHE, EXECUTION_LIMITS_ENABLED=True)
+class TokenBucketTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_allows_burst_then_reports_wait(self):
+        bucket = TokenBucket("test", capacity=3, refill_rate=1)
+        self.assertEqual([bucket.take() for _ in range(3)], [0, 0, 0])
+        wait = bucket.take()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 1)
+
+    def test_bucket_refills_over_time(self):
+        bucket = TokenBucket("test", capacity=1, refill_rate=1)
+        with patch('apps.common.throttling.time.time', return_value=1000.0):
+            self.assertEqual(bucket.take(), 0)
+            self.assertGreater(bucket.take(), 0)
+        with patch('apps.common.throttling.time.time', return_value=1001.5):
+            self.assertEqual(bucket.take(), 0)
+
+    def test_concurrent_takes_never_overdraw(self):
+        bucket = TokenBucket("test", capacity=20, refill_rate=0.001)
+        granted = []
+
+        def take_many():
+            for _ in range(10):
+                if bucket.take() == 0:
+                    granted.append(1)
+
+        threads = [threading.Thread(target=take_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(granted), 20)
+
+    @patch('apps.common.throttling.LOCK_WAIT', 0.05)
+    def test_locked_bucket_fails_closed(self):
+        bucket = TokenBucket("test", capacity=3, refill_rate=1)
+        self.assertEqual(bucket.take(), 0)
+        cache.add(f"{bucket.key}:lock", 1) # Held by another process
+        self.assertGreater(bucket.take(), 0) # Rejected instead of updating the bucket unlocked
+        bucket.give_back()
+        cache.delete(f"{bucket.key}:lock")
+        self.assertEqual(cache.get(bucket.key)[0], 2) # Neither call touched the bucket
+
+    def test_expired_lock_is_left_to_its_new_holder(self):
+        with cache_lock("test"):
+            cache.set("test:lock", "other", timeout=LOCK_TIMEOUT) # Ours expired, another process took it
+        self.assertEqual(cache.get("test:lock"), "other")
+
+
+@override_settings(CACHES=LOCAL_CACHE, EXECUTION_LIMITS_ENABLED=True, EXECUTION_CONCURRENCY_LIMITS=NO_LIMITS, SANDBOX_RESULT_CACHE_ENABLED=False)
+class ExecutionRateThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='throttle_student', password='testpassword', role='student')
+        self.other_student = User.objects.create_user(username='throttle_student_2', password='testpassword', role='student')
+        self.instructor = User.objects.create_user(username='throttle_instructor', password='testpassword', role='instructor')
+        self.factory = APIRequestFactory()
+
+    def _allowed(self, user):
+        request = self.factory.post('/api/sandbox/execution-requests/')
+        request.user = user
+        return ExecutionRateThrottle().allow_request(request, None)
+
+    @override_settings(EXECUTION_RATE_LIMITS={"user": {"capacity": 2, "refill_rate": 0.01}})
+    def test_user_scope_is_per_user(self):
+        self.assertEqual([self._allowed(self.student) for _ in range(3)], [True, True, False])
+        self.assertTrue(self._allowed(self.other_student))
+
+    @override_settings(EXECUTION_RATE_LIMITS={"role": {"student": {"capacity": 2, "refill_rate": 0.01}}})
+    def test_role_scope_is_shared_by_the_role(self):
+        self.assertTrue(self._allowed(self.student))
+        self.assertTrue(self._allowed(self.other_student))
+        self.assertFalse(self._allowed(self.student))
+        self.assertTrue(self._allowed(self.instructor)) # No limit configured for instructors
+
+    @override_settings(EXECUTION_RATE_LIMITS={"user": {"capacity": 5, "refill_rate": 0.01}, "global": {"capacity": 1, "refill_rate": 0.01}})
+    def test_rejected_request_returns_tokens_to_other_scopes(self):
+        self.assertTrue(self._allowed(self.student))
+        for _ in range(5):
+            self.assertFalse(self._allowed(self.student)) # Global bucket is empty
+        with self.settings(EXECUTION_RATE_LIMITS={"user": {"capacity": 5, "refill_rate": 0.01}}):
+            self.assertEqual([self._allowed(self.student) for _ in range(5)], [True, True, True, True, False])
+
+    @override_settings(EXECUTION_RATE_LIMITS={"user": {"capacity": 1, "refill_rate": 0.5}})
+    @patch('apps.sandbox.api_views.run_execution_request')
+    def test_view_returns_429_with_retry_after(self, mock_process):
+        mock_process.return_value = (None, True)
+
+        def post():
+            request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'print(1)', 'mode': 'async'}, format='json')
+            force_authenticate(request, user=self.student)
+            return ExecutionRequestAPIView.as_view()(request)
+
+        self.assertNotEqual(post().status_code, 429)
+        response = post()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+
+
+@override_settings(CACHES=LOCAL_CACHE, EXECUTION_LIMITS_ENABLED=True, EXECUTION_SLOT_RETRY_AFTER=3)
+class ExecutionSlotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='slot_student', password='testpassword', role='student')
+        self.other_student = User.objects.create_user(username='slot_student_2', password='testpassword', role='student')
+
+    def _hold_slot(self, user, entered, release):
+        def run():
+            with execution_slot(user):
+                entered.set()
+                release.wait(5)
+        thread = threading.Thread(target=run)
+        thread.start()
+        entered.wait(5)
+        return thread
+
+    @override_settings(EXECUTION_CONCURRENCY_LIMITS={"user": 1, "role": {}, "global": None})
+    def test_user_limit_and_release(self):
+        release = threading.Event()
+        thread = self._hold_slot(self.student, threading.Event(), release)
+
+        with self.assertRaises(Throttled) as raised:
+            with execution_slot(self.student):
+                pass
+        self.assertEqual(raised.exception.wait, 3)
+        with execution_slot(self.other_student): # Other users are unaffected
+            pass
+
+        release.set()
+        thread.join(5)
+        with execution_slot(self.student): # Slot was released
+            pass
+
+    @override_settings(EXECUTION_CONCURRENCY_LIMITS={"user": None, "role": {}, "global": 1})
+    def test_global_limit_and_nested_slots(self):
+        with execution_slot(self.student):
+            with execution_slot(self.student): # Nested call in the same thread reuses the slot
+                pass
+            with self.assertRaises(Throttled):
+                with execution_slot(self.other_student):
+                    pass
+        self.assertEqual(cache.get("execution-limits:running:global"), 0)
+
+    @override_settings(EXECUTION_CONCURRENCY_LIMITS={"user": None, "role": {}, "global": 5}, EXECUTION_SLOT_TIMEOUT=1)
+    def test_counter_is_kept_while_slots_are_taken_and_never_negative(self):
+        key = "execution-limits:running:global"
+        with execution_slot(self.student):
+            time.sleep(0.6)
+            with execution_slot(self.other_student): # Renews the counter
+                pass
+            time.sleep(0.6) # Past the timeout of the first slot
+            self.assertEqual(cache.get(key), 1)
+        self.assertEqual(cache.get(key), 0)
+
+        with execution_slot(self.student):
+            cache.set(key, 0) # Expired and restarted while the slot was held
+        self.assertEqual(cache.get(key), 0)
+
+    @override_settings(EXECUTION_CONCURRENCY_LIMITS={"user": 1, "role": {}, "global": None}, EXECUTION_RATE_LIMITS={})
+    @patch('apps.sandbox.api_views.run_execution_request')
+    def test_view_returns_429_while_execution_is_running(self, mock_process):
+        factory = APIRequestFactory()
+        lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.student)
+        exercise = Exercise.objects.create(title="Slot Exercise", lesson=lesson, sandbox="piston", created_by=self.student, test_cases=[])
+        release = threading.Event()
+        thread = self._hold_slot(self.student, threading.Event(), release)
+        request = factory.post('/api/sandbox/execution-requests/', {'code': 'print(1)', 'exercise': exercise.id}, format='json')
+        force_authenticate(request, user=self.student)
+        response = ExecutionRequestAPIView.as_view()(request)
+        release.set()
+        thread.join(5)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3')
+        mock_process.assert_not_called()
+        self.assertFalse(ExecutionRequest.objects.exists()) # Nothing left pending
@@ -0,0 +1,260 @@
+"""
+Rate and concurrency limits for code execution endpoints.
+
+Both limits are scoped per user, per role (one budget shared by every user with that role) and
+globally, and keep their state in Django's cache framework. With a shared cache backend (Redis or
+Memcached, see CACHES in settings.py) the limits hold across all app processes.
+
+- ExecutionRateThrottle is a DRF throttle backed by token buckets: each scope holds up to `capacity`
+  tokens and regains `refill_rate` tokens per second; every request takes one token from each scope.
+- execution_slot() is a counting semaphore limiting how many executions run at the same time
+  (aexecution_slot() for async views).
+
+Both reject with DRF's Throttled exception, which DRF turns into a 429 response with Retry-After.
+"""
+import logging
+import math
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger("common")
+
+CACHE_PREFIX = "execution-limits"
+LOCK_TIMEOUT = 2 # Seconds; a crashed holder can block a bucket at most this long
+LOCK_WAIT = 0.5 # Seconds to keep retrying a held lock before giving up
+LOCK_BACKOFF = (0.002, 0.05) # First and longest sleep between attempts, doubled after each one
+
+
+def get_limit_scopes(user, limits):
+    """
+    Returns the (scope key, limit) pairs that apply to a user.
+
+    Args:
+        user (User): The authenticated user.
+        limits (dict): {"user": limit, "role": {role: limit}, "global": limit}; a missing or None
+                       limit disables that scope.
+
+    Returns:
+        list: [(scope_key, limit), ...] in user, role, global order.
+    """
+    scopes = []
+    if limits.get("user") is not None:
+        scopes.append((f"user:{user.pk}", limits["user"]))
+    role = getattr(user, "role", None)
+    role_limit = (limits.get("role") or {}).get(role)
+    if role_limit is not None:
+        scopes.append((f"role:{role}", role_limit))
+    if limits.get("global") is not None:
+        scopes.append(("global", limits["global"]))
+    return scopes
+
+
+class LockUnavailable(Exception):
+    """Raised by cache_lock() when the lock is still held after LOCK_WAIT seconds."""
+
+
+@contextmanager
+def cache_lock(key):
+    """
+    Mutex built on cache.add(), which is atomic on every cache backend. A held lock is retried with
+    jittered exponential backoff for up to LOCK_WAIT seconds. The lock holds a token of its holder,
+    so a holder that ran past LOCK_TIMEOUT does not release a lock taken by someone else since.
+
+    Raises:
+        LockUnavailable: If the lock could not be taken; the caller must not update the key unlocked.
+    """
+    lock_key = f"{key}:lock"
+    token = secrets.token_hex(8)
+    deadline = time.monotonic() + LOCK_WAIT
+    delay = LOCK_BACKOFF[0]
+    while not cache.add(lock_key, token, timeout=LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            logger.warning(f"cache_lock: Could not lock '{key}' within {LOCK_WAIT}s")
+            raise LockUnavailable(key)
+        time.sleep(delay * random.uniform(0.5, 1.5)) # Jitter, so waiting callers do not retry in lockstep
+        delay = min(delay * 2, LOCK_BACKOFF[1])
+    try:
+        yield
+    finally:
+        if cache.get(lock_key) == token: # Still ours, not expired and taken by another caller
+            cache.delete(lock_key)
+        else:
+            logger.warning(f"cache_lock: Lock on '{key}' expired before it was released")
+
+
+class TokenBucket:
+    """A token bucket whose state (tokens, last refill time) is stored in the cache under `key`."""
+
+    def __init__(self, key, capacity, refill_rate):
+        self.key = f"{CACHE_PREFIX}:bucket:{key}"
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+
+    def _ttl(self):
+        # Long enough for an empty bucket to refill completely, after which the state is no longer needed
+        return max(60, math.ceil(self.capacity / self.refill_rate) + 60) if self.refill_rate else None
+
+    def take(self, tokens=1):
+        """
+        Takes tokens from the bucket if enough are available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds until they will be available.
+                   The request is also rejected (fail closed) if the bucket cannot be locked.
+        """
+        try:
+            with cache_lock(self.key):
+                now = time.time()
+                available, updated = cache.get(self.key, (self.capacity, now))
+                available = min(self.capacity, available + (now - updated) * self.refill_rate)
+                if available >= tokens:
+                    cache.set(self.key, (available - tokens, now), timeout=self._ttl())
+                    return 0
+                cache.set(self.key, (available, now), timeout=self._ttl())
+        except LockUnavailable:
+            return float(LOCK_TIMEOUT)
+        if not self.refill_rate:
+            return float(LOCK_TIMEOUT)
+        return (tokens - available) / self.refill_rate
+
+    def give_back(self, tokens=1):
+        """Returns tokens taken by a request that was rejected by another scope; skipped if the bucket cannot be locked."""
+        try:
+            with cache_lock(self.key):
+                available, updated = cache.get(self.key, (self.capacity, time.time()))
+                cache.set(self.key, (min(self.capacity, available + tokens), updated), timeout=self._ttl())
+        except LockUnavailable:
+            logger.warning(f"TokenBucket: {tokens} token(s) not returned to '{self.key}', the bucket is locked")
+
+
+class ExecutionRateThrottle(BaseThrottle):
+    """
+    Token-bucket rate limit on code executions, per user, per role and globally.
+
+    A request must get a token from every scope; if one scope is empty, tokens already taken from the
+    other scopes are returned so a rejected request costs nothing. Limits come from
+    settings.EXECUTION_RATE_LIMITS, each as {"capacity": burst size, "refill_rate": tokens per second}.
+    """
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'EXECUTION_LIMITS_ENABLED', True):
+            return True
+        if not request.user or not request.user.is_authenticated:
+            return True # Authentication is enforced by the view's permission classes
+
+        taken = []
+        for scope_key, limit in get_limit_scopes(request.user, getattr(settings, 'EXECUTION_RATE_LIMITS', {})):
+            bucket = TokenBucket(scope_key, limit["capacity"], limit["refill_rate"])
+            wait = bucket.take()
+            if wait:
+                for taken_bucket in taken:
+                    taken_bucket.give_back()
+                self._wait = wait
+                logger.info(f"Execution rate limit '{scope_key}' reached by user '{request.user.username}', retry in {wait:.1f}s")
+                return False
+            taken.append(bucket)
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+_held_slots = threading.local()
+
+
+@contextmanager
+def execution_slot(user):
+    """
+    Holds one concurrent-execution slot in every scope that applies to the user.
+
+    Limits come from settings.EXECUTION_CONCURRENCY_LIMITS. Slots are counted with cache.incr(), and
+    the counters expire EXECUTION_SLOT_TIMEOUT seconds after the last slot was taken, so a crashed
+    process cannot leak them forever. Nested calls in the same thread (e.g. a view calling another view) reuse the outer slot.
+
+    Raises:
+        Throttled: If any scope already has its maximum number of executions running.
+    """
+    if not getattr(settings, 'EXECUTION_LIMITS_ENABLED', True) or getattr(_held_slots, "user_id", None) == user.pk:
+        yield
+        return
+
+    acquired = acquire_slots(user)
+    _held_slots.user_id = user.pk
+    try:
+        yield
+    finally:
+        _held_slots.user_id = None
+        release_slots(acquired)
+
+
+@asynccontextmanager
+async def aexecution_slot(user):
+    """
+    Async counterpart of execution_slot() for native async views; the cache counters are updated in
+    a worker thread. There is no nesting to detect, since async views do not call other views.
+
+    Raises:
+        Throttled: If any scope already has its maximum number of executions running.
+    """
+    if not getattr(settings, 'EXECUTION_LIMITS_ENABLED', True):
+        yield
+        return
+
+    acquired = await sync_to_async(acquire_slots)(user)
+    try:
+        yield
+    finally:
+        await sync_to_async(release_slots)(acquired)
+
+
+def acquire_slots(user):
+    """
+    Takes one slot in every concurrency scope of the user.
+
+    Returns:
+        list: The counter keys taken, to pass to release_slots().
+
+    Raises:
+        Throttled: If any scope is full; slots already taken are given back first.
+    """
+    timeout = getattr(settings, 'EXECUTION_SLOT_TIMEOUT', 300)
+    acquired = []
+    try:
+        for scope_key, limit in get_limit_scopes(user, getattr(settings, 'EXECUTION_CONCURRENCY_LIMITS', {})):
+            key = f"{CACHE_PREFIX}:running:{scope_key}"
+            cache.add(key, 0, timeout=timeout)
+            try:
+                running = cache.incr(key)
+            except ValueError: # Counter expired between add() and incr()
+                cache.add(key, 1, timeout=timeout)
+                running = 1
+            cache.touch(key, timeout) # Counts slots still held, it must not expire under steady load
+            acquired.append(key)
+            if running > limit:
+                logger.info(f"Concurrent execution limit '{scope_key}' ({limit}) reached by user '{user.username}'")
+                raise Throttled(wait=getattr(settings, 'EXECUTION_SLOT_RETRY_AFTER', 2), detail="Too many executions running, try again shortly.")
+    except Throttled:
+        release_slots(acquired)
+        raise
+    return acquired
+
+
+def release_slots(keys):
+    """Gives back slots taken by acquire_slots(); a counter never goes below 0."""
+    for key in keys:
+        try:
+            if cache.decr(key) < 0: # The counter expired and restarted without this slot
+                cache.incr(key)
+        except ValueError: # Counter already expired
+            pass
@@ -24,6 +24,7 @@ class Exercise(models.Model):
     starter_code = models.TextField(blank=True, null=True)
     solution_code = models.TextField(blank=True, null=True)
     test_cases = models.JSONField(default=list)  # Stores test cases as JSON, Format: {"input": "input","expected_output": "expected output"}
+    fail_fast = models.BooleanField(default=False) # Stop running test cases after the first failing one
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="created_exercises", null=True, blank=True) # Creator of the exercise
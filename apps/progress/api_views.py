@@ -1,20 +1,18 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from django.urls import reverse
 from .serializers import LessonProgressSerializer, ExerciseSubmissionSerializer, LessonProgressPercentageSerializer
 from .models import LessonProgress, ExerciseSubmission
 from apps.lessons.models import Lesson, Exercise
-from apps.sandbox.api_views import ExecutionRequestAPIView
-from apps.sandbox.models import ExecutionResult
-from apps.sandbox.serializers import ExecutionRequestSerializer, ExecutionResultSerializer
-from rest_framework.test import APIRequestFactory, force_authenticate
-from django.test import RequestFactory
-from rest_framework.test import force_authenticate
-from rest_framework.request import Request
-from .utils import send_execution_request
+from apps.sandbox.serializers import ExecutionResultSerializer
+from apps.sandbox.services import create_execution_request, run_execution_request, queue_execution_request
+from apps.sandbox.resilience import SandboxUnavailable
+from apps.common.throttling import ExecutionRateThrottle, execution_slot
 from apps.badges.utils import award_badge_to_user
 from apps.badges.models import Badge, UserBadge
 import logging
+import math
 
 logger = logging.getLogger("progress")
 
@@ -71,10 +69,19 @@ class RecordLessonCompletionAPIView(APIView):
 class ExerciseSubmissionAPIView(APIView):
     """
     API view to handle student submissions for exercises, trigger code execution, and check tests.
+    With "mode": "async" the submission is graded by the background workers and the view returns 202
+    right away; poll ExerciseSubmissionStatusAPIView for the outcome.
     """
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ExecutionRateThrottle]
 
     def post(self, request, exercise_id):
+        if request.data.get('mode') == 'async':
+            return self.submit(request, exercise_id, run_async=True) # Concurrency is bounded by the workers
+        with execution_slot(request.user): # Raises Throttled (429) if too many executions are running
+            return self.submit(request, exercise_id)
+
+    def submit(self, request, exercise_id, run_async=False):
         try:
             exercise = Exercise.objects.get(pk=exercise_id)
         except Exercise.DoesNotExist:
@@ -88,125 +95,77 @@ class ExerciseSubmissionAPIView(APIView):
             )
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Save initial submission
-        submission = serializer.save(user=request.user, exercise=exercise)
+        # --- Create the execution and the submission that it grades ---
+        fail_fast = serializer.validated_data.pop("fail_fast", False) # Exercise.fail_fast also enables it
+        execution_request = create_execution_request(
+            request.user,
+            serializer.validated_data["submitted_code"],
+            exercise=exercise,
+            fail_fast=fail_fast,
+        )
+        # Saved as pending; is_correct and execution_result are set in a single update once grading finishes
+        submission = serializer.save(user=request.user, exercise=exercise, execution_request=execution_request)
         logger.debug(f"Received execution request data: {request.data}")
 
-        # --- Prepare Code Execution Request ---
-        execution_request_data = {
-            "exercise": exercise.id,
-            "code": serializer.validated_data.get("submitted_code", 'print("404")'),
-            "sandbox": exercise.sandbox,
-            "stdin": "",
-        }
+        if run_async:
+            queue_execution_request(execution_request)
+            logger.info(f"Submission ID {submission.id} by user '{request.user.username}' queued for grading (execution request ID '{execution_request.id}').")
+            return Response({
+                "id": submission.id,
+                "status": submission.status,
+                "status_url": reverse('exercise-submission-status', kwargs={'submission_id': submission.id}),
+            }, status=status.HTTP_202_ACCEPTED)
 
-        execution_serializer = ExecutionRequestSerializer(data=execution_request_data)
-        if not execution_serializer.is_valid():
-            logger.warning(f"Invalid execution request data for submission ID {submission.id}. Errors: {execution_serializer.errors}")
+        try:
+            execution_result, execution_success = run_execution_request(execution_request)
+        except SandboxUnavailable as e:
+            logger.warning(f"Sandbox unavailable for submission ID {submission.id}: {e}")
             submission.delete()
             return Response(
-                {"error": "Invalid submission data for code execution.", "details": execution_serializer.errors},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(math.ceil(e.retry_after))},
             )
 
-        execution_request = execution_serializer.save(user=request.user)
+        if not execution_success:
+            logger.error(f"Execution request failed for submission ID {submission.id}. Sandbox error: {execution_result.error}")
+            submission.delete()
+            return Response({"error": "Code execution failed.", "details": ExecutionResultSerializer(execution_result).data}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # --- Extract & Validate JWT Token ---
-        auth_header = request.headers.get("Authorization", "")
-        jwt_token = None
-        if auth_header.startswith("Bearer "):
-            jwt_token = auth_header.split("Bearer ")[-1]
+        # --- is_correct and execution_result were set by the execution_finished handler (progress/signals.py) ---
+        submission.refresh_from_db(fields=['execution_result', 'is_correct', 'status'])
+
+        logger.info(f"Exercise submission processed for user '{request.user.username}', exercise '{exercise.title}'. Submission ID: {submission.id}, Execution Result ID: {execution_result.id}, Tests Passed: {submission.is_correct}")
+        response_data = ExerciseSubmissionSerializer(submission).data
+        response_data['is_correct'] = submission.is_correct
+        response_data['execution_result'] = execution_result.id
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+class ExerciseSubmissionStatusAPIView(APIView):
+    """
+    API view to check the grading status of an exercise submission.
+    Returns 202 while the submission is still being graded.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, submission_id):
+        try:
+            submission = ExerciseSubmission.objects.select_related('execution_result').get(pk=submission_id)
+        except ExerciseSubmission.DoesNotExist:
+            logger.warning(f"Exercise submission with ID '{submission_id}' not found.")
+            return Response({"error": "Submission not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if submission.user != request.user:
+            logger.warning(f"User '{request.user.username}' attempted to access submission ID '{submission_id}' belonging to another user.")
+            return Response({"error": "Unauthorized access."}, status=status.HTTP_403_FORBIDDEN)
+
+        if submission.status == 'pending':
+            return Response({"id": submission.id, "status": submission.status}, status=status.HTTP_202_ACCEPTED)
+
+        response_data = ExerciseSubmissionSerializer(submission).data
+        response_data['test_results'] = submission.execution_result.test_results if submission.execution_result else None
+        return Response(response_data, status=status.HTTP_200_OK)
 
-        if not jwt_token:
-            logger.error("JWT token missing or invalid.")
-            submission.delete()
-            return Response({"error": "Authentication token missing."}, status=status.HTTP_401_UNAUTHORIZED)
-
-        # --- Send Execution Request using the existing execution_request object ---
-        execution_response = send_execution_request(execution_request_data, token=jwt_token, execution_request_id=execution_request.id)
-        logger.debug(f"ExecutionResponse: {execution_response}")
-
-        # Check if execution_response is a dictionary (not a Response object)
-        if isinstance(execution_response, dict):
-            # Handle as dictionary response
-            status_code = execution_response.get('status_code', 201)
-
-            # Check if the execution was successful (201 Created)
-            if status_code == status.HTTP_201_CREATED:
-                execution_result_data = execution_response
-                logger.debug(f"ExecutionResultData: {execution_result_data}")
-
-                execution_result_serializer = ExecutionResultSerializer(data=execution_result_data)
-
-                if execution_result_serializer.is_valid():
-                    execution_result_id = execution_result_data.get('id')
-                    if execution_result_id:
-                        execution_result = ExecutionResult.objects.get(pk=execution_result_id)
-
-                        submission.execution_result = execution_result
-                        submission.save()
-
-                        # --- Check Test Cases and Update is_correct ---
-                        test_results = execution_result.test_results or []
-                        all_tests_passed = all(result.get('passed', False) for result in test_results)
-                        submission.is_correct = all_tests_passed
-                        submission.save()
-
-                        logger.info(f"Exercise submission processed for user '{request.user.username}', exercise '{exercise.title}'. Submission ID: {submission.id}, Execution Result ID: {execution_result.id}, Tests Passed: {all_tests_passed}")
-                        initial_serializer = ExerciseSubmissionSerializer(submission)
-                        response_data = initial_serializer.data
-                        response_data['is_correct'] = submission.is_correct
-                        response_data['execution_result'] = execution_result.id
-                        return Response(response_data, status=status.HTTP_201_CREATED)
-                    else:
-                        logger.error(f"Execution result ID not found in execution response for submission ID {submission.id}.")
-                        submission.delete()
-                        return Response({"error": "Failed to retrieve execution result ID from sandbox response."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                else:
-                    logger.error(f"Error serializing ExecutionResult for submission ID {submission.id}. Errors: {execution_result_serializer.errors}")
-                    submission.delete()
-                    return Response({"error": "Failed to process execution result.", "details": execution_result_serializer.errors}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            else:
-                logger.error(f"Execution request failed for submission ID {submission.id}. Sandbox response: {execution_response}")
-                submission.delete()
-                return Response({"error": "Code execution failed.", "details": execution_response}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            # Handle as Response object (original code path)
-            if execution_response.status_code == status.HTTP_201_CREATED:
-                execution_result_data = execution_response.data
-                execution_result_serializer = ExecutionResultSerializer(data=execution_result_data)
-                if execution_result_serializer.is_valid():
-                    execution_result_id = execution_response.data.get('id')
-                    if execution_result_id:
-                        execution_result = ExecutionResult.objects.get(pk=execution_result_id)
-
-                        submission.execution_result = execution_result
-                        submission.save()
-
-                        # --- Check Test Cases and Update is_correct ---
-                        test_results = execution_result.test_results or []
-                        all_tests_passed = all(result.get('passed', False) for result in test_results)
-                        submission.is_correct = all_tests_passed
-                        submission.save()
-
-                        logger.info(f"Exercise submission processed for user '{request.user.username}', exercise '{exercise.title}'. Submission ID: {submission.id}, Execution Result ID: {execution_result.id}, Tests Passed: {all_tests_passed}")
-                        initial_serializer = ExerciseSubmissionSerializer(submission)
-                        response_data = initial_serializer.data
-                        response_data['is_correct'] = submission.is_correct
-                        response_data['execution_result'] = execution_result.id
-                        return Response(response_data, status=status.HTTP_201_CREATED)
-                    else:
-                        logger.error(f"Execution result ID not found in execution response for submission ID {submission.id}.")
-                        submission.delete()
-                        return Response({"error": "Failed to retrieve execution result ID from sandbox response."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                else:
-                    logger.error(f"Error serializing ExecutionResult for submission ID {submission.id}. Errors: {execution_result_serializer.errors}")
-                    submission.delete()
-                    return Response({"error": "Failed to process execution result.", "details": execution_result_serializer.errors}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            else:
-                logger.error(f"Execution request failed for submission ID {submission.id}. Sandbox response status: {execution_response.status_code}, data: {execution_response.data}")
-                submission.delete()
-                return Response({"error": "Code execution failed.", "details": execution_response.data}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class LessonProgressPercentageAPIView(APIView):
     """
@@ -0,0 +1,88 @@
+"""
+Native async version of the exercise submission endpoint in api_views.py, for deployments served
+over ASGI. It grades submissions through the async execution path in apps/sandbox/async_utils.py.
+"""
+import logging
+import math
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.urls import reverse
+from apps.common.async_views import AsyncAPIView
+from apps.common.throttling import ExecutionRateThrottle, aexecution_slot
+from apps.lessons.models import Exercise
+from apps.sandbox.serializers import ExecutionResultSerializer
+from apps.sandbox.services import create_execution_request, queue_execution_request
+from apps.sandbox.async_utils import aprocess_execution_request
+from apps.sandbox.resilience import SandboxUnavailable
+from .serializers import ExerciseSubmissionSerializer
+
+logger = logging.getLogger("progress")
+
+
+def save_submission(data, user, exercise):
+    """
+    Validates a submission and creates it together with the execution request that grades it.
+
+    Returns:
+        tuple: (submission, execution_request, errors)
+    """
+    serializer = ExerciseSubmissionSerializer(data=data)
+    if not serializer.is_valid():
+        return None, None, serializer.errors
+    fail_fast = serializer.validated_data.pop("fail_fast", False) # Exercise.fail_fast also enables it
+    execution_request = create_execution_request(user, serializer.validated_data["submitted_code"], exercise=exercise, fail_fast=fail_fast)
+    submission = serializer.save(user=user, exercise=exercise, execution_request=execution_request)
+    return submission, execution_request, None
+
+
+class ExerciseSubmissionAsyncView(AsyncAPIView):
+    """
+    Async counterpart of ExerciseSubmissionAPIView: creates a submission and grades it, or with
+    "mode": "async" queues it for the background workers and returns 202.
+    """
+    throttle_classes = [ExecutionRateThrottle]
+
+    async def post(self, request, exercise_id):
+        if request.data.get('mode') == 'async':
+            return await self.submit(request, exercise_id, run_async=True) # Concurrency is bounded by the workers
+        async with aexecution_slot(request.user): # Raises Throttled (429) before anything is saved
+            return await self.submit(request, exercise_id)
+
+    async def submit(self, request, exercise_id, run_async=False):
+        exercise = await Exercise.objects.filter(pk=exercise_id).afirst()
+        if exercise is None:
+            logger.warning(f"Exercise with ID '{exercise_id}' not found.")
+            return JsonResponse({"error": "Exercise not found."}, status=404)
+
+        submission, execution_request, errors = await sync_to_async(save_submission)(request.data, request.user, exercise)
+        if errors:
+            logger.warning(f"Invalid submission data from user '{request.user.username}' for exercise '{exercise.title}'. Errors: {errors}")
+            return JsonResponse(errors, status=400)
+
+        if run_async:
+            await sync_to_async(queue_execution_request)(execution_request)
+            logger.info(f"Submission ID {submission.id} by user '{request.user.username}' queued for grading (execution request ID '{execution_request.id}').")
+            return JsonResponse({
+                "id": submission.id,
+                "status": submission.status,
+                "status_url": reverse('exercise-submission-status', kwargs={'submission_id': submission.id}),
+            }, status=202)
+
+        try:
+            execution_result, execution_success = await aprocess_execution_request(execution_request)
+        except SandboxUnavailable as e:
+            logger.warning(f"Sandbox unavailable for submission ID {submission.id}: {e}")
+            await submission.adelete()
+            response = JsonResponse({"error": str(e)}, status=503)
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
+
+        if not execution_success:
+            logger.error(f"Execution request failed for submission ID {submission.id}. Sandbox error: {execution_result.error}")
+            await submission.adelete()
+            return JsonResponse({"error": "Code execution failed.", "details": ExecutionResultSerializer(execution_result).data}, status=500)
+
+        # --- is_correct and execution_result were set by the execution_finished handler (progress/signals.py) ---
+        await submission.arefresh_from_db(fields=['execution_result', 'is_correct', 'status'])
+        logger.info(f"Exercise submission processed for user '{request.user.username}', exercise '{exercise.title}'. Submission ID: {submission.id}, Execution Result ID: {execution_result.id}, Tests Passed: {submission.is_correct}")
+        return JsonResponse(ExerciseSubmissionSerializer(submission).data, status=201)
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0001_initial'),
+        ('sandbox', '0009_executionrequest_fail_fast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercisesubmission',
+            name='execution_request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sandbox.executionrequest'),
+        ),
+        # Existing submissions were graded synchronously, so they start out as completed
+        migrations.AddField(
+            model_name='exercisesubmission',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='completed', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='exercisesubmission',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -19,6 +19,12 @@ class ExerciseSubmission(models.Model):
     execution_result = models.ForeignKey("sandbox.ExecutionResult", on_delete=models.SET_NULL, null=True, blank=True) # Links to the result of code execution from sandbox app
     submitted_at = models.DateTimeField(auto_now_add=True) # Automatically saves the time of submission
     is_correct = models.BooleanField(default=False)  # To mark if the submission is correct (we can decide how to check this later)
+    execution_request = models.ForeignKey("sandbox.ExecutionRequest", on_delete=models.SET_NULL, null=True, blank=True) # Execution that grades this submission
+    status = models.CharField(max_length=20, choices=[ # Grading status, set once when the execution finishes
+        ('pending', 'Pending'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ], default='pending')
 
     def __str__(self):
         return f"{self.user.username} - {self.exercise.title} Submission"
\ No newline at end of file
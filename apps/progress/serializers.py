@@ -18,11 +18,12 @@ class ExerciseSubmissionSerializer(serializers.ModelSerializer):
     exercise = serializers.PrimaryKeyRelatedField(queryset = Exercise.objects.all())
     execution_result = serializers.PrimaryKeyRelatedField(queryset = 'apps.sandbox.models.ExecutionResult', allow_null=True, required=False)
     submitted_code = serializers.CharField(required=True)
+    fail_fast = serializers.BooleanField(required=False, default=False, write_only=True) # Passed on to the execution request, not stored on the submission
 
     class Meta:
         model = ExerciseSubmission
         fields = '__all__'
-        read_only_fields = ('submitted_at', 'is_correct')
+        read_only_fields = ('submitted_at', 'is_correct', 'status', 'execution_request')
 
 
 class LessonProgressPercentageSerializer(serializers.Serializer):
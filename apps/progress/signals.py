@@ -0,0 +1,24 @@
+from django.dispatch import receiver
+from apps.sandbox.signals import execution_finished
+from apps.sandbox.services import all_tests_passed
+from .models import ExerciseSubmission
+import logging
+
+logger = logging.getLogger("progress")
+
+@receiver(execution_finished)
+def grade_pending_submission(sender, execution_request, execution_result, success, **kwargs):
+    """
+    Signal handler that grades the submission waiting on a finished execution.
+    The submission is saved exactly once, so badge and completion status handlers on ExerciseSubmission
+    post_save only run when the final is_correct is known.
+    """
+    submission = ExerciseSubmission.objects.filter(execution_request=execution_request, status='pending').select_related('user', 'exercise').first()
+    if submission is None:
+        return
+
+    submission.execution_result = execution_result
+    submission.is_correct = bool(success and execution_result is not None and all_tests_passed(execution_result))
+    submission.status = 'completed' if success else 'failed'
+    submission.save(update_fields=['execution_result', 'is_correct', 'status'])
+    logger.info(f"Submission ID {submission.id} graded by execution request ID '{execution_request.id}': status={submission.status}, correct={submission.is_correct}")
@@ -1,3 +1,156 @@
+from django.core.cache import cache
 from django.test import TestCase
+from unittest.mock import patch, Mock, AsyncMock
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.contrib.auth import get_user_model
+from apps.lessons.models import Exercise, Lesson
+from django.db.models.signals import post_save
+from apps.progress.api_views import ExerciseSubmissionAPIView, ExerciseSubmissionStatusAPIView
+from apps.progress.models import ExerciseSubmission
+from apps.sandbox.models import ExecutionRequest, ExecutionResult
+from apps.sandbox.resilience import SandboxUnavailable, reset_resilience
+from apps.sandbox.jobs import run_next_execution_job
+from apps.status.models import CompletionStatus
 
-# Create your tests here.
+User = get_user_model()
+
+
+def piston_response(stdout):
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"run": {"stdout": stdout, "stderr": "", "code": 0, "signal": None}, "compile": {}}
+    return mock_response
+
+
+class ExerciseSubmissionAPITests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        reset_resilience()
+        self.user = User.objects.create_user(username='testuser_submit', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(
+            title="Submission Exercise",
+            lesson=self.lesson,
+            sandbox="piston",
+            created_by=self.user,
+            test_cases=[{"input": "", "expected_output": "hi"}]
+        )
+        self.factory = APIRequestFactory()
+
+    def _submit(self, code, **extra):
+        request = self.factory.post(f'/api/progress/exercises/{self.exercise.id}/submit/', {'submitted_code': code, 'exercise': self.exercise.id, **extra}, format='json')
+        force_authenticate(request, user=self.user) # No JWT needed, the execution is not re-authenticated
+        return ExerciseSubmissionAPIView.as_view()(request, exercise_id=self.exercise.id)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_correct_submission_links_result(self, mock_post):
+        mock_post.return_value = piston_response("hi\n")
+
+        response = self._submit('print("hi")')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['is_correct'])
+        submission = ExerciseSubmission.objects.get()
+        execution_result = ExecutionResult.objects.get()
+        self.assertEqual(submission.execution_result, execution_result)
+        self.assertTrue(submission.is_correct)
+        self.assertEqual(response.data['execution_result'], execution_result.id)
+        self.assertEqual(ExecutionRequest.objects.get().exercise, self.exercise)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_wrong_output_is_not_correct(self, mock_post):
+        mock_post.return_value = piston_response("bye\n")
+
+        response = self._submit('print("bye")')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.data['is_correct'])
+        self.assertFalse(ExerciseSubmission.objects.get().is_correct)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_sandbox_failure_discards_submission(self, mock_post):
+        mock_post.side_effect = requests.exceptions.ConnectionError("refused")
+
+        response = self._submit('print("hi")')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(ExerciseSubmission.objects.exists())
+
+    @patch('apps.progress.api_views.run_execution_request', side_effect=SandboxUnavailable("The piston sandbox is busy, try again shortly.", 'piston', retry_after=1.5))
+    def test_unavailable_sandbox_returns_503(self, mock_run):
+        response = self._submit('print("hi")')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertFalse(ExerciseSubmission.objects.exists())
+
+    def _status(self, submission_id, user=None):
+        request = self.factory.get(f'/api/progress/submissions/{submission_id}/')
+        force_authenticate(request, user=user or self.user)
+        return ExerciseSubmissionStatusAPIView.as_view()(request, submission_id=submission_id)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_async_submission_is_graded_once_by_worker(self, mock_post):
+        mock_post.return_value = piston_response("hi\n")
+        saves = []
+        record_save = lambda sender, instance, **kwargs: saves.append(instance.is_correct)
+        post_save.connect(record_save, sender=ExerciseSubmission)
+        self.addCleanup(post_save.disconnect, record_save, sender=ExerciseSubmission)
+
+        response = self._submit('print("hi")', mode='async')
+
+        self.assertEqual(response.status_code, 202)
+        submission_id = response.data['id']
+        self.assertEqual(response.data['status'], 'pending')
+        mock_post.assert_not_called()
+        self.assertEqual(self._status(submission_id).status_code, 202)
+        self.assertFalse(CompletionStatus.objects.exists())
+
+        self.assertTrue(run_next_execution_job())
+
+        status_response = self._status(submission_id)
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.data['status'], 'completed')
+        self.assertTrue(status_response.data['is_correct'])
+        self.assertTrue(status_response.data['test_results'][0]['passed'])
+        self.assertEqual(saves, [False, True]) # Created pending, then graded in a single update
+        self.assertTrue(CompletionStatus.objects.filter(user=self.user, content_type='exercise', content_id=self.exercise.id).exists())
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_async_submission_sandbox_failure_marks_failed(self, mock_post):
+        mock_post.side_effect = requests.exceptions.ConnectionError("refused")
+        submission_id = self._submit('print("hi")', mode='async').data['id']
+
+        run_next_execution_job()
+
+        submission = ExerciseSubmission.objects.get(pk=submission_id)
+        self.assertEqual(submission.status, 'failed')
+        self.assertFalse(submission.is_correct)
+
+    def test_status_is_private(self):
+        other_user = User.objects.create_user(username='testuser_other', password='testpassword')
+        submission = ExerciseSubmission.objects.create(user=self.user, exercise=self.exercise, submitted_code='print(1)')
+        self.assertEqual(self._status(submission.id, user=other_user).status_code, 403)
+        self.assertEqual(self._status(submission.id + 100).status_code, 404)
+
+    @patch('apps.sandbox.async_client.apost_json', new_callable=AsyncMock)
+    def test_async_view_grades_submission(self, mock_post):
+        mock_post.return_value = httpx.Response(200, json={"run": {"stdout": "hi\n", "stderr": "", "code": 0, "signal": None}, "compile": {}}, request=httpx.Request('POST', 'http://piston'))
+        url = f'/api/progress/async/exercises/{self.exercise.id}/submit/'
+
+        response = async_to_sync(AsyncClient().post)(
+            url, {'submitted_code': 'print("hi")', 'exercise': self.exercise.id}, content_type='application/json',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['is_correct'])
+        submission = ExerciseSubmission.objects.get()
+        self.assertEqual((submission.status, submission.execution_result), ('completed', ExecutionResult.objects.get()))
+        self.assertEqual(mock_post.await_count, 2) # Standard run and one test case
@@ -1,8 +1,11 @@
 from django.urls import path
-from .api_views import RecordLessonCompletionAPIView, ExerciseSubmissionAPIView, LessonProgressPercentageAPIView
+from .api_views import RecordLessonCompletionAPIView, ExerciseSubmissionAPIView, ExerciseSubmissionStatusAPIView, LessonProgressPercentageAPIView
+from .async_views import ExerciseSubmissionAsyncView
 
 urlpatterns = [
     path('lessons/<int:lesson_id>/complete/', RecordLessonCompletionAPIView.as_view(), name='record-lesson-completion'),
     path('exercises/<int:exercise_id>/submit/', ExerciseSubmissionAPIView.as_view(), name='submit-exercise'),
+    path('async/exercises/<int:exercise_id>/submit/', ExerciseSubmissionAsyncView.as_view(), name='async-submit-exercise'), # Native async version of submit-exercise (serve with ASGI)
+    path('submissions/<int:submission_id>/', ExerciseSubmissionStatusAPIView.as_view(), name='exercise-submission-status'),
     path('lessons/<int:lesson_id>/progress/', LessonProgressPercentageAPIView.as_view(), name='lesson-progress-percentage'),
 ]
@@ -0,0 +1,137 @@
+"""
+Compiled answer keys for quiz grading.
+
+Grading a submission only needs the correct choice ids of each question and the number of questions.
+get_answer_key() builds them with one query and caches the result in process and in the shared cache
+(CACHES), so grading is a pass over the submitted answers without any query.
+
+Keys are versioned by Quiz.updated_at. Saving or deleting a question or choice bumps the updated_at
+of its quiz (see signals.py), so every process rebuilds its key on the next submission; the signal
+handlers also drop the local and shared entries right away. Queryset update()/bulk_create() send no
+signals: call touch_quiz() after changing questions or choices that way.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Quiz, Question
+
+logger = logging.getLogger("quiz")
+
+CACHE_KEY_PREFIX = "quiz:answer_key"
+
+_answer_keys = {} # quiz id -> AnswerKey, one entry per quiz
+_answer_keys_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    """Correct choice ids (a frozenset) per question id of one quiz version, and its question count."""
+    quiz_id: int
+    version: str
+    correct_choices: dict
+    total_questions: int
+
+    def grade(self, answers):
+        """
+        Grades the answers of a submission. Only the first answer to each question counts,
+        later answers repeating a question are ignored, so the score cannot exceed 100.
+
+        Args:
+            answers (list): {question_id: choice_id} dicts as validated by QuizSubmissionSerializer.
+
+        Returns:
+            tuple: (correct_answers, responses) where responses holds one [question_id, choice_id, correct]
+            triple (correct is 1 or 0) per answered question of this quiz, stored on QuizAttempt.responses.
+        """
+        correct_answers = 0
+        responses = []
+        answered = set()
+        for answer in answers:
+            for question_id, choice_id in answer.items():
+                try:
+                    question_id = int(question_id)
+                except (TypeError, ValueError):
+                    continue # Skip invalid answers
+                if question_id not in self.correct_choices or question_id in answered:
+                    continue
+                answered.add(question_id)
+                correct = int(choice_id in self.correct_choices[question_id])
+                correct_answers += correct
+                responses.append([question_id, choice_id, correct])
+        return correct_answers, responses
+
+    def count_correct(self, answers):
+        """Returns the number of answers choosing a correct choice of a question of this quiz."""
+        return self.grade(answers)[0]
+
+
+def get_version(quiz):
+    return quiz.updated_at.isoformat()
+
+
+def get_cache_key(quiz_id):
+    return f"{CACHE_KEY_PREFIX}:{quiz_id}"
+
+
+def build_answer_key(quiz):
+    """Builds the answer key of quiz with a single query."""
+    correct_choices = {}
+    rows = Question.objects.filter(quiz=quiz).values_list('id', 'choices__id', 'choices__is_correct') # One row per choice
+    for question_id, choice_id, is_correct in rows:
+        choices = correct_choices.setdefault(question_id, set())
+        if is_correct:
+            choices.add(choice_id)
+    return AnswerKey(
+        quiz_id=quiz.id,
+        version=get_version(quiz),
+        correct_choices={question_id: frozenset(choices) for question_id, choices in correct_choices.items()},
+        total_questions=len(correct_choices),
+    )
+
+
+def get_answer_key(quiz):
+    """
+    Returns the answer key of quiz, from the process cache, the shared cache or the database.
+
+    Args:
+        quiz (Quiz): The quiz, its updated_at selects the key version.
+
+    Returns:
+        AnswerKey: The compiled answer key.
+    """
+    version = get_version(quiz)
+    with _answer_keys_lock:
+        answer_key = _answer_keys.get(quiz.id)
+    if answer_key is not None and answer_key.version == version:
+        return answer_key
+
+    answer_key = cache.get(get_cache_key(quiz.id))
+    if answer_key is None or answer_key.version != version:
+        answer_key = build_answer_key(quiz)
+        cache.set(get_cache_key(quiz.id), answer_key, getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_TTL', 3600))
+        logger.debug(f"Built answer key for quiz ID '{quiz.id}' ({answer_key.total_questions} question(s))")
+    with _answer_keys_lock:
+        _answer_keys[quiz.id] = answer_key
+    return answer_key
+
+
+def invalidate_answer_key(quiz_id):
+    """Drops the cached answer key of a quiz in this process and in the shared cache."""
+    with _answer_keys_lock:
+        _answer_keys.pop(quiz_id, None)
+    cache.delete(get_cache_key(quiz_id))
+
+
+def touch_quiz(quiz_id):
+    """Bumps the updated_at of a quiz after its questions or choices changed, and invalidates its answer key."""
+    Quiz.objects.filter(pk=quiz_id).update(updated_at=timezone.now()) # New version for every process
+    invalidate_answer_key(quiz_id)
+
+
+def clear_answer_keys():
+    """Empties the process cache of answer keys."""
+    with _answer_keys_lock:
+        _answer_keys.clear()
@@ -3,9 +3,16 @@ from rest_framework.response import Response
 from rest_framework import status, permissions, generics, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
 from django.shortcuts import get_object_or_404
-from django.db import models
-from .models import Quiz, Question, Choice, QuizAttempt
-from .serializers import QuizSerializer, QuestionSerializer, ChoiceSerializer, QuizAttemptSerializer, QuizSubmissionSerializer
+from django.http import Http404
+from django.db import models, transaction
+from .models import Quiz, Question, Choice, QuizAttempt, QuizStats
+from .answer_keys import get_answer_key
+from .bulk import grade_quiz_submissions
+from .editor import update_quiz_questions
+from .payloads import get_quiz_queryset, can_see_answers, student_quiz_response
+from .stats import HISTOGRAM_BUCKETS, get_bucket_label
+from .item_analysis import get_quiz_item_analysis
+from .serializers import QuizSerializer, QuestionSerializer, ChoiceSerializer, QuizAttemptSerializer, QuizSubmissionSerializer, BulkQuizSubmissionSerializer, QuizEditSerializer, StudentQuizSerializer
 from apps.lessons.models import Lesson
 from apps.progress.models import LessonProgress
 from apps.common.permissions import IsAdminOrInstructor
@@ -13,6 +20,28 @@ import logging
 
 logger = logging.getLogger("quiz")
 
+def get_lesson_quiz_response(request, lesson_id, serializer_class=QuizSerializer):
+    """
+    Returns the quiz of a lesson: the cached student payload with its ETag for students, or the full
+    quiz (with the correct choices) loaded with get_quiz_queryset() for admins and instructors.
+
+    Raises:
+        Lesson.DoesNotExist: If the lesson does not exist, each caller keeps its own 404 body.
+        Http404: If the lesson has no quiz.
+    """
+    staff = can_see_answers(request.user)
+    queryset = get_quiz_queryset() if staff else Quiz.objects.select_related('lesson') # Students are served from the payload cache
+    quiz = queryset.filter(lesson_id=lesson_id).first()
+    if quiz is None:
+        if not Lesson.objects.filter(pk=lesson_id).exists():
+            raise Lesson.DoesNotExist(f"Lesson '{lesson_id}' not found")
+        logger.warning(f"No quiz found for lesson ID: {lesson_id}")
+        raise Http404("No Quiz matches the given query.")
+
+    if not staff:
+        return student_quiz_response(request, quiz)
+    return Response(serializer_class(quiz).data)
+
 class QuizDetailView(APIView):
     """
     API view to retrieve a quiz for a specific lesson.
@@ -21,16 +50,10 @@ class QuizDetailView(APIView):
 
     def get(self, request, lesson_id):
         try:
-            lesson = Lesson.objects.get(pk=lesson_id)
-            quiz = get_object_or_404(Quiz, lesson=lesson)
-            serializer = QuizSerializer(quiz)
-            return Response(serializer.data)
+            return get_lesson_quiz_response(request, lesson_id)
         except Lesson.DoesNotExist:
             logger.warning(f"Quiz requested for non-existent lesson ID: {lesson_id}")
             return Response({"error": "Lesson not found"}, status=status.HTTP_404_NOT_FOUND)
-        except Quiz.DoesNotExist:
-            logger.warning(f"No quiz found for lesson ID: {lesson_id}")
-            return Response({"error": "No quiz available for this lesson"}, status=status.HTTP_404_NOT_FOUND)
 
 class SubmitQuizView(APIView):
     """
@@ -48,46 +71,43 @@ class SubmitQuizView(APIView):
         answers = serializer.validated_data['answers']
 
         try:
-            quiz = Quiz.objects.get(pk=quiz_id)
+            quiz = Quiz.objects.select_related('lesson').get(pk=quiz_id)
             lesson = quiz.lesson
             user = request.user
 
-            # Calculate score
-            total_questions = quiz.questions.count()
+            # Calculate score from the compiled answer key, without a query per answer
+            answer_key = get_answer_key(quiz)
+            total_questions = answer_key.total_questions
             if total_questions == 0:
                 return Response(
                     {"error": "This quiz has no questions"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            correct_answers = 0
-            for answer in answers:
-                for question_id, choice_id in answer.items():
-                    try:
-                        question = Question.objects.get(pk=question_id, quiz=quiz)
-                        if Choice.objects.filter(pk=choice_id, question=question, is_correct=True).exists():
-                            correct_answers += 1
-                    except (Question.DoesNotExist, Choice.DoesNotExist):
-                        pass  # Skip invalid answers
+            correct_answers, responses = answer_key.grade(answers)
 
             score = (correct_answers / total_questions) * 100
             passed = score >= quiz.passing_score
 
-            # Record the attempt
-            attempt = QuizAttempt.objects.create(
-                user=user,
-                quiz=quiz,
-                score=score,
-                passed=passed
-            )
-
-            # If passed, mark the lesson as complete
-            if passed:
-                # Create lesson progress only if it doesn't exist
-                LessonProgress.objects.get_or_create(
+            with transaction.atomic(): # The post_save handlers (quiz stats) commit with the attempt
+                # Record the attempt
+                attempt = QuizAttempt.objects.create(
                     user=user,
-                    lesson=lesson
+                    quiz=quiz,
+                    score=score,
+                    passed=passed,
+                    responses=responses
                 )
+
+                # If passed, mark the lesson as complete
+                if passed:
+                    # Create lesson progress only if it doesn't exist
+                    LessonProgress.objects.get_or_create(
+                        user=user,
+                        lesson=lesson
+                    )
+
+            if passed:
                 logger.info(f"User {user.username} passed quiz for lesson '{lesson.title}' with score {score}%")
 
                 return Response({
@@ -108,6 +128,27 @@ class SubmitQuizView(APIView):
         except Quiz.DoesNotExist:
             return Response({"error": "Quiz not found"}, status=status.HTTP_404_NOT_FOUND)
 
+class BulkSubmitQuizView(APIView):
+    """
+    API view to grade many quiz submissions at once (exam days, LMS imports).
+    Instructors can only submit attempts for quizzes they created.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrInstructor]
+
+    def post(self, request):
+        serializer = BulkQuizSubmissionSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        quizzes = Quiz.objects.all()
+        if request.user.role == 'instructor':
+            quizzes = quizzes.filter(created_by=request.user)
+
+        outcome = grade_quiz_submissions(serializer.validated_data['submissions'], quizzes=quizzes)
+        logger.info(f"User {request.user.username} bulk graded {outcome['graded']} quiz submission(s), {len(outcome['errors'])} skipped")
+        return Response(outcome)
+
 # Modify QuizViewSet to add custom actions
 class QuizViewSet(viewsets.ModelViewSet):
     """
@@ -153,24 +194,32 @@ class QuizViewSet(viewsets.ModelViewSet):
         """
         Filter quizzes for instructors to only show their own quizzes
         """
+        queryset = get_quiz_queryset() # Questions, choices, lesson and creator without N+1 queries
         if self.request.user.role == 'instructor':
-            return Quiz.objects.filter(created_by=self.request.user)
-        return super().get_queryset()
+            return queryset.filter(created_by=self.request.user)
+        return queryset
+
+    def get_serializer_class(self):
+        """Students read quizzes without the correct choices"""
+        if self.action in ['list', 'retrieve'] and not can_see_answers(self.request.user):
+            return StudentQuizSerializer
+        return super().get_serializer_class()
+
+    def retrieve(self, request, *args, **kwargs):
+        """Serve students the cached quiz payload with an ETag"""
+        if can_see_answers(request.user):
+            return super().retrieve(request, *args, **kwargs)
+        quiz = get_object_or_404(Quiz.objects.select_related('lesson'), pk=kwargs['pk'])
+        self.check_object_permissions(request, quiz)
+        return student_quiz_response(request, quiz)
 
     @action(detail=False, methods=['get'], url_path='for_lesson/(?P<lesson_id>[^/.]+)')
     def for_lesson(self, request, lesson_id=None):
         """Get quiz for a specific lesson"""
         try:
-            lesson = get_object_or_404(Lesson, pk=lesson_id)
-            quiz = get_object_or_404(Quiz, lesson=lesson)
-            serializer = self.get_serializer(quiz)
-            return Response(serializer.data)
+            return get_lesson_quiz_response(request, lesson_id, serializer_class=self.get_serializer_class())
         except Lesson.DoesNotExist:
-            logger.warning(f"Quiz requested for non-existent lesson ID: {lesson_id}")
-            return Response({"error": "Lesson not found"}, status=status.HTTP_404_NOT_FOUND)
-        except Quiz.DoesNotExist:
-            logger.warning(f"No quiz found for lesson ID: {lesson_id}")
-            return Response({"error": "No quiz available for this lesson"}, status=status.HTTP_404_NOT_FOUND)
+            raise Http404("No Lesson matches the given query.") # DRF's standard {"detail": ...} body
 
     @action(detail=True, methods=['post'], url_path='bulk_update')
     def bulk_update(self, request, pk=None):
@@ -185,46 +234,13 @@ class QuizViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        questions_data = request.data.get('questions', [])
-
-        # Update or create questions and their choices
-        for question_data in questions_data:
-            question_id = question_data.get('id')
-            choices_data = question_data.pop('choices', [])
-
-            if question_id:
-                # Update existing question
-                question = get_object_or_404(Question, id=question_id, quiz=quiz)
-                question_serializer = QuestionSerializer(question, data=question_data, partial=True)
-            else:
-                # Create new question
-                question_data['quiz'] = quiz.id
-                question_serializer = QuestionSerializer(data=question_data)
-
-            if question_serializer.is_valid():
-                question = question_serializer.save()
-
-                # Process choices for this question
-                for choice_data in choices_data:
-                    choice_id = choice_data.get('id')
-
-                    if choice_id:
-                        # Update existing choice
-                        choice = get_object_or_404(Choice, id=choice_id, question=question)
-                        choice_serializer = ChoiceSerializer(choice, data=choice_data, partial=True)
-                    else:
-                        # Create new choice
-                        choice_data['question'] = question.id
-                        choice_serializer = ChoiceSerializer(data=choice_data)
-
-                    if choice_serializer.is_valid():
-                        choice_serializer.save()
-                    else:
-                        return Response(choice_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response(question_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        edit_serializer = QuizEditSerializer(data=request.data)
+        if not edit_serializer.is_valid():
+            return Response(edit_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Return the updated quiz with all questions and choices
+        # Apply all question and choice changes in one transaction and return the quiz from one prefetched fetch
+        quiz = update_quiz_questions(quiz, edit_serializer.validated_data['questions'])
+        logger.info(f"Quiz '{quiz.title}' questions updated by {request.user.username}")
         serializer = self.get_serializer(quiz)
         return Response(serializer.data)
 
@@ -387,6 +403,28 @@ class ChoiceViewSet(viewsets.ModelViewSet):
             # End marker for this operation
             logger.warning("=== CHOICE UPDATE ATTEMPT ENDED ===")
 
+class QuizItemAnalysisView(APIView):
+    """
+    API view for the per-question item analysis of a quiz (difficulty, discrimination, distractors).
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrInstructor]
+
+    def get(self, request, quiz_id):
+        """Get the cached item analysis of a quiz, ?refresh=true recomputes it"""
+        try:
+            quiz = Quiz.objects.get(pk=quiz_id)
+        except Quiz.DoesNotExist:
+            return Response({"error": "Quiz not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.user.role == 'instructor' and quiz.created_by_id != request.user.id:
+            return Response(
+                {"error": "You don't have permission to view statistics for this quiz"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        refresh = request.query_params.get('refresh', '').lower() in ['1', 'true']
+        return Response(get_quiz_item_analysis(quiz, refresh=refresh))
+
 class QuizManagementView(APIView):
     """
     API view for additional quiz management operations.
@@ -436,46 +474,13 @@ class QuizManagementView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            questions_data = request.data.get('questions', [])
-
-            # Update or create questions and their choices
-            for question_data in questions_data:
-                question_id = question_data.get('id')
-                choices_data = question_data.pop('choices', [])
-
-                if question_id:
-                    # Update existing question
-                    question = get_object_or_404(Question, id=question_id, quiz=quiz)
-                    question_serializer = QuestionSerializer(question, data=question_data, partial=True)
-                else:
-                    # Create new question
-                    question_data['quiz'] = quiz.id
-                    question_serializer = QuestionSerializer(data=question_data)
-
-                if question_serializer.is_valid():
-                    question = question_serializer.save()
-
-                    # Process choices for this question
-                    for choice_data in choices_data:
-                        choice_id = choice_data.get('id')
-
-                        if choice_id:
-                            # Update existing choice
-                            choice = get_object_or_404(Choice, id=choice_id, question=question)
-                            choice_serializer = ChoiceSerializer(choice, data=choice_data, partial=True)
-                        else:
-                            # Create new choice
-                            choice_data['question'] = question.id
-                            choice_serializer = ChoiceSerializer(data=choice_data)
-
-                        if choice_serializer.is_valid():
-                            choice_serializer.save()
-                        else:
-                            return Response(choice_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    return Response(question_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-            # Return the updated quiz with all questions and choices
+            edit_serializer = QuizEditSerializer(data=request.data)
+            if not edit_serializer.is_valid():
+                return Response(edit_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            # Apply all question and choice changes in one transaction and return the quiz from one prefetched fetch
+            quiz = update_quiz_questions(quiz, edit_serializer.validated_data['questions'])
+            logger.info(f"Quiz '{quiz.title}' questions updated by {request.user.username}")
             serializer = QuizSerializer(quiz)
             return Response(serializer.data)
 
@@ -491,26 +496,21 @@ class QuizStatsView(APIView):
     def get(self, request, quiz_id):
         """Get statistics for a specific quiz"""
         try:
-            quiz = Quiz.objects.get(pk=quiz_id)
+            quiz = Quiz.objects.select_related('stats').get(pk=quiz_id)
 
             # Check if instructor has permission to view stats for this quiz
-            if request.user.role == 'instructor' and quiz.created_by != request.user:
+            if request.user.role == 'instructor' and quiz.created_by_id != request.user.id:
                 return Response(
                     {"error": "You don't have permission to view statistics for this quiz"},
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            # Get total attempts
-            total_attempts = QuizAttempt.objects.filter(quiz=quiz).count()
-
-            # Get passing attempts
-            passing_attempts = QuizAttempt.objects.filter(quiz=quiz, passed=True).count()
-
-            # Calculate average score
-            avg_score = QuizAttempt.objects.filter(quiz=quiz).aggregate(models.Avg('score'))['score__avg'] or 0
-
-            # Get unique users who attempted
-            unique_users = QuizAttempt.objects.filter(quiz=quiz).values('user').distinct().count()
+            # Read the running totals kept by stats.record_attempts()
+            stats = getattr(quiz, 'stats', None) or QuizStats(quiz=quiz)
+            total_attempts = stats.attempts
+            passing_attempts = stats.passes
+            avg_score = stats.score_total / total_attempts if total_attempts > 0 else 0
+            histogram = stats.score_histogram or [0] * HISTOGRAM_BUCKETS
 
             return Response({
                 'quiz_id': quiz_id,
@@ -519,7 +519,11 @@ class QuizStatsView(APIView):
                 'passing_attempts': passing_attempts,
                 'pass_rate': (passing_attempts / total_attempts * 100) if total_attempts > 0 else 0,
                 'avg_score': round(avg_score, 2),
-                'unique_users': unique_users
+                'unique_users': stats.unique_users,
+                'score_distribution': [
+                    {'range': get_bucket_label(bucket), 'count': count}
+                    for bucket, count in enumerate(histogram)
+                ]
             })
 
         except Quiz.DoesNotExist:
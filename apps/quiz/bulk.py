@@ -0,0 +1,140 @@
+"""
+Bulk grading of quiz submissions (exam days, LMS imports).
+
+grade_quiz_submissions() grades thousands of (user, quiz, answers) records against the cached answer
+keys (answer_keys.py) and writes the outcome with a fixed number of queries per batch:
+
+- QuizAttempt rows are inserted with bulk_create, which sends no post_save, so the per-attempt
+  badge and completion status handlers do not run, and are added to QuizStats in one pass;
+- LessonProgress rows are created for passed lessons the users had not completed yet, and the
+  'quiz' and 'lesson' CompletionStatus rows are upserted, like the signal handlers would;
+- badges are evaluated once at the end: users whose passed quiz or completed lesson count crossed
+  a QUIZ_BADGES / LESSON_BADGES milestone during the import are awarded that badge.
+"""
+import logging
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from apps.badges.signals import LESSON_BADGES
+from apps.badges.utils import award_badges_in_bulk
+from apps.progress.models import LessonProgress
+from apps.status.models import CompletionStatus
+from .answer_keys import get_answer_key
+from .models import Quiz, QuizAttempt
+from .signals import QUIZ_BADGES
+from .stats import record_attempts
+
+logger = logging.getLogger("quiz")
+
+User = get_user_model()
+
+
+def count_passed_quizzes(user_ids):
+    """Returns {user id: number of distinct quizzes passed}."""
+    rows = QuizAttempt.objects.filter(user_id__in=user_ids, passed=True).values('user_id').annotate(count=Count('quiz', distinct=True))
+    return {row['user_id']: row['count'] for row in rows}
+
+
+def count_completed_lessons(user_ids):
+    """Returns {user id: number of LessonProgress rows}, which is what the lesson badge handler counts."""
+    rows = LessonProgress.objects.filter(user_id__in=user_ids).values('user_id').annotate(count=Count('id'))
+    return {row['user_id']: row['count'] for row in rows}
+
+
+def get_crossed_badges(milestones, before, after):
+    """Returns (user_id, badge_name) for every milestone a user's count reached between before and after."""
+    return [
+        (user_id, badge_name)
+        for user_id, count in after.items()
+        for milestone, badge_name in milestones.items()
+        if before.get(user_id, 0) < milestone <= count
+    ]
+
+
+def resolve_users(records):
+    """Returns {user_id or username given in the records: user id} for the users that exist."""
+    user_ids = {record['user_id'] for record in records if record.get('user_id') is not None}
+    usernames = {record['username'] for record in records if record.get('user_id') is None}
+    users = {user_id: user_id for user_id in User.objects.filter(id__in=user_ids).values_list('id', flat=True)}
+    users.update(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    return users
+
+
+def grade_quiz_submissions(records, quizzes=None, batch_size=None):
+    """
+    Grades and records many quiz submissions at once.
+
+    Args:
+        records (list): Dicts with 'user_id' or 'username', 'quiz_id' and 'answers' ({question_id: choice_id}
+            dicts, as in QuizSubmissionSerializer), validated by BulkQuizSubmissionSerializer.
+        quizzes (QuerySet, optional): Quizzes the caller may grade, defaults to all quizzes.
+        batch_size (int, optional): Rows per INSERT, defaults to QUIZ_BULK_BATCH_SIZE.
+
+    Returns:
+        dict: {"graded", "passed", "results", "errors"} where results holds one
+        {"index", "attempt_id", "score", "passed"} per graded record and errors one {"index", "error"}
+        per skipped record (unknown user or quiz, quiz without questions).
+    """
+    batch_size = batch_size or getattr(settings, 'QUIZ_BULK_BATCH_SIZE', 500)
+    quizzes = (quizzes if quizzes is not None else Quiz.objects.all()).filter(id__in={record['quiz_id'] for record in records})
+    quizzes = {quiz.id: quiz for quiz in quizzes}
+    users = resolve_users(records)
+
+    graded, errors = [], []
+    for index, record in enumerate(records):
+        user_id = users.get(record['user_id'] if record.get('user_id') is not None else record['username'])
+        quiz = quizzes.get(record['quiz_id'])
+        if user_id is None:
+            errors.append({"index": index, "error": "User not found"})
+            continue
+        if quiz is None:
+            errors.append({"index": index, "error": "Quiz not found"})
+            continue
+        answer_key = get_answer_key(quiz) # Built once per quiz, then served from the process cache
+        if answer_key.total_questions == 0:
+            errors.append({"index": index, "error": "This quiz has no questions"})
+            continue
+        correct_answers, responses = answer_key.grade(record['answers'])
+        score = (correct_answers / answer_key.total_questions) * 100
+        graded.append((index, QuizAttempt(user_id=user_id, quiz=quiz, score=score, passed=score >= quiz.passing_score, responses=responses)))
+
+    attempts = [attempt for _, attempt in graded]
+    passed = [attempt for attempt in attempts if attempt.passed]
+    user_ids = {attempt.user_id for attempt in passed}
+    lessons = {(attempt.user_id, attempt.quiz.lesson_id) for attempt in passed}
+    with transaction.atomic():
+        quizzes_before, lessons_before = count_passed_quizzes(user_ids), count_completed_lessons(user_ids)
+
+        QuizAttempt.objects.bulk_create(attempts, batch_size=batch_size) # No post_save per attempt
+        record_attempts(attempts)
+
+        completed = set(LessonProgress.objects.filter(
+            user_id__in=user_ids, lesson_id__in={lesson_id for _, lesson_id in lessons}
+        ).values_list('user_id', 'lesson_id'))
+        LessonProgress.objects.bulk_create(
+            [LessonProgress(user_id=user_id, lesson_id=lesson_id) for user_id, lesson_id in lessons - completed], batch_size=batch_size
+        )
+        statuses = {(attempt.user_id, 'quiz', attempt.quiz_id) for attempt in passed} | {(user_id, 'lesson', lesson_id) for user_id, lesson_id in lessons}
+        CompletionStatus.objects.bulk_create(
+            [CompletionStatus(user_id=user_id, content_type=content_type, content_id=content_id, completed=True) for user_id, content_type, content_id in statuses],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'content_type', 'content_id'],
+            update_fields=['completed'],
+        )
+
+        awards = get_crossed_badges(QUIZ_BADGES, quizzes_before, count_passed_quizzes(user_ids))
+        awards += get_crossed_badges(LESSON_BADGES, lessons_before, count_completed_lessons(user_ids))
+        award_badges_in_bulk(awards)
+
+    logger.info(f"grade_quiz_submissions: Graded {len(attempts)} submission(s), {len(passed)} passed, {len(errors)} skipped")
+    return {
+        "graded": len(attempts),
+        "passed": len(passed),
+        "results": [
+            {"index": index, "attempt_id": attempt.id, "score": attempt.score, "passed": attempt.passed}
+            for index, attempt in graded
+        ],
+        "errors": errors,
+    }
@@ -0,0 +1,90 @@
+"""
+Set-based editing of a quiz's questions and choices.
+
+update_quiz_questions() applies a QuizEditSerializer payload: items with an id update the existing
+question or choice (only the fields given), items without one are created, and items with
+"delete": true are deleted. The payload is validated and every referenced id is checked before
+anything is written; the changes are then applied with bulk_create/bulk_update/delete in a single
+transaction, so an edit is applied completely or not at all.
+"""
+import logging
+from django.db import transaction
+from rest_framework.exceptions import NotFound
+from .answer_keys import touch_quiz
+from .models import Question, Choice
+from .payloads import get_quiz_queryset
+
+logger = logging.getLogger("quiz")
+
+QUESTION_FIELDS = ('text', 'order')
+CHOICE_FIELDS = ('text', 'is_correct')
+
+
+def update_quiz_questions(quiz, questions_data):
+    """
+    Creates, updates and deletes the questions and choices of a quiz in one transaction.
+
+    Args:
+        quiz (Quiz): The quiz being edited.
+        questions_data (list): validated_data['questions'] of QuizEditSerializer.
+
+    Returns:
+        Quiz: The updated quiz, loaded with get_quiz_queryset().
+
+    Raises:
+        NotFound: If a question id does not belong to the quiz or a choice id to its question.
+    """
+    questions = {question.id: question for question in Question.objects.filter(quiz=quiz)}
+    choices = {choice.id: choice for choice in Choice.objects.filter(question__quiz=quiz)}
+    next_order = max((question.order for question in questions.values()), default=0) + 1
+
+    new_questions, changed_questions, deleted_questions = [], [], []
+    new_choices, changed_choices, deleted_choices = [], [], []
+    for question_data in questions_data:
+        question_id = question_data.get('id')
+        if question_id:
+            question = questions.get(question_id)
+            if question is None:
+                raise NotFound(f"Question {question_id} not found in this quiz.")
+            if question_data['delete']:
+                deleted_questions.append(question_id)
+                continue
+            for field in QUESTION_FIELDS:
+                if field in question_data:
+                    setattr(question, field, question_data[field])
+            changed_questions.append(question)
+        else:
+            question = Question(quiz=quiz, text=question_data['text'], order=question_data.get('order') or next_order)
+            next_order = max(next_order, question.order) + 1 # Same default as QuestionViewSet.perform_create
+            new_questions.append(question)
+
+        for choice_data in question_data.get('choices', []):
+            choice_id = choice_data.get('id')
+            if not choice_id:
+                new_choices.append(Choice(question=question, text=choice_data['text'], is_correct=choice_data.get('is_correct', False)))
+                continue
+            choice = choices.get(choice_id)
+            if choice is None or choice.question_id != question.id:
+                raise NotFound(f"Choice {choice_id} not found in question {question.id or 'new'}.")
+            if choice_data['delete']:
+                deleted_choices.append(choice_id)
+                continue
+            for field in CHOICE_FIELDS:
+                if field in choice_data:
+                    setattr(choice, field, choice_data[field])
+            changed_choices.append(choice)
+
+    with transaction.atomic():
+        Choice.objects.filter(id__in=deleted_choices).delete()
+        Question.objects.filter(id__in=deleted_questions).delete() # Also deletes their choices
+        Question.objects.bulk_create(new_questions) # Sets the ids the new choices refer to
+        Question.objects.bulk_update(changed_questions, QUESTION_FIELDS)
+        Choice.objects.bulk_create(new_choices) # question_id is taken from the questions created above
+        Choice.objects.bulk_update(changed_choices, CHOICE_FIELDS)
+        touch_quiz(quiz.id) # bulk_create/bulk_update send no signals, give the answer key a new version
+
+    logger.info(
+        f"Quiz '{quiz.id}' edited: questions +{len(new_questions)} ~{len(changed_questions)} -{len(deleted_questions)}, "
+        f"choices +{len(new_choices)} ~{len(changed_choices)} -{len(deleted_choices)}"
+    )
+    return get_quiz_queryset().get(pk=quiz.id)
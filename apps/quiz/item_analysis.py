@@ -0,0 +1,124 @@
+"""
+Per-question item analysis of quiz attempts.
+
+Every graded attempt stores its answers in QuizAttempt.responses as [question_id, choice_id, correct]
+triples. analyze_quiz_items() reads them in one pass and computes, per question:
+
+- difficulty: share of attempts that answered the question correctly (unanswered counts as wrong);
+- discrimination: difficulty among the top 27% of attempts by score minus difficulty among the
+  bottom 27% (the classical upper-lower index, from -1 to 1);
+- distractor frequencies: how often each choice was picked, and how often the question was skipped.
+
+Correctness is kept column-wise, in one bytearray per question with one byte per attempt in score
+order, so difficulty and both group rates are sums over contiguous slices. Attempts recorded before
+responses were stored are left out.
+
+Results are cached per quiz version for QUIZ_ITEM_ANALYSIS_CACHE_TTL seconds; run
+`python manage.py analyze_quiz_items` to compute them ahead of time for every quiz.
+"""
+import logging
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Question, QuizAttempt
+
+logger = logging.getLogger("quiz")
+
+CACHE_KEY_PREFIX = "quiz:item_analysis"
+GROUP_FRACTION = 0.27 # Size of the upper and lower score groups
+TOO_HARD_BELOW = 0.3 # Difficulty under which a question is flagged 'too_hard'
+TOO_EASY_ABOVE = 0.9
+LOW_DISCRIMINATION_BELOW = 0.2
+
+
+def get_flags(difficulty, discrimination):
+    flags = []
+    if difficulty < TOO_HARD_BELOW:
+        flags.append('too_hard')
+    elif difficulty > TOO_EASY_ABOVE:
+        flags.append('too_easy')
+    if discrimination is not None and discrimination < LOW_DISCRIMINATION_BELOW:
+        flags.append('low_discrimination')
+    return flags
+
+
+def analyze_quiz_items(quiz):
+    """
+    Computes the item analysis of every question of quiz from the attempts' responses.
+
+    Args:
+        quiz (Quiz): The quiz to analyze.
+
+    Returns:
+        dict: {"quiz_id", "attempts_analyzed", "computed_at", "questions"} with one
+        {"question_id", "text", "order", "answered", "difficulty", "discrimination", "flags",
+        "distractors", "omitted"} entry per question, in question order.
+    """
+    questions = list(Question.objects.filter(quiz=quiz).order_by('order', 'id').prefetch_related('choices'))
+    columns = {question.id: index for index, question in enumerate(questions)}
+
+    rows = QuizAttempt.objects.filter(quiz=quiz).values_list('score', 'responses').iterator(chunk_size=2000)
+    attempts = sorted((row for row in rows if row[1]), key=lambda row: row[0]) # Score order for the groups
+    total = len(attempts)
+
+    correct = [bytearray(total) for _ in questions]
+    answered = [bytearray(total) for _ in questions]
+    picks = [Counter() for _ in questions]
+    for position, (_, responses) in enumerate(attempts):
+        for question_id, choice_id, is_correct in responses:
+            column = columns.get(question_id)
+            if column is None: # Question deleted since the attempt
+                continue
+            correct[column][position] = is_correct
+            answered[column][position] = 1
+            picks[column][choice_id] += 1
+
+    group = max(1, round(total * GROUP_FRACTION)) if total >= 2 else 0
+    items = []
+    for column, question in enumerate(questions):
+        difficulty = sum(correct[column]) / total if total else None
+        discrimination = None
+        if group:
+            discrimination = (sum(correct[column][total - group:]) - sum(correct[column][:group])) / group
+        items.append({
+            "question_id": question.id,
+            "text": question.text,
+            "order": question.order,
+            "answered": sum(answered[column]),
+            "difficulty": round(difficulty, 4) if difficulty is not None else None,
+            "discrimination": round(discrimination, 4) if discrimination is not None else None,
+            "flags": get_flags(difficulty, discrimination) if difficulty is not None else [],
+            "distractors": [
+                {
+                    "choice_id": choice.id,
+                    "text": choice.text,
+                    "is_correct": choice.is_correct,
+                    "count": picks[column][choice.id],
+                    "rate": round(picks[column][choice.id] / total, 4) if total else None,
+                }
+                for choice in question.choices.all()
+            ],
+            "omitted": total - sum(answered[column]),
+        })
+
+    logger.info(f"analyze_quiz_items: Analyzed {total} attempt(s) on {len(questions)} question(s) of quiz ID '{quiz.id}'")
+    return {
+        "quiz_id": quiz.id,
+        "attempts_analyzed": total,
+        "computed_at": timezone.now().isoformat(),
+        "questions": items,
+    }
+
+
+def get_quiz_item_analysis(quiz, refresh=False):
+    """
+    Returns the cached item analysis of quiz, computing it if missing, expired or refresh is set.
+    The cache key includes Quiz.updated_at, so editing questions or choices recomputes it.
+    """
+    cache_key = f"{CACHE_KEY_PREFIX}:{quiz.id}:{quiz.updated_at.isoformat()}"
+    analysis = None if refresh else cache.get(cache_key)
+    if analysis is None:
+        analysis = analyze_quiz_items(quiz)
+        cache.set(cache_key, analysis, getattr(settings, 'QUIZ_ITEM_ANALYSIS_CACHE_TTL', 600))
+    return analysis
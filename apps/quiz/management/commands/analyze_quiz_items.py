@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.quiz.item_analysis import get_quiz_item_analysis
+from apps.quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Computes the per-question item analysis of quizzes and stores it in the cache served by the stats API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, action='append', dest='quiz_ids', help="Only analyze this quiz (repeatable).")
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.filter(attempts__isnull=False).distinct()
+        if options['quiz_ids']:
+            quizzes = Quiz.objects.filter(id__in=options['quiz_ids'])
+
+        for quiz in quizzes:
+            analysis = get_quiz_item_analysis(quiz, refresh=True)
+            flagged = sum(1 for item in analysis['questions'] if item['flags'])
+            self.stdout.write(f"Quiz {quiz.id} '{quiz.title}': {analysis['attempts_analyzed']} attempt(s), {flagged} flagged question(s).")
+        self.stdout.write(self.style.SUCCESS("Item analysis complete."))
@@ -0,0 +1,46 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from apps.quiz.bulk import grade_quiz_submissions
+from apps.quiz.serializers import BulkQuizAttemptSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Grades quiz submissions from a JSON file (an array, or one object per line) of "
+        "{\"user_id\" or \"username\", \"quiz_id\", \"answers\"} records and records the attempts in bulk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File with the submissions, '-' reads standard input.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Submissions graded per transaction.")
+
+    def read_records(self, path):
+        try:
+            if path == '-':
+                content = sys.stdin.read()
+            else:
+                with open(path, encoding='utf-8') as f:
+                    content = f.read()
+            if content.lstrip().startswith('['):
+                return json.loads(content)
+            return [json.loads(line) for line in content.splitlines() if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read submissions from '{path}': {e}")
+
+    def handle(self, *args, **options):
+        serializer = BulkQuizAttemptSerializer(data=self.read_records(options['path']), many=True)
+        if not serializer.is_valid():
+            invalid = [(index, errors) for index, errors in enumerate(serializer.errors) if errors]
+            raise CommandError(f"{len(invalid)} invalid submission(s), first at index {invalid[0][0]}: {invalid[0][1]}")
+
+        records = serializer.validated_data
+        graded = passed = 0
+        for start in range(0, len(records), options['chunk_size']):
+            outcome = grade_quiz_submissions(records[start:start + options['chunk_size']])
+            graded += outcome['graded']
+            passed += outcome['passed']
+            for error in outcome['errors']:
+                self.stdout.write(self.style.WARNING(f"Submission {start + error['index']} skipped: {error['error']}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Graded {graded} quiz submission(s), {passed} passed."))
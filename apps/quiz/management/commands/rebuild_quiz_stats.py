@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.quiz.stats import rebuild_quiz_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the QuizStats rollups and first-attempt markers from the QuizAttempt table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, action='append', dest='quiz_ids', help="Only rebuild this quiz (repeatable).")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_quiz_stats(quiz_ids=options['quiz_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics of {rebuilt} quiz(zes)."))
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_quiz_stats(apps, schema_editor):
+    """Builds QuizStats and QuizParticipant from the existing attempts, like rebuild_quiz_stats."""
+    QuizAttempt = apps.get_model('quiz', 'QuizAttempt')
+    QuizStats = apps.get_model('quiz', 'QuizStats')
+    QuizParticipant = apps.get_model('quiz', 'QuizParticipant')
+
+    stats, participants = {}, {}
+    for quiz_id, user_id, score, passed, completed_at in QuizAttempt.objects.order_by('completed_at').values_list('quiz_id', 'user_id', 'score', 'passed', 'completed_at').iterator():
+        quiz_stats = stats.setdefault(quiz_id, QuizStats(quiz_id=quiz_id, score_histogram=[0] * 10))
+        quiz_stats.attempts += 1
+        quiz_stats.passes += int(passed)
+        quiz_stats.score_total += score
+        quiz_stats.score_histogram[min(max(score, 0) // 10, 9)] += 1
+        if (quiz_id, user_id) not in participants:
+            participants[(quiz_id, user_id)] = QuizParticipant(quiz_id=quiz_id, user_id=user_id, first_attempt_at=completed_at)
+            quiz_stats.unique_users += 1
+    QuizStats.objects.bulk_create(stats.values())
+    QuizParticipant.objects.bulk_create(participants.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('passes', models.PositiveIntegerField(default=0)),
+                ('score_total', models.BigIntegerField(default=0)),
+                ('score_histogram', models.JSONField(default=list)),
+                ('unique_users', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quiz.quiz')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuizParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_attempt_at', models.DateTimeField()),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='quiz.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_participations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('quiz', 'user')},
+            },
+        ),
+        migrations.RunPython(populate_quiz_stats, migrations.RunPython.noop),
+    ]
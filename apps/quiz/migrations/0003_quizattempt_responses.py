@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_quiz_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='responses',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -44,7 +44,35 @@ class QuizAttempt(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="attempts")
     score = models.IntegerField(default=0)
     passed = models.BooleanField(default=False)
+    responses = models.JSONField(default=list, blank=True)  # [question_id, choice_id, correct] per answer, for item analysis
     completed_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.quiz.title} - {self.score}%"
+
+
+class QuizStats(models.Model):
+    """Running totals of a quiz's attempts, updated as attempts are recorded (see stats.py)."""
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name="stats")
+    attempts = models.PositiveIntegerField(default=0)
+    passes = models.PositiveIntegerField(default=0)
+    score_total = models.BigIntegerField(default=0)  # Sum of the attempt scores, for the average
+    score_histogram = models.JSONField(default=list)  # Attempts per 10-point score bucket, the last one includes 100
+    unique_users = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.quiz.title} - {self.attempts} attempts"
+
+
+class QuizParticipant(models.Model):
+    """Marks the first attempt of a user on a quiz, so QuizStats.unique_users is counted once per user."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="participants")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="quiz_participations")
+    first_attempt_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('quiz', 'user')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.quiz.title}"
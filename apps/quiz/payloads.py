@@ -0,0 +1,73 @@
+"""
+Quiz read path: one query plan for quizzes with their questions and choices, and cached student payloads.
+
+Students get the quiz without Choice.is_correct (StudentQuizSerializer). That JSON is the same for
+every student, so it is rendered once per quiz version and kept in the cache configured in CACHES.
+The version is the quiz's updated_at (bumped by every question and choice change, see answer_keys.py)
+and its lesson's updated_at (for lesson_title). Responses carry an ETag of that version, so a client
+revalidating an unchanged quiz gets a 304 after a single query, without loading questions.
+"""
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+from .models import Quiz
+from .serializers import StudentQuizSerializer
+
+logger = logging.getLogger("quiz")
+
+CACHE_KEY_PREFIX = "quiz:student_payload"
+
+
+def get_quiz_queryset():
+    """Returns quizzes with everything QuizSerializer reads loaded: three queries however many questions."""
+    return Quiz.objects.select_related('lesson', 'created_by').prefetch_related('questions__choices')
+
+
+def can_see_answers(user):
+    """Admins and instructors see which choices are correct, students do not."""
+    return getattr(user, 'role', None) in ['admin', 'instructor']
+
+
+def get_quiz_etag(quiz):
+    """Returns the ETag of the student payload of quiz (its lesson must be loaded)."""
+    version = f"{quiz.id}:{quiz.updated_at.isoformat()}:{quiz.lesson.updated_at.isoformat()}"
+    return f'"quiz-{hashlib.sha256(version.encode()).hexdigest()[:32]}"'
+
+
+def get_student_quiz_payload(quiz, etag=None):
+    """
+    Returns the rendered student JSON of quiz, from the cache or rendered with get_quiz_queryset().
+
+    Args:
+        quiz (Quiz): The quiz, with its lesson loaded.
+        etag (str, optional): Its ETag if already computed.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    cache_key = f"{CACHE_KEY_PREFIX}:{quiz.id}:{etag or get_quiz_etag(quiz)}"
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = JSONRenderer().render(StudentQuizSerializer(get_quiz_queryset().get(pk=quiz.id)).data)
+        cache.set(cache_key, payload, getattr(settings, 'QUIZ_PAYLOAD_CACHE_TTL', 3600))
+        logger.debug(f"Rendered student payload of quiz ID '{quiz.id}' ({len(payload)} bytes)")
+    return payload
+
+
+def student_quiz_response(request, quiz):
+    """
+    Returns the student payload of quiz with its ETag, or a 304 if the request's If-None-Match matches.
+    """
+    etag = get_quiz_etag(quiz)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(get_student_quiz_payload(quiz, etag), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache' # Revalidate every time, the quiz may have changed
+    return response
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from .models import Quiz, Question, Choice, QuizAttempt
 from apps.lessons.models import Lesson
 
@@ -64,6 +65,60 @@ class QuizSerializer(serializers.ModelSerializer):
 
         return data
 
+class StudentChoiceSerializer(ChoiceSerializer):
+    """Choice without is_correct, for students taking the quiz."""
+    class Meta(ChoiceSerializer.Meta):
+        fields = ['id', 'text']
+
+class StudentQuestionSerializer(QuestionSerializer):
+    choices = StudentChoiceSerializer(many=True, read_only=True)
+
+class StudentQuizSerializer(QuizSerializer):
+    """QuizSerializer without the answers, rendered once per quiz version (see payloads.py)."""
+    questions = StudentQuestionSerializer(many=True, read_only=True)
+
+class QuizEditChoiceSerializer(serializers.Serializer):
+    """A choice in a quiz edit: with an id it updates (or deletes) that choice, without one it creates a choice."""
+    id = serializers.IntegerField(required=False)
+    text = serializers.CharField(max_length=255, required=False)
+    is_correct = serializers.BooleanField(required=False)
+    delete = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data.get('id'):
+            if data['delete']:
+                raise serializers.ValidationError({"delete": "Only existing choices can be deleted."})
+            if 'text' not in data:
+                raise serializers.ValidationError({"text": "This field is required for new choices."})
+        return data
+
+class QuizEditQuestionSerializer(serializers.Serializer):
+    """A question in a quiz edit, with the same id/delete semantics as QuizEditChoiceSerializer."""
+    id = serializers.IntegerField(required=False)
+    text = serializers.CharField(required=False)
+    order = serializers.IntegerField(min_value=0, required=False)
+    choices = QuizEditChoiceSerializer(many=True, required=False)
+    delete = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data.get('id'):
+            if data['delete']:
+                raise serializers.ValidationError({"delete": "Only existing questions can be deleted."})
+            if 'text' not in data:
+                raise serializers.ValidationError({"text": "This field is required for new questions."})
+        return data
+
+class QuizEditSerializer(serializers.Serializer):
+    """Payload of the quiz editor (QuizViewSet.bulk_update and QuizManagementView.put)."""
+    questions = QuizEditQuestionSerializer(many=True, required=False, default=list)
+
+    def validate_questions(self, questions):
+        question_ids = [question['id'] for question in questions if question.get('id')]
+        choice_ids = [choice['id'] for question in questions for choice in question.get('choices', []) if choice.get('id')]
+        if len(question_ids) != len(set(question_ids)) or len(choice_ids) != len(set(choice_ids)):
+            raise serializers.ValidationError("Each question and choice can only appear once.")
+        return questions
+
 class QuizAttemptSerializer(serializers.ModelSerializer):
     username = serializers.SerializerMethodField()
     quiz_title = serializers.SerializerMethodField()
@@ -87,3 +142,21 @@ class QuizSubmissionSerializer(serializers.Serializer):
             child=serializers.IntegerField()
         )
     )
+
+
+class BulkQuizAttemptSerializer(QuizSubmissionSerializer):
+    """One record of a bulk submission: a QuizSubmissionSerializer payload plus the user who answered."""
+    user_id = serializers.IntegerField(required=False)
+    username = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if data.get('user_id') is None and not data.get('username'):
+            raise serializers.ValidationError("Either user_id or username is required.")
+        return data
+
+class BulkQuizSubmissionSerializer(serializers.Serializer):
+    submissions = serializers.ListField(
+        child=BulkQuizAttemptSerializer(),
+        allow_empty=False,
+        max_length=getattr(settings, 'QUIZ_BULK_MAX_SUBMISSIONS', 5000)
+    )
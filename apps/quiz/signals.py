@@ -1,11 +1,16 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import QuizAttempt
+from .models import Quiz, Question, Choice, QuizAttempt
+from .answer_keys import invalidate_answer_key, touch_quiz
+from .stats import record_attempts, forget_attempt
 from apps.badges.utils import award_badge_to_user
 import logging
 
 logger = logging.getLogger("quiz")
 
+# Badges awarded when a user's number of distinct passed quizzes reaches the key
+QUIZ_BADGES = {1: "Quiz Novice", 5: "Quiz Master"}
+
 @receiver(post_save, sender=QuizAttempt)
 def check_quiz_badges(sender, instance, created, **kwargs):
     """
@@ -25,10 +30,53 @@ def check_quiz_badges(sender, instance, created, **kwargs):
 
     logger.debug(f"User {user.username} has passed {passed_quizzes_count} unique quizzes")
 
-    if passed_quizzes_count == 1:
-        result = award_badge_to_user(user, "Quiz Novice")
-        logger.info(f"'Quiz Novice' badge processing - Result: {bool(result)}")
+    badge_name = QUIZ_BADGES.get(passed_quizzes_count)
+    if badge_name:
+        result = award_badge_to_user(user, badge_name)
+        logger.info(f"'{badge_name}' badge processing - Result: {bool(result)}")
+
 
-    elif passed_quizzes_count == 5:
-        result = award_badge_to_user(user, "Quiz Master")
-        logger.info(f"'Quiz Master' badge processing - Result: {bool(result)}")
+@receiver(post_save, sender=QuizAttempt)
+def update_quiz_stats(sender, instance, created, **kwargs):
+    """
+    Signal handler that adds a new attempt to the QuizStats of its quiz.
+    Bulk-created attempts send no signal, grade_quiz_submissions() records them itself.
+    """
+    if created:
+        record_attempts([instance])
+
+
+@receiver(post_delete, sender=QuizAttempt)
+def remove_quiz_stats(sender, instance, **kwargs):
+    """
+    Signal handler that takes a deleted attempt out of the QuizStats of its quiz,
+    including attempts deleted along with their user, quiz or lesson.
+    """
+    forget_attempt(instance)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_quiz_answer_key(sender, instance, **kwargs):
+    """
+    Signal handler that drops the cached answer key when a quiz is saved or deleted.
+    Saving changes updated_at, so other processes rebuild their key on the next submission.
+    """
+    invalidate_answer_key(instance.id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def touch_quiz_on_question_change(sender, instance, **kwargs):
+    """
+    Signal handler that gives a quiz a new answer key version when one of its questions or choices changes.
+    """
+    if sender is Question:
+        quiz_id = instance.quiz_id
+    else:
+        quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id is not None: # The question is already gone when a whole quiz is deleted
+        touch_quiz(quiz_id)
+        logger.debug(f"{sender.__name__} '{instance.id}' changed, new answer key version for quiz ID '{quiz_id}'")
@@ -0,0 +1,165 @@
+"""
+Incrementally maintained quiz statistics.
+
+QuizStatsView reads one QuizStats row per quiz instead of aggregating every QuizAttempt. The row is
+updated by record_attempts() whenever attempts are created: by the QuizAttempt post_save handler for
+single submissions, and by grade_quiz_submissions() for bulk inserts (which send no signals). Both run
+in the transaction that inserts the attempts, so an attempt and its share of the totals commit together.
+
+Distinct users are counted with QuizParticipant, one row per (quiz, user) created on the user's first
+attempt. Updates lock the quiz row, so concurrent submissions cannot count a user twice, and
+rebuild_quiz_stats() cannot count an attempt that record_attempts() then adds again.
+
+Deleted attempts (also when a user or lesson is deleted) are taken out by forget_attempt(), from the
+QuizAttempt post_delete handler. `python manage.py rebuild_quiz_stats` recomputes everything from the
+QuizAttempt table, for rows changed outside the ORM.
+"""
+import logging
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from .models import Quiz, QuizAttempt, QuizStats, QuizParticipant
+
+logger = logging.getLogger("quiz")
+
+HISTOGRAM_BUCKETS = 10 # 10-point buckets: [0, 10), [10, 20) ... [90, 100]
+
+
+def get_bucket(score):
+    """Returns the histogram bucket of a score, scores of 100 (or more) fall in the last bucket."""
+    return min(max(int(score), 0) * HISTOGRAM_BUCKETS // 100, HISTOGRAM_BUCKETS - 1)
+
+
+def get_bucket_label(bucket):
+    low = bucket * 100 // HISTOGRAM_BUCKETS
+    high = (bucket + 1) * 100 // HISTOGRAM_BUCKETS
+    return f"{low}-{high}" if bucket == HISTOGRAM_BUCKETS - 1 else f"{low}-{high - 1}"
+
+
+def lock_quizzes(quiz_ids):
+    """
+    Locks the quiz rows whose statistics are about to change, until the end of the transaction.
+    FOR NO KEY UPDATE does not conflict with the key share lock taken by inserting an attempt.
+    """
+    list(Quiz.objects.select_for_update(no_key=True).filter(id__in=quiz_ids).order_by('id').values_list('id', flat=True))
+
+
+def record_attempts(attempts):
+    """
+    Adds newly created attempts to the QuizStats of their quizzes.
+
+    Args:
+        attempts (list): Saved QuizAttempt objects, each passed exactly once.
+    """
+    attempts_by_quiz = defaultdict(list)
+    for attempt in attempts:
+        attempts_by_quiz[attempt.quiz_id].append(attempt)
+
+    with transaction.atomic():
+        lock_quizzes(list(attempts_by_quiz)) # Serializes updates of these quizzes
+        for quiz_id, quiz_attempts in sorted(attempts_by_quiz.items()):
+            stats, _ = QuizStats.objects.get_or_create(quiz_id=quiz_id)
+
+            first_attempts = {}
+            for attempt in sorted(quiz_attempts, key=lambda attempt: attempt.completed_at):
+                first_attempts.setdefault(attempt.user_id, attempt.completed_at)
+            known_users = set(QuizParticipant.objects.filter(quiz_id=quiz_id, user_id__in=first_attempts).values_list('user_id', flat=True))
+            QuizParticipant.objects.bulk_create([
+                QuizParticipant(quiz_id=quiz_id, user_id=user_id, first_attempt_at=first_attempt_at)
+                for user_id, first_attempt_at in first_attempts.items() if user_id not in known_users
+            ])
+
+            histogram = stats.score_histogram or [0] * HISTOGRAM_BUCKETS
+            for attempt in quiz_attempts:
+                histogram[get_bucket(attempt.score)] += 1
+            stats.attempts += len(quiz_attempts)
+            stats.passes += sum(1 for attempt in quiz_attempts if attempt.passed)
+            stats.score_total += sum(int(attempt.score) for attempt in quiz_attempts) # As stored by the IntegerField
+            stats.score_histogram = histogram
+            stats.unique_users += len(first_attempts) - len(known_users)
+            stats.save()
+
+
+def forget_attempt(attempt):
+    """
+    Takes a deleted attempt out of the QuizStats of its quiz, and drops or moves the user's
+    QuizParticipant row depending on the attempts they have left.
+
+    Args:
+        attempt (QuizAttempt): The attempt that was just deleted.
+    """
+    with transaction.atomic():
+        lock_quizzes([attempt.quiz_id])
+        stats = QuizStats.objects.filter(quiz_id=attempt.quiz_id).first()
+        if stats is None: # Never recorded, or the quiz itself is being deleted
+            return
+
+        first_attempt_at = QuizAttempt.objects.filter(quiz_id=attempt.quiz_id, user_id=attempt.user_id).aggregate(first=Min('completed_at'))['first']
+        participants = QuizParticipant.objects.filter(quiz_id=attempt.quiz_id, user_id=attempt.user_id)
+        if first_attempt_at is None:
+            participants.delete()
+        else:
+            participants.update(first_attempt_at=first_attempt_at)
+
+        histogram = stats.score_histogram or [0] * HISTOGRAM_BUCKETS
+        bucket = get_bucket(attempt.score)
+        histogram[bucket] = max(histogram[bucket] - 1, 0)
+        stats.attempts = max(stats.attempts - 1, 0)
+        stats.passes = max(stats.passes - 1, 0) if attempt.passed else stats.passes
+        stats.score_total = max(stats.score_total - int(attempt.score), 0)
+        stats.score_histogram = histogram
+        stats.unique_users = QuizParticipant.objects.filter(quiz_id=attempt.quiz_id).count() # Cascades may delete several attempts of a user at once
+        stats.save()
+
+
+def rebuild_quiz_stats(quiz_ids=None):
+    """
+    Recomputes QuizStats and QuizParticipant from the QuizAttempt table.
+
+    Args:
+        quiz_ids (list, optional): Quizzes to rebuild, defaults to every quiz with attempts or stats.
+
+    Returns:
+        int: Number of quizzes rebuilt.
+    """
+    attempts = QuizAttempt.objects.all()
+    if quiz_ids is not None:
+        attempts = attempts.filter(quiz_id__in=quiz_ids)
+    buckets = {
+        f"bucket_{bucket}": Count('id', filter=Q(score__gte=bucket * 100 // HISTOGRAM_BUCKETS) & (
+            Q(score__lt=(bucket + 1) * 100 // HISTOGRAM_BUCKETS) if bucket < HISTOGRAM_BUCKETS - 1 else Q()
+        ))
+        for bucket in range(HISTOGRAM_BUCKETS)
+    }
+    totals = attempts.values('quiz_id').annotate(
+        attempt_count=Count('id'),
+        pass_count=Count('id', filter=Q(passed=True)),
+        score_sum=Sum('score'),
+        user_count=Count('user', distinct=True),
+        **buckets,
+    )
+
+    with transaction.atomic():
+        lock_quizzes(Quiz.objects.all() if quiz_ids is None else quiz_ids) # Waits for running record_attempts(), totals are read after this
+        stale = QuizStats.objects.all() if quiz_ids is None else QuizStats.objects.filter(quiz_id__in=quiz_ids)
+        stale_participants = QuizParticipant.objects.all() if quiz_ids is None else QuizParticipant.objects.filter(quiz_id__in=quiz_ids)
+        rebuilt = [
+            QuizStats(
+                quiz_id=row['quiz_id'],
+                attempts=row['attempt_count'],
+                passes=row['pass_count'],
+                score_total=row['score_sum'] or 0,
+                score_histogram=[row[f"bucket_{bucket}"] for bucket in range(HISTOGRAM_BUCKETS)],
+                unique_users=row['user_count'],
+            )
+            for row in totals
+        ]
+        stale.delete()
+        stale_participants.delete()
+        QuizStats.objects.bulk_create(rebuilt)
+        QuizParticipant.objects.bulk_create(
+            QuizParticipant(quiz_id=row['quiz_id'], user_id=row['user_id'], first_attempt_at=row['first_attempt_at'])
+            for row in attempts.values('quiz_id', 'user_id').annotate(first_attempt_at=Min('completed_at'))
+        )
+    logger.info(f"rebuild_quiz_stats: Rebuilt statistics of {len(rebuilt)} quiz(zes)")
+    return len(rebuilt)
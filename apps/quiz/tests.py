@@ -1,3 +1,442 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.contrib.auth import get_user_model
+from apps.badges.models import Badge, UserBadge
+from apps.lessons.models import Lesson
+from apps.progress.models import LessonProgress
+from apps.status.models import CompletionStatus
+from apps.quiz.answer_keys import get_answer_key, clear_answer_keys
+from apps.quiz.api_views import SubmitQuizView, BulkSubmitQuizView, QuizViewSet, QuizManagementView, QuizDetailView, QuizStatsView, QuizItemAnalysisView
+from apps.quiz.models import Quiz, Question, Choice, QuizAttempt, QuizStats, QuizParticipant
+from apps.quiz.bulk import grade_quiz_submissions
+from unittest import mock
+import io
+import json
+import tempfile
 
-# Create your tests here.
+User = get_user_model()
+
+
+class QuizAnswerKeyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        self.user = User.objects.create_user(username='testuser_quiz', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title="Test Quiz", description="Test quiz description", passing_score=50)
+        self.questions, self.correct, self.wrong = [], [], []
+        for order in range(4):
+            question = Question.objects.create(quiz=self.quiz, text=f"Question {order}", order=order)
+            self.questions.append(question)
+            self.correct.append(Choice.objects.create(question=question, text="Right", is_correct=True))
+            self.wrong.append(Choice.objects.create(question=question, text="Wrong"))
+        self.factory = APIRequestFactory()
+
+    def submit(self, answers):
+        request = self.factory.post('/api/quiz/submit/', {'quiz_id': self.quiz.id, 'answers': answers}, format='json')
+        force_authenticate(request, user=self.user)
+        return SubmitQuizView.as_view()(request)
+
+    def test_answer_key_grades_without_queries(self):
+        self.quiz.refresh_from_db()
+        with self.assertNumQueries(1):
+            answer_key = get_answer_key(self.quiz)
+        self.assertEqual(answer_key.total_questions, 4)
+        self.assertEqual(answer_key.correct_choices[self.questions[0].id], frozenset({self.correct[0].id}))
+
+        answers = [
+            {str(self.questions[0].id): self.correct[0].id},
+            {str(self.questions[1].id): self.wrong[1].id},
+            {str(self.questions[2].id): self.correct[3].id}, # Correct choice of another question
+            {"not-a-question": self.correct[3].id},
+        ]
+        with self.assertNumQueries(0):
+            self.assertIs(get_answer_key(self.quiz), answer_key)
+            self.assertEqual(answer_key.count_correct(answers), 1)
+
+        clear_answer_keys() # Another process finds the key in the shared cache
+        with self.assertNumQueries(0):
+            self.assertEqual(get_answer_key(self.quiz), answer_key)
+
+    def test_repeated_question_counts_once(self):
+        question = self.questions[0]
+        answers = [{str(question.id): self.wrong[0].id}] + [{str(question.id): self.correct[0].id}] * 8 # First answer wins
+
+        response = self.submit(answers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['score'], 0)
+        self.assertEqual(QuizAttempt.objects.get(pk=response.data['attempt_id']).responses, [[question.id, self.wrong[0].id, 0]])
+
+        response = self.submit([{str(question.id): self.correct[0].id}] * 8)
+        self.assertEqual(response.data['score'], 25) # Not 200
+        self.assertFalse(response.data['passed'])
+
+    def test_question_and_choice_changes_invalidate_the_key(self):
+        answers = [{str(question.id): choice.id} for question, choice in zip(self.questions, self.correct)]
+        response = self.submit(answers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["score"], 100)
+
+        self.correct[0].is_correct = False
+        self.correct[0].save()
+        response = self.submit(answers)
+        self.assertEqual(response.data["score"], 75)
+
+        self.questions[3].delete()
+        response = self.submit(answers)
+        self.assertEqual(response.data["score"], 2 / 3 * 100)
+        self.assertTrue(response.data["passed"])
+        self.assertEqual(QuizAttempt.objects.filter(quiz=self.quiz).count(), 3)
+
+
+class BulkQuizGradingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        self.instructor = User.objects.create_user(username='instructor_bulk', password='testpassword', role='instructor')
+        self.students = [User.objects.create_user(username=f'student_bulk_{i}', password='testpassword') for i in range(12)]
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.instructor)
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title="Bulk Quiz", description="Test quiz description", passing_score=50, created_by=self.instructor)
+        self.question = Question.objects.create(quiz=self.quiz, text="Question", order=1)
+        self.right = Choice.objects.create(question=self.question, text="Right", is_correct=True)
+        self.wrong = Choice.objects.create(question=self.question, text="Wrong")
+        Badge.objects.create(name="Quiz Novice", description="First quiz passed", icon="quiz")
+        Badge.objects.create(name="Lesson Starter", description="First lesson completed", icon="lesson")
+        self.factory = APIRequestFactory()
+
+    def records(self, students, choice):
+        return [{"user_id": student.id, "quiz_id": self.quiz.id, "answers": [{str(self.question.id): choice.id}]} for student in students]
+
+    def bulk_submit(self, submissions, user=None):
+        request = self.factory.post('/api/quiz/submit/bulk/', {'submissions': submissions}, format='json')
+        force_authenticate(request, user=user or self.instructor)
+        return BulkSubmitQuizView.as_view()(request)
+
+    def test_bulk_submission_records_attempts_progress_and_badges_in_bulk(self):
+        saved = []
+        receiver = lambda sender, **kwargs: saved.append(sender)
+        post_save.connect(receiver, sender=QuizAttempt)
+        post_save.connect(receiver, sender=LessonProgress)
+        self.addCleanup(post_save.disconnect, receiver, sender=QuizAttempt)
+        self.addCleanup(post_save.disconnect, receiver, sender=LessonProgress)
+
+        submissions = self.records(self.students[:6], self.right) + self.records(self.students[6:], self.wrong)
+        submissions += [{"username": "nobody", "quiz_id": self.quiz.id, "answers": []}, {"user_id": self.students[0].id, "quiz_id": 0, "answers": []}]
+        response = self.bulk_submit(submissions)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["graded"], response.data["passed"]), (12, 6))
+        self.assertEqual([error["error"] for error in response.data["errors"]], ["User not found", "Quiz not found"])
+        self.assertEqual(saved, []) # No per-row signal fan-out
+        self.assertEqual(QuizAttempt.objects.filter(quiz=self.quiz).count(), 12)
+        self.assertEqual(LessonProgress.objects.filter(lesson=self.lesson).count(), 6)
+        self.assertEqual(CompletionStatus.objects.filter(content_type='quiz', content_id=self.quiz.id, completed=True).count(), 6)
+        self.assertEqual(CompletionStatus.objects.filter(content_type='lesson', content_id=self.lesson.id).count(), 6)
+        self.assertEqual(UserBadge.objects.filter(badge__name="Quiz Novice").count(), 6)
+        self.assertEqual(UserBadge.objects.filter(badge__name="Lesson Starter").count(), 6)
+
+        with CaptureQueriesContext(connection) as few:
+            self.bulk_submit(self.records(self.students[6:7], self.right))
+        with CaptureQueriesContext(connection) as many:
+            self.bulk_submit(self.records(self.students[7:], self.right))
+        self.assertEqual(len(many), len(few)) # Set-based: the query count does not grow with the submissions
+        self.assertEqual(LessonProgress.objects.filter(lesson=self.lesson).count(), 12)
+        self.assertEqual(UserBadge.objects.filter(badge__name="Quiz Novice").count(), 12)
+
+    def test_instructors_only_grade_their_quizzes_and_command_imports_jsonl(self):
+        other = User.objects.create_user(username='other_instructor', password='testpassword', role='instructor')
+        response = self.bulk_submit(self.records(self.students[:1], self.right), user=other)
+        self.assertEqual(response.data["errors"], [{"index": 0, "error": "Quiz not found"}])
+        self.assertEqual(self.bulk_submit([{"quiz_id": self.quiz.id, "answers": []}]).status_code, 400)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            for student in self.students[:3]:
+                f.write(json.dumps({"username": student.username, "quiz_id": self.quiz.id, "answers": [{str(self.question.id): self.right.id}]}) + "\n")
+        call_command('grade_quiz_submissions', f.name, '--chunk-size', '2', stdout=io.StringIO())
+        self.assertEqual(QuizAttempt.objects.filter(passed=True).count(), 3)
+
+
+class QuizEditorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        self.instructor = User.objects.create_user(username='instructor_editor', password='testpassword', role='instructor')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.instructor)
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title="Edited Quiz", description="Test quiz description", created_by=self.instructor)
+        self.question = Question.objects.create(quiz=self.quiz, text="Old question", order=1)
+        self.kept = Choice.objects.create(question=self.question, text="Kept", is_correct=True)
+        self.removed = Choice.objects.create(question=self.question, text="Removed")
+        self.other_question = Question.objects.create(quiz=self.quiz, text="Removed question", order=2)
+        self.factory = APIRequestFactory()
+
+    def bulk_update(self, payload):
+        request = self.factory.post(f'/api/quiz/quizzes/{self.quiz.id}/bulk_update/', payload, format='json')
+        force_authenticate(request, user=self.instructor)
+        return QuizViewSet.as_view({'post': 'bulk_update'})(request, pk=self.quiz.id)
+
+    def test_edit_is_applied_in_bulk(self):
+        payload = {"questions": [
+            {"id": self.question.id, "text": "New question", "choices": [
+                {"id": self.kept.id, "is_correct": False},
+                {"id": self.removed.id, "delete": True},
+                {"text": "Added", "is_correct": True},
+            ]},
+            {"id": self.other_question.id, "delete": True},
+            {"text": "Added question", "choices": [{"text": "A", "is_correct": True}, {"text": "B"}]},
+        ]}
+        response = self.bulk_update(payload)
+
+        self.assertEqual(response.status_code, 200)
+        questions = {question["text"]: question for question in response.data["questions"]}
+        self.assertEqual(set(questions), {"New question", "Added question"})
+        self.assertEqual(questions["Added question"]["order"], 3) # Next order after the existing questions
+        self.assertEqual({choice["text"]: choice["is_correct"] for choice in questions["New question"]["choices"]}, {"Kept": False, "Added": True})
+        self.assertEqual(len(questions["Added question"]["choices"]), 2)
+        self.assertFalse(Choice.objects.filter(pk=self.removed.pk).exists())
+        self.assertEqual(get_answer_key(Quiz.objects.get(pk=self.quiz.pk)).total_questions, 2) # New answer key version
+
+        payload = {"questions": [{"text": f"Question {i}", "choices": [{"text": "A"}, {"text": "B"}]} for i in range(10)]}
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.bulk_update(payload).status_code, 200)
+        self.assertLess(len(queries), 20) # Not one query per question or choice
+
+    def test_invalid_edit_changes_nothing(self):
+        payload = {"questions": [
+            {"id": self.question.id, "text": "Changed"},
+            {"text": "Added question"},
+            {"id": self.question.id, "choices": [{"id": self.kept.id + 1000, "text": "Missing"}]},
+        ]}
+        self.assertEqual(self.bulk_update(payload).status_code, 400) # Duplicate question
+        payload["questions"].pop(2)
+        payload["questions"].append({"id": self.other_question.id, "choices": [{"id": self.kept.id, "text": "Wrong question"}]})
+        self.assertEqual(self.bulk_update(payload).status_code, 404)
+
+        request = self.factory.put(f'/api/quiz/quiz_management/{self.quiz.id}/', {"questions": [{"choices": [{"text": "No question text"}]}]}, format='json')
+        force_authenticate(request, user=self.instructor)
+        self.assertEqual(QuizManagementView.as_view()(request, quiz_id=self.quiz.id).status_code, 400)
+
+        self.question.refresh_from_db()
+        self.kept.refresh_from_db()
+        self.assertEqual(self.question.text, "Old question")
+        self.assertEqual(self.kept.text, "Kept")
+        self.assertEqual(Question.objects.filter(quiz=self.quiz).count(), 2)
+
+
+class QuizReadPathTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username='instructor_read', password='testpassword', role='instructor')
+        self.student = User.objects.create_user(username='student_read', password='testpassword')
+        self.quizzes = []
+        for order in range(2):
+            lesson = Lesson.objects.create(title=f"Lesson {order}", description="Test lesson description", content="Test lesson content", order=order, created_by=self.instructor)
+            quiz = Quiz.objects.create(lesson=lesson, title=f"Quiz {order}", description="Test quiz description", created_by=self.instructor)
+            for number in range(5):
+                question = Question.objects.create(quiz=quiz, text=f"Question {number}", order=number)
+                Choice.objects.create(question=question, text="Right", is_correct=True)
+                Choice.objects.create(question=question, text="Wrong")
+            self.quizzes.append(quiz)
+        self.factory = APIRequestFactory()
+
+    def get_lesson_quiz(self, user, **headers):
+        request = self.factory.get(f'/api/quiz/lesson/{self.quizzes[0].lesson_id}/quiz/', **headers)
+        force_authenticate(request, user=user)
+        return QuizDetailView.as_view()(request, lesson_id=self.quizzes[0].lesson_id)
+
+    def test_missing_lesson_or_quiz_keeps_the_404_bodies(self):
+        empty_lesson = Lesson.objects.create(title="No Quiz", description="Test lesson description", content="Test lesson content", order=5, created_by=self.instructor)
+        missing_lesson = empty_lesson.id + 100
+        for user in (self.student, self.instructor):
+            request = self.factory.get(f'/api/quiz/quizzes/for_lesson/{missing_lesson}/')
+            force_authenticate(request, user=user)
+            response = QuizViewSet.as_view({'get': 'for_lesson'})(request, lesson_id=missing_lesson)
+            self.assertEqual((response.status_code, response.data), (404, {"detail": "No Lesson matches the given query."}))
+
+            request = self.factory.get(f'/api/quiz/quizzes/for_lesson/{empty_lesson.id}/')
+            force_authenticate(request, user=user)
+            response = QuizViewSet.as_view({'get': 'for_lesson'})(request, lesson_id=empty_lesson.id)
+            self.assertEqual((response.status_code, response.data), (404, {"detail": "No Quiz matches the given query."}))
+
+            request = self.factory.get(f'/api/quiz/lesson/{missing_lesson}/quiz/')
+            force_authenticate(request, user=user)
+            response = QuizDetailView.as_view()(request, lesson_id=missing_lesson)
+            self.assertEqual((response.status_code, response.data), (404, {"error": "Lesson not found"}))
+
+            request = self.factory.get(f'/api/quiz/lesson/{empty_lesson.id}/quiz/')
+            force_authenticate(request, user=user)
+            response = QuizDetailView.as_view()(request, lesson_id=empty_lesson.id)
+            self.assertEqual((response.status_code, response.data), (404, {"detail": "No Quiz matches the given query."}))
+
+    def test_student_payload_is_cached_without_answers_and_revalidated_with_etag(self):
+        response = self.get_lesson_quiz(self.student)
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content)
+        self.assertEqual(len(payload["questions"]), 5)
+        self.assertEqual(set(payload["questions"][0]["choices"][0]), {"id", "text"}) # No is_correct for students
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.get_lesson_quiz(self.student)
+        self.assertEqual(response.content, json.dumps(payload, separators=(',', ':')).encode())
+        with self.assertNumQueries(1):
+            response = self.get_lesson_quiz(self.student, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response["ETag"]), (304, etag))
+
+        Choice.objects.filter(question__quiz=self.quizzes[0]).first().delete() # Bumps the quiz version
+        response = self.get_lesson_quiz(self.student, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        response = self.get_lesson_quiz(self.instructor)
+        self.assertIn("is_correct", response.data["questions"][0]["choices"][0])
+
+    def test_quiz_list_uses_a_fixed_number_of_queries(self):
+        request = self.factory.get('/api/quiz/quizzes/')
+        force_authenticate(request, user=self.instructor)
+        with self.assertNumQueries(3): # Quizzes with lesson and creator, questions, choices
+            response = QuizViewSet.as_view({'get': 'list'})(request)
+            response.render()
+        self.assertEqual(len(response.data), 2)
+
+        request = self.factory.get('/api/quiz/quizzes/')
+        force_authenticate(request, user=self.student)
+        response = QuizViewSet.as_view({'get': 'list'})(request)
+        self.assertNotIn("is_correct", response.data[0]["questions"][0]["choices"][0])
+
+
+class QuizStatsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        self.instructor = User.objects.create_user(username='instructor_stats', password='testpassword', role='instructor')
+        self.students = [User.objects.create_user(username=f'student_stats_{i}', password='testpassword') for i in range(3)]
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.instructor)
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title="Stats Quiz", description="Test quiz description", passing_score=50, created_by=self.instructor)
+        self.questions = [Question.objects.create(quiz=self.quiz, text=f"Question {i}", order=i) for i in range(4)]
+        self.right = [Choice.objects.create(question=question, text="Right", is_correct=True) for question in self.questions]
+        self.factory = APIRequestFactory()
+
+    def answers(self, correct):
+        return [{str(question.id): choice.id} for question, choice in zip(self.questions[:correct], self.right)]
+
+    def get_stats(self):
+        request = self.factory.get(f'/api/quiz/quizzes/{self.quiz.id}/stats/')
+        force_authenticate(request, user=self.instructor)
+        with self.assertNumQueries(1): # One row, however many attempts
+            response = QuizStatsView.as_view()(request, quiz_id=self.quiz.id)
+        return response.data
+
+    def test_stats_are_maintained_incrementally_and_rebuilt(self):
+        for student, correct in ((self.students[0], 1), (self.students[0], 4)):
+            request = self.factory.post('/api/quiz/submit/', {'quiz_id': self.quiz.id, 'answers': self.answers(correct)}, format='json')
+            force_authenticate(request, user=student)
+            SubmitQuizView.as_view()(request)
+        grade_quiz_submissions([
+            {"user_id": self.students[1].id, "quiz_id": self.quiz.id, "answers": self.answers(2)},
+            {"user_id": self.students[0].id, "quiz_id": self.quiz.id, "answers": self.answers(3)},
+        ])
+
+        stats = self.get_stats()
+        self.assertEqual((stats['total_attempts'], stats['passing_attempts'], stats['unique_users']), (4, 3, 2))
+        self.assertEqual(stats['avg_score'], (25 + 100 + 50 + 75) / 4)
+        self.assertEqual({bucket['range']: bucket['count'] for bucket in stats['score_distribution'] if bucket['count']}, {"20-29": 1, "50-59": 1, "70-79": 1, "90-100": 1})
+
+        QuizAttempt.objects.filter(user=self.students[1]).delete()
+        stats = self.get_stats()
+        self.assertEqual((stats['total_attempts'], stats['passing_attempts'], stats['unique_users']), (3, 2, 1))
+        call_command('rebuild_quiz_stats', stdout=io.StringIO())
+        stats = self.get_stats()
+        self.assertEqual((stats['total_attempts'], stats['passing_attempts'], stats['unique_users']), (3, 2, 1))
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).score_histogram[9], 1)
+
+    def test_deleted_attempts_are_taken_out_of_the_stats(self):
+        for student, correct in ((self.students[0], 1), (self.students[0], 4), (self.students[1], 2), (self.students[2], 3)):
+            request = self.factory.post('/api/quiz/submit/', {'quiz_id': self.quiz.id, 'answers': self.answers(correct)}, format='json')
+            force_authenticate(request, user=student)
+            SubmitQuizView.as_view()(request)
+
+        QuizAttempt.objects.filter(user=self.students[2]).first().delete()
+        self.students[0].delete() # Cascades to both of their attempts and their participant row
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.attempts, stats.passes, stats.score_total, stats.unique_users), (1, 1, 50, 1))
+        self.assertEqual(stats.score_histogram, [0, 0, 0, 0, 0, 1, 0, 0, 0, 0])
+        self.assertEqual(list(QuizParticipant.objects.filter(quiz=self.quiz).values_list('user_id', flat=True)), [self.students[1].id])
+
+        call_command('rebuild_quiz_stats', stdout=io.StringIO()) # Agrees with the incremental totals
+        rebuilt = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((rebuilt.attempts, rebuilt.passes, rebuilt.score_total, rebuilt.unique_users, rebuilt.score_histogram), (1, 1, 50, 1, stats.score_histogram))
+
+    def test_attempt_is_rolled_back_with_a_failed_stats_update(self):
+        request = self.factory.post('/api/quiz/submit/', {'quiz_id': self.quiz.id, 'answers': self.answers(4)}, format='json')
+        force_authenticate(request, user=self.students[0])
+        with mock.patch('apps.quiz.signals.record_attempts', side_effect=RuntimeError("crash")):
+            with self.assertRaises(RuntimeError):
+                SubmitQuizView.as_view()(request)
+        self.assertFalse(QuizAttempt.objects.exists()) # Not left out of the stats
+        self.assertFalse(LessonProgress.objects.filter(user=self.students[0]).exists())
+
+
+class QuizItemAnalysisTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        self.instructor = User.objects.create_user(username='instructor_items', password='testpassword', role='instructor')
+        self.students = [User.objects.create_user(username=f'student_items_{i}', password='testpassword') for i in range(4)]
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.instructor)
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title="Items Quiz", description="Test quiz description", passing_score=50, created_by=self.instructor)
+        self.choices = []
+        for order in range(3):
+            question = Question.objects.create(quiz=self.quiz, text=f"Question {order}", order=order)
+            self.choices.append((question, Choice.objects.create(question=question, text="Right", is_correct=True), Choice.objects.create(question=question, text="Wrong")))
+        self.factory = APIRequestFactory()
+
+    def answer(self, *picks):
+        """One answer per question: True picks the right choice, False the wrong one, None skips it."""
+        return [{str(question.id): (right if pick else wrong).id} for (question, right, wrong), pick in zip(self.choices, picks) if pick is not None]
+
+    def test_item_analysis_from_recorded_responses(self):
+        request = self.factory.post('/api/quiz/submit/', {'quiz_id': self.quiz.id, 'answers': self.answer(True, True, False)}, format='json')
+        force_authenticate(request, user=self.students[0])
+        SubmitQuizView.as_view()(request)
+        question, right, wrong = self.choices[2]
+        self.assertEqual(QuizAttempt.objects.get().responses[2], [question.id, wrong.id, 0])
+
+        grade_quiz_submissions([
+            {"user_id": self.students[1].id, "quiz_id": self.quiz.id, "answers": self.answer(True, True, False)},
+            {"user_id": self.students[2].id, "quiz_id": self.quiz.id, "answers": self.answer(True, False, False)},
+            {"user_id": self.students[3].id, "quiz_id": self.quiz.id, "answers": self.answer(False, False, None)},
+        ])
+
+        request = self.factory.get(f'/api/quiz/quizzes/{self.quiz.id}/stats/items/')
+        force_authenticate(request, user=self.instructor)
+        analysis = QuizItemAnalysisView.as_view()(request, quiz_id=self.quiz.id).data
+
+        self.assertEqual(analysis["attempts_analyzed"], 4)
+        first, second, third = analysis["questions"]
+        self.assertEqual((first["difficulty"], second["difficulty"], third["difficulty"]), (0.75, 0.5, 0))
+        self.assertEqual(second["discrimination"], 1.0) # Answered right by the top scorers only
+        self.assertEqual(third["flags"], ["too_hard", "low_discrimination"])
+        self.assertEqual([(item["count"], item["is_correct"]) for item in third["distractors"]], [(0, True), (3, False)])
+        self.assertEqual((third["answered"], third["omitted"]), (3, 1))
+
+        QuizAttempt.objects.filter(user=self.students[3]).delete()
+        self.assertEqual(QuizItemAnalysisView.as_view()(request, quiz_id=self.quiz.id).data["attempts_analyzed"], 4) # Cached
+        call_command('analyze_quiz_items', stdout=io.StringIO())
+        self.assertEqual(QuizItemAnalysisView.as_view()(request, quiz_id=self.quiz.id).data["attempts_analyzed"], 3)
+
+    def test_item_analysis_other_instructor_forbidden(self):
+        other = User.objects.create_user(username='instructor_other', password='testpassword', role='instructor')
+        request = self.factory.get(f'/api/quiz/quizzes/{self.quiz.id}/stats/items/')
+        force_authenticate(request, user=other)
+        self.assertEqual(QuizItemAnalysisView.as_view()(request, quiz_id=self.quiz.id).status_code, 403)
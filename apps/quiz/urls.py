@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .api_views import (
     QuizViewSet, QuestionViewSet, ChoiceViewSet,
-    SubmitQuizView, QuizStatsView, QuizManagementView, QuizDetailView
+    SubmitQuizView, BulkSubmitQuizView, QuizStatsView, QuizItemAnalysisView, QuizManagementView, QuizDetailView
 )
 
 # Create a router for viewsets with explicit basename
@@ -17,9 +17,11 @@ urlpatterns = [
 
     # Quiz submission endpoint
     path('submit/', SubmitQuizView.as_view(), name='quiz-submit'),
+    path('submit/bulk/', BulkSubmitQuizView.as_view(), name='quiz-bulk-submit'),
 
     # Quiz statistics endpoint
     path('quizzes/<int:quiz_id>/stats/', QuizStatsView.as_view(), name='quiz-stats'),
+    path('quizzes/<int:quiz_id>/stats/items/', QuizItemAnalysisView.as_view(), name='quiz-item-analysis'),
 
     # Register QuizManagementView (if you want to use this alternative)
     path('quiz_management/<int:quiz_id>/', QuizManagementView.as_view(), name='quiz-management'),
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SandboxConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.sandbox'
+
+    def ready(self):
+        import apps.sandbox.signals
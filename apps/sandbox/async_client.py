@@ -0,0 +1,90 @@
+"""
+Asynchronous HTTP client for the sandbox backends, used by the native async views (async_views.py).
+
+It mirrors client.py: one persistent httpx.AsyncClient with a keep-alive connection pool per backend
+base URL, the same connect/read timeouts and the same retry policy (connection errors and 502/503/504
+responses, with exponential backoff; read timeouts are never retried). An AsyncClient is bound to the
+event loop it was created on, so clients are kept per running loop.
+"""
+import asyncio
+import logging
+import httpx
+from django.conf import settings
+from .client import get_timeout, _backend_key
+
+logger = logging.getLogger("sandbox")
+
+RETRY_STATUSES = (502, 503, 504)
+
+_clients = {} # (event loop, backend key) -> httpx.AsyncClient
+
+
+def get_client(api_url):
+    """
+    Returns the pooled AsyncClient for the backend serving api_url on the running event loop.
+
+    Args:
+        api_url (str): Any URL on the sandbox backend.
+
+    Returns:
+        httpx.AsyncClient: A client shared by all coroutines of this loop talking to that backend.
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, _backend_key(api_url))
+    async_client = _clients.get(key)
+    if async_client is None or async_client.is_closed:
+        for stale_key in [stale_key for stale_key in _clients if stale_key[0].is_closed()]:
+            del _clients[stale_key] # Loop is gone (e.g. an async_to_sync call), so are its connections
+        connect_timeout, read_timeout = get_timeout()
+        async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=getattr(settings, 'SANDBOX_HTTP_POOL_MAXSIZE', 32),
+                max_keepalive_connections=getattr(settings, 'SANDBOX_HTTP_POOL_MAXSIZE', 32),
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=getattr(settings, 'SANDBOX_HTTP_MAX_RETRIES', 2)), # Connect errors only
+            headers={'Content-Type': 'application/json'},
+        )
+        _clients[key] = async_client
+        logger.debug(f"Created pooled async HTTP client for sandbox backend {key[1]}")
+    return async_client
+
+
+async def apost_json(api_url, payload):
+    """
+    POSTs a JSON payload to a sandbox backend through its pooled async client.
+
+    502/503/504 responses are retried up to SANDBOX_HTTP_MAX_RETRIES times, honouring Retry-After.
+
+    Args:
+        api_url (str): The URL of the sandbox API endpoint.
+        payload (dict): The JSON payload to send.
+
+    Returns:
+        httpx.Response: The HTTP response.
+
+    Raises:
+        httpx.HTTPError: On connection errors, timeouts or invalid requests.
+    """
+    retries = getattr(settings, 'SANDBOX_HTTP_MAX_RETRIES', 2)
+    backoff_factor = getattr(settings, 'SANDBOX_HTTP_BACKOFF_FACTOR', 0.3)
+    async_client = get_client(api_url)
+    attempt = 0
+    while True:
+        response = await async_client.post(api_url, json=payload)
+        if response.status_code not in RETRY_STATUSES or attempt >= retries:
+            return response
+        try:
+            delay = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            delay = backoff_factor * (2 ** attempt)
+        attempt += 1
+        logger.debug(f"apost_json: {api_url} answered {response.status_code}, retry {attempt}/{retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+
+async def aclose_clients():
+    """Closes the pooled clients of the running event loop (used on shutdown and in tests)."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _clients if key[0] is loop]:
+        await _clients.pop(key).aclose()
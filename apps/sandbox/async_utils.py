@@ -0,0 +1,349 @@
+"""
+Native async execution path, used by the async views (async_views.py) under an ASGI server.
+
+It follows process_execution_request() in utils.py step by step (result cache, admission control,
+batched or fanned-out test cases, fail-fast, events, execution_finished), but every sandbox call is
+awaited on the async client in async_client.py and the ORM is used through its async API. While an
+execution waits on the sandbox it holds no thread, so one ASGI process can have many executions in
+flight. Everything that does not wait on I/O (payloads, parsing, grading, the result cache, status
+transitions and the ExecutionResult itself) comes from the helpers in utils.py, only the awaiting is
+done here.
+"""
+import asyncio
+import copy
+import logging
+import time
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import ExecutionRequest
+from apps.lessons.models import Exercise
+from . import async_client
+from .nodes import get_node_pool
+from .local import LOCAL_BACKEND, get_local_sandbox
+from .resilience import SandboxUnavailable, get_circuit_breaker, get_admission_controller, execution_scope
+from .signals import execution_finished
+from .events import apublish_event, standard_output_event_data, test_case_event_data
+from .utils import (
+    NODE_FAILURE_ERRORS, get_single_flight_key, build_sandbox_call, build_piston_batch_payload,
+    parse_piston_batch_response, grade_test_case, grade_batch, skip_test_case, is_fail_fast,
+    get_test_case_concurrency, get_batch_inputs, use_result_cache, get_cached_outcome, cache_outcome,
+    get_sandbox_type, get_test_cases, mark_running, mark_deferred, build_failure_result,
+    build_execution_result, get_finished_event_data,
+)
+
+logger = logging.getLogger("sandbox")
+
+
+class AsyncSingleFlight:
+    """
+    Coroutine counterpart of utils.SingleFlight: concurrent identical sandbox calls on one event loop
+    share a single request.
+    """
+
+    def __init__(self):
+        self._calls = {} # (loop, key) -> asyncio.Future
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """
+        Awaits fn() once for all concurrent callers with the same key.
+
+        Returns:
+            The result of fn(); followers receive a deep copy of the leader's result.
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        future = self._calls.get(call_key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return copy.deepcopy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled(): # This caller was cancelled, not the leader
+                    raise
+                return await self.do(key, fn) # The leader was cancelled (fail-fast), run the call ourselves
+
+        future = loop.create_future()
+        self._calls[call_key] = future
+        self.executed += 1
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Mark as retrieved, there may be no follower to read it
+            raise
+        finally:
+            del self._calls[call_key]
+
+    def stats(self):
+        """Returns the executed/coalesced counters."""
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+
+async_single_flight = AsyncSingleFlight()
+
+
+async def asend_sandbox_request(api_url, payload):
+    """
+    Async counterpart of utils.send_sandbox_request().
+
+    Returns:
+        tuple: (data, error) where data is the JSON response (None on failure) and error is None or
+               one of 'connection', 'timeout', 'server', 'client', 'invalid_response'.
+    """
+    try:
+        logger.debug(f"Sending async request to sandbox API: {api_url}. Payload: {payload}")
+        response = await async_client.apost_json(api_url, payload)
+        response.raise_for_status()
+        return response.json(), None
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Error communicating with sandbox API at {api_url}: {e}. Response content: {e.response.content}")
+        return None, 'client' if e.response.status_code < 500 else 'server'
+    except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+        logger.error(f"Error communicating with sandbox API at {api_url}: {e!r}")
+        return None, 'connection'
+    except httpx.TimeoutException as e:
+        logger.error(f"Error communicating with sandbox API at {api_url}: {e!r}")
+        return None, 'timeout'
+    except httpx.HTTPError as e: # Connection dropped mid-response, protocol errors
+        logger.error(f"Error communicating with sandbox API at {api_url}: {e!r}")
+        return None, 'server'
+    except ValueError as e: # Response body was not valid JSON
+        logger.error(f"Invalid JSON response from sandbox API at {api_url}: {e}")
+        return None, 'invalid_response'
+
+
+async def asend_to_node(backend, payload):
+    """Async counterpart of utils.send_to_node(). Returns (data, error)."""
+    pool = get_node_pool(backend)
+    node = pool.acquire()
+    data, error = await asend_sandbox_request(node.url, payload)
+    pool.release(node, success=error not in NODE_FAILURE_ERRORS)
+
+    if error == 'connection' and len(pool.nodes) > 1: # The request never reached the node, safe to fail over
+        failover_node = pool.acquire(exclude=node)
+        logger.warning(f"Sandbox node {node.url} unreachable, failing over to {failover_node.url}")
+        data, error = await asend_sandbox_request(failover_node.url, payload)
+        pool.release(failover_node, success=error not in NODE_FAILURE_ERRORS)
+    return data, error
+
+
+async def asend_to_backend(backend, payload):
+    """
+    Async counterpart of utils.send_to_backend(), going through the backend's node pool and circuit breaker.
+
+    Raises:
+        SandboxUnavailable: If the backend's circuit is open.
+    """
+    if backend == LOCAL_BACKEND:
+        return await sync_to_async(get_local_sandbox().execute, thread_sensitive=False)(payload) # Waits on the subprocess in a worker thread
+    if not getattr(settings, 'SANDBOX_CIRCUIT_BREAKER_ENABLED', True):
+        return (await asend_to_node(backend, payload))[0]
+
+    breaker = get_circuit_breaker(backend)
+    breaker.before_call() # Fails fast while the backend is known to be down
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    data, error = await asend_to_node(backend, payload)
+    breaker.record(error not in NODE_FAILURE_ERRORS, loop.time() - started)
+    return data
+
+
+async def aexecute_on_backend(backend, payload):
+    """Async counterpart of utils.execute_on_backend(), sharing identical in-flight calls."""
+    if not getattr(settings, 'SANDBOX_SINGLE_FLIGHT_ENABLED', True):
+        return await asend_to_backend(backend, payload)
+    key = get_single_flight_key(backend, payload)
+    return await async_single_flight.do(key, lambda: asend_to_backend(backend, payload))
+
+
+async def aexecute_in_sandbox(sandbox_type, execution_request, test_input=None):
+    """
+    Async counterpart of utils.execute_in_sandbox().
+
+    Returns:
+        tuple: (compile_output, compile_error, run_output, run_error, metrics) or all None on failure.
+    """
+    backend, payload, parse = build_sandbox_call(sandbox_type, execution_request, test_input)
+    started = time.monotonic()
+    return parse(await aexecute_on_backend(backend, payload), time.monotonic() - started)
+
+
+async def aexecute_piston_batch(execution_request, inputs, stop_on_error_from=None):
+    """Async counterpart of utils.execute_piston_batch()."""
+    piston_payload, nonce = build_piston_batch_payload(execution_request, inputs, stop_on_error_from)
+    piston_data = await aexecute_on_backend('piston', piston_payload)
+    return parse_piston_batch_response(execution_request, piston_data, nonce, len(inputs), allow_partial=stop_on_error_from is not None)
+
+
+async def apublish_results(request_id, standard_outputs, test_case_results, cached=False):
+    """Async counterpart of utils.publish_results()."""
+    await apublish_event(request_id, 'standard_output', standard_output_event_data(standard_outputs, cached=cached))
+    for index, result in enumerate(test_case_results):
+        await apublish_event(request_id, 'test_case', test_case_event_data(index, result, cached=cached))
+
+
+async def aexecute_with_test_cases(execution_request, sandbox_type, test_cases):
+    """
+    Async counterpart of utils.execute_with_test_cases().
+
+    The standard run and the test cases run as tasks on the event loop, at most
+    get_test_case_concurrency() of them talking to the sandbox at once. In fail-fast mode, test cases
+    still waiting for their turn are cancelled after the first failure and reported as skipped;
+    test cases already running finish and keep their real result.
+
+    Returns:
+        tuple: ((compile_output, compile_error, run_output, run_error, metrics), test_case_results)
+    """
+    test_cases = test_cases or []
+    fail_fast = is_fail_fast(execution_request)
+
+    inputs = get_batch_inputs(execution_request, sandbox_type, test_cases)
+    if inputs is not None:
+        # One Piston job for the standard run and all test cases
+        batch = await aexecute_piston_batch(execution_request, inputs, stop_on_error_from=1 if fail_fast else None)
+        if batch is not None:
+            standard_outputs, test_case_results = grade_batch(test_cases, batch)
+            await apublish_results(execution_request.id, standard_outputs, test_case_results)
+            return standard_outputs, test_case_results
+        logger.warning(f"aexecute_with_test_cases: Batched execution failed for request ID '{execution_request.id}', falling back to one call per test case")
+
+    semaphore = asyncio.Semaphore(get_test_case_concurrency(len(test_cases) + 1))
+    started = set() # Indexes of test cases that got past the semaphore
+
+    async def run_standard():
+        async with semaphore:
+            outputs = await aexecute_in_sandbox(sandbox_type, execution_request)
+        await apublish_event(execution_request.id, 'standard_output', standard_output_event_data(outputs))
+        return outputs
+
+    async def run_test_case(index, test_case):
+        async with semaphore:
+            started.add(index)
+            run_output, run_error, metrics = (await aexecute_in_sandbox(sandbox_type, execution_request, test_input=test_case.get("input", "")))[2:]
+        result = grade_test_case(test_case, run_output, run_error, metrics)
+        await apublish_event(execution_request.id, 'test_case', test_case_event_data(index, result))
+        return result
+
+    standard_task = asyncio.create_task(run_standard())
+    test_case_tasks = [asyncio.create_task(run_test_case(index, test_case)) for index, test_case in enumerate(test_cases)]
+    if fail_fast:
+        for next_done in asyncio.as_completed(test_case_tasks):
+            try:
+                result = await next_done
+            except asyncio.CancelledError:
+                continue
+            if not result["passed"]:
+                cancelled = sum(1 for index, task in enumerate(test_case_tasks) if index not in started and task.cancel()) # Stop scheduling the rest
+                logger.debug(f"aexecute_with_test_cases: Fail-fast for request ID '{execution_request.id}', {cancelled} test case(s) skipped")
+                break
+    await asyncio.gather(standard_task, *test_case_tasks, return_exceptions=True)
+
+    test_case_results = []
+    for index, (test_case, task) in enumerate(zip(test_cases, test_case_tasks)): # Preserve test case order
+        if task.cancelled():
+            result = skip_test_case(test_case)
+            await apublish_event(execution_request.id, 'test_case', test_case_event_data(index, result))
+        else:
+            result = task.result() # Re-raises SandboxUnavailable
+        test_case_results.append(result)
+    return standard_task.result(), test_case_results
+
+
+async def aexecute_admitted(execution_request, sandbox_type, test_cases):
+    """
+    Runs aexecute_with_test_cases while holding one of the backend's admission slots, in one
+    execution_scope() (tasks inherit it with the context they are created in).
+    """
+    with execution_scope(execution_request.id):
+        if not getattr(settings, 'SANDBOX_ADMISSION_CONTROL_ENABLED', True):
+            return await aexecute_with_test_cases(execution_request, sandbox_type, test_cases)
+        async with get_admission_controller(sandbox_type).aadmit():
+            return await aexecute_with_test_cases(execution_request, sandbox_type, test_cases)
+
+
+async def aexecute_with_result_cache(execution_request, sandbox_type, test_cases, use_cache=True):
+    """
+    Async counterpart of utils.execute_with_result_cache(); both paths share the same result cache.
+
+    Raises:
+        SandboxUnavailable: If the backend is saturated or its circuit is open.
+    """
+    if not use_result_cache(use_cache):
+        return await aexecute_admitted(execution_request, sandbox_type, test_cases), False
+
+    cache_key, cached = get_cached_outcome(execution_request, sandbox_type)
+    if cached is not None:
+        await apublish_results(execution_request.id, *cached, cached=True)
+        return cached, True
+
+    outcome = await aexecute_admitted(execution_request, sandbox_type, test_cases)
+    cache_outcome(cache_key, execution_request, outcome)
+    return outcome, False
+
+
+async def afinish_execution(execution_request, execution_result, success):
+    """Async counterpart of utils.finish_execution()."""
+    await execution_result.asave()
+    await execution_request.asave(update_fields=['status'])
+    await apublish_event(execution_request.id, 'finished', get_finished_event_data(execution_request, execution_result, success))
+    await execution_finished.asend(sender=ExecutionRequest, execution_request=execution_request, execution_result=execution_result, success=success)
+    return execution_result
+
+
+async def afail_refused_request(execution_request, error):
+    """Async counterpart of utils.fail_refused_request()."""
+    return await afinish_execution(execution_request, build_failure_result(execution_request, error), False)
+
+
+async def aprocess_execution_request(execution_request, use_cache=True):
+    """
+    Async counterpart of utils.process_execution_request(): runs an ExecutionRequest end to end and
+    sends execution_finished once it is final.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        use_cache (bool): False to bypass the execution result cache.
+
+    Returns:
+        tuple: (execution_result, execution_success), see utils.process_execution_request.
+
+    Raises:
+        SandboxUnavailable: If the sandbox refused the execution; a queued job is put back to 'pending',
+                            any other request is marked 'failed' with an error result.
+    """
+    if execution_request.exercise_id is not None and not ExecutionRequest.exercise.is_cached(execution_request):
+        execution_request.exercise = await Exercise.objects.aget(pk=execution_request.exercise_id) # Lazy loading is sync-only
+
+    update_fields = mark_running(execution_request)
+    if update_fields:
+        await execution_request.asave(update_fields=update_fields)
+    await apublish_event(execution_request.id, 'started')
+
+    sandbox_type = get_sandbox_type(execution_request)
+    test_cases = get_test_cases(execution_request)
+    logger.debug(f"aprocess_execution_request: Executing request ID '{execution_request.id}' with {sandbox_type} sandbox, {len(test_cases)} test case(s)")
+    try:
+        outcome, cached = await aexecute_with_result_cache(execution_request, sandbox_type, test_cases, use_cache=use_cache)
+    except SandboxUnavailable as e:
+        logger.warning(f"Execution request ID '{execution_request.id}' rejected by the {e.backend} sandbox: {e}")
+        if execution_request.queued_at is None:
+            await afail_refused_request(execution_request, e)
+            raise
+        await execution_request.asave(update_fields=mark_deferred(execution_request))
+        await apublish_event(execution_request.id, 'deferred', {"reason": str(e), "retry_after": e.retry_after})
+        raise
+
+    execution_result, execution_success = build_execution_result(execution_request, sandbox_type, outcome, test_cases, cached=cached)
+    return await afinish_execution(execution_request, execution_result, execution_success), execution_success
@@ -0,0 +1,105 @@
+"""
+Native async versions of the execution endpoints in api_views.py, for deployments served over ASGI
+(icpp/asgi.py under uvicorn).
+
+They accept the same input and return the same responses as their DRF counterparts, but await the
+sandbox through async_utils.py, so a request waiting on the sandbox does not hold a worker thread.
+"""
+import logging
+import math
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.urls import reverse
+from apps.common.async_views import AsyncAPIView
+from apps.common.throttling import ExecutionRateThrottle, aexecution_slot
+from .serializers import ExecutionRequestSerializer, ExecutionResultSerializer, get_bypass_cache
+from .models import ExecutionRequest, ExecutionResult
+from .services import queue_execution_request, rerun_execution_request
+from .async_utils import aprocess_execution_request
+from .resilience import SandboxUnavailable
+
+logger = logging.getLogger("sandbox")
+
+
+def save_execution_request(data, user):
+    """Validates and saves a new ExecutionRequest. Returns (execution_request, errors)."""
+    serializer = ExecutionRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    execution_request = serializer.save(user=user)
+    logger.info(f"Execution request created by user '{user.username}' with ID '{execution_request.id}', sandbox: '{execution_request.sandbox}'.")
+    return execution_request, None
+
+
+class ExecutionRequestAsyncView(AsyncAPIView):
+    """
+    Async counterpart of ExecutionRequestAPIView: creates an ExecutionRequest and executes it.
+    """
+    throttle_classes = [ExecutionRateThrottle]
+
+    async def post(self, request, *args, **kwargs):
+        if request.data.get('mode') == 'async':
+            return await self.execute(request, run_async=True) # Concurrency is bounded by the workers
+        async with aexecution_slot(request.user): # Raises Throttled (429) before anything is saved
+            return await self.execute(request)
+
+    async def execute(self, request, run_async=False):
+        execution_request = None
+        existing_request_id = request.data.get('existing_request_id')
+        if existing_request_id:
+            # Runs the user's earlier request again as a new request, its result stays with the old one
+            execution_request = await sync_to_async(rerun_execution_request)(request.user, existing_request_id)
+
+        if execution_request is None:
+            execution_request, errors = await sync_to_async(save_execution_request)(request.data, request.user)
+            if errors:
+                logger.warning(f"ExecutionRequestAsyncView: Invalid execution request data from user '{request.user.username}': {errors}")
+                return JsonResponse(errors, status=400)
+
+        if run_async:
+            # Job mode: hand the request to the background workers and let the client poll for the result
+            await sync_to_async(queue_execution_request)(execution_request)
+            return JsonResponse({
+                "id": execution_request.id,
+                "status": execution_request.status,
+                "result_url": reverse('async-get-execution-result', kwargs={'request_id': execution_request.id}),
+                "events_url": reverse('execution-events', kwargs={'request_id': execution_request.id}),
+            }, status=202)
+
+        try:
+            execution_result, execution_success = await aprocess_execution_request(
+                execution_request,
+                use_cache=not get_bypass_cache(request.data) # Force a fresh sandbox run
+            )
+        except SandboxUnavailable as e:
+            response = JsonResponse({"error": str(e), "id": execution_request.id, "status": execution_request.status}, status=503)
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
+
+        result_data = ExecutionResultSerializer(execution_result).data
+        return JsonResponse(result_data, status=201 if execution_success else 500)
+
+
+class ExecutionResultAsyncView(AsyncAPIView):
+    """
+    Async counterpart of ExecutionResultAPIView: returns the ExecutionResult of an ExecutionRequest.
+    """
+
+    async def get(self, request, request_id, *args, **kwargs):
+        execution_request = await ExecutionRequest.objects.filter(pk=request_id).afirst()
+        if execution_request is None:
+            logger.warning(f"Execution request with ID '{request_id}' not found.")
+            return JsonResponse({"error": "Execution request not found."}, status=404)
+        if execution_request.user_id != request.user.pk: # Basic authorization: only the requester can see the result for now
+            logger.warning(f"User '{request.user.username}' attempted to access execution result for request ID '{request_id}' belonging to another user.")
+            return JsonResponse({"error": "Unauthorized access."}, status=403)
+
+        if execution_request.status in ('pending', 'running'):
+            # Queued jobs have no result yet, tell the client to keep polling
+            return JsonResponse({"id": execution_request.id, "status": execution_request.status}, status=202)
+
+        execution_result = await ExecutionResult.objects.filter(request=execution_request).afirst()
+        if execution_result is None:
+            logger.warning(f"Execution result not found for request ID '{request_id}'. Result might still be pending.")
+            return JsonResponse({"error": "Execution result not yet available."}, status=404)
+        return JsonResponse(ExecutionResultSerializer(execution_result).data, status=200)
@@ -0,0 +1,135 @@
+"""
+Content-addressed cache of sandbox execution outcomes.
+
+Students resubmit identical code all the time. The outcome of an execution (compile/run output and
+test results) only depends on the code, its stdin/args, the sandbox backend and language version,
+and the exercise test cases, so it is cached under a hash of exactly those inputs. Entries expire
+after a TTL and the least recently used entries are evicted once the cache is full.
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+logger = logging.getLogger("sandbox")
+
+
+def get_test_cases_version(exercise):
+    """
+    Returns a fingerprint of an exercise's test cases.
+
+    Args:
+        exercise (Exercise or None): The exercise the execution belongs to.
+
+    Returns:
+        str: Hash of the exercise id and its test cases, or an empty string without an exercise.
+    """
+    if exercise is None:
+        return ""
+    test_cases = json.dumps(exercise.test_cases or [], sort_keys=True)
+    return hashlib.sha256(f"{exercise.id}:{test_cases}".encode()).hexdigest()
+
+
+def make_cache_key(execution_request, sandbox_type, language_version, fail_fast=False):
+    """
+    Builds the cache key for an execution request.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        sandbox_type (str): The sandbox backend that runs the code.
+        language_version (str): Language and version the backend runs, e.g. "python-3.10.0".
+        fail_fast (bool): Whether test evaluation stops at the first failure (changes test_results).
+
+    Returns:
+        str: SHA-256 hex digest of (code, stdin, args, sandbox, language version, test cases version, fail-fast).
+    """
+    material = json.dumps([
+        execution_request.code,
+        execution_request.stdin or '',
+        execution_request.args or '',
+        sandbox_type,
+        language_version,
+        get_test_cases_version(execution_request.exercise),
+        fail_fast,
+    ])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ExecutionResultCache:
+    """Thread-safe in-process LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_entries=1024, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, exercise_id, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns a copy of the cached value for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[2]
+        return copy.deepcopy(value) # Callers may mutate test_results
+
+    def set(self, key, value, exercise_id=None):
+        """Stores value under key, evicting the least recently used entries if needed."""
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, exercise_id, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_exercise(self, exercise_id):
+        """Drops every entry computed against the given exercise's test cases."""
+        with self._lock:
+            stale_keys = [key for key, entry in self._entries.items() if entry[1] == exercise_id]
+            for key in stale_keys:
+                del self._entries[key]
+            self.invalidations += len(stale_keys)
+        if stale_keys:
+            logger.debug(f"Invalidated {len(stale_keys)} cached execution result(s) for exercise ID '{exercise_id}'")
+        return len(stale_keys)
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        """Returns the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+result_cache = ExecutionResultCache(
+    max_entries=getattr(settings, 'SANDBOX_RESULT_CACHE_MAX_ENTRIES', 1024),
+    ttl=getattr(settings, 'SANDBOX_RESULT_CACHE_TTL', 600),
+)
@@ -0,0 +1,128 @@
+"""
+Shared HTTP client for the sandbox backends.
+
+Every backend base URL (scheme + host + port) gets one persistent requests.Session with its own
+keep-alive connection pool, so executions reuse TCP connections instead of opening a new one per
+call. All calls carry connect/read timeouts, and failures that are safe to repeat are retried with
+exponential backoff.
+"""
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+logger = logging.getLogger("sandbox")
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_timeout():
+    """Returns the (connect, read) timeout tuple used for sandbox API calls."""
+    return (
+        getattr(settings, 'SANDBOX_HTTP_CONNECT_TIMEOUT', 3.05),
+        getattr(settings, 'SANDBOX_HTTP_READ_TIMEOUT', 30),
+    )
+
+
+def build_retry():
+    """
+    Builds the retry policy for sandbox API calls.
+
+    Only failures where the sandbox cannot have run the code are retried: connection errors
+    (the request never reached the backend) and 502/503/504 responses from a proxy or an
+    overloaded backend. Read timeouts are not retried, since the program may already be running.
+    """
+    retries = getattr(settings, 'SANDBOX_HTTP_MAX_RETRIES', 2)
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        other=0,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']), # Sandbox executions have no side effects outside the sandbox
+        backoff_factor=getattr(settings, 'SANDBOX_HTTP_BACKOFF_FACTOR', 0.3),
+        raise_on_status=False, # Let raise_for_status() report the final response
+        respect_retry_after_header=True,
+    )
+
+
+def _backend_key(api_url):
+    parts = urlsplit(api_url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(api_url):
+    """
+    Returns the pooled session for the backend serving api_url, creating it on first use.
+
+    Args:
+        api_url (str): Any URL on the sandbox backend.
+
+    Returns:
+        requests.Session: A session shared by all threads talking to that backend.
+    """
+    key = _backend_key(api_url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            adapter = HTTPAdapter(
+                pool_connections=getattr(settings, 'SANDBOX_HTTP_POOL_CONNECTIONS', 4),
+                pool_maxsize=getattr(settings, 'SANDBOX_HTTP_POOL_MAXSIZE', 32),
+                max_retries=build_retry(),
+                pool_block=False,
+            )
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            _sessions[key] = session
+            logger.debug(f"Created pooled HTTP session for sandbox backend {key}")
+    return session
+
+
+def post_json(api_url, payload):
+    """
+    POSTs a JSON payload to a sandbox backend through its pooled session.
+
+    Args:
+        api_url (str): The URL of the sandbox API endpoint.
+        payload (dict): The JSON payload to send.
+
+    Returns:
+        requests.Response: The HTTP response.
+
+    Raises:
+        requests.exceptions.RequestException: On connection errors, timeouts or exhausted retries.
+    """
+    return get_session(api_url).post(api_url, json=payload, timeout=get_timeout())
+
+
+def get(api_url, timeout=None):
+    """
+    Sends a GET request to a sandbox backend through its pooled session.
+
+    Args:
+        api_url (str): The URL to fetch.
+        timeout (float or tuple, optional): Overrides the configured timeouts.
+
+    Returns:
+        requests.Response: The HTTP response.
+    """
+    return get_session(api_url).get(api_url, timeout=timeout or get_timeout())
+
+
+def close_sessions():
+    """Closes all pooled sessions (used on shutdown and in tests after changing settings)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
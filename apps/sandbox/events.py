@@ -0,0 +1,122 @@
+"""
+Per-execution event log used by the progress stream (see streams.py).
+
+Events are appended to a short-lived log in Django's cache, so they reach a stream served by any app
+process. Each execution request has a counter (cache.incr) numbering its events from 1, and every
+event is stored under its own key. Readers fetch everything after the last number they have seen,
+which also lets a reconnecting EventSource resume from its Last-Event-ID.
+
+Event types: 'queued', 'started', 'deferred' (sandbox unavailable, the job stays queued),
+'standard_output', 'test_case' and 'finished'.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger("sandbox")
+
+EVENT_PREFIX = "execution-events"
+FINISHED = 'finished'
+
+
+def _seq_key(request_id):
+    return f"{EVENT_PREFIX}:{request_id}:seq"
+
+
+def _event_key(request_id, seq):
+    return f"{EVENT_PREFIX}:{request_id}:{seq}"
+
+
+def publish_event(request_id, event_type, data=None):
+    """
+    Appends an event to the log of an execution request.
+
+    Publishing never fails the execution: cache errors are logged and the event is dropped.
+
+    Args:
+        request_id (int): The ExecutionRequest ID.
+        event_type (str): One of the event types listed in the module docstring.
+        data (dict, optional): JSON-serializable event payload.
+
+    Returns:
+        int or None: The event's sequence number, or None if events are disabled or publishing failed.
+    """
+    if not getattr(settings, 'SANDBOX_EVENTS_ENABLED', True):
+        return None
+    ttl = getattr(settings, 'SANDBOX_EVENTS_TTL', 600)
+    try:
+        cache.add(_seq_key(request_id), 0, timeout=ttl)
+        seq = cache.incr(_seq_key(request_id))
+        cache.set(_event_key(request_id, seq), {"event": event_type, "data": data or {}}, timeout=ttl)
+        return seq
+    except Exception as e:
+        logger.warning(f"publish_event: Could not publish '{event_type}' event for request ID '{request_id}': {e}")
+        return None
+
+
+async def apublish_event(request_id, event_type, data=None):
+    """Async counterpart of publish_event(), used by the native async execution path (async_utils.py)."""
+    if not getattr(settings, 'SANDBOX_EVENTS_ENABLED', True):
+        return None
+    ttl = getattr(settings, 'SANDBOX_EVENTS_TTL', 600)
+    try:
+        await cache.aadd(_seq_key(request_id), 0, timeout=ttl)
+        seq = await cache.aincr(_seq_key(request_id))
+        await cache.aset(_event_key(request_id, seq), {"event": event_type, "data": data or {}}, timeout=ttl)
+        return seq
+    except Exception as e:
+        logger.warning(f"apublish_event: Could not publish '{event_type}' event for request ID '{request_id}': {e}")
+        return None
+
+
+async def aread_events(request_id, after=0):
+    """
+    Returns the events of an execution request published after a given sequence number.
+
+    Args:
+        request_id (int): The ExecutionRequest ID.
+        after (int): Last sequence number the reader has already seen.
+
+    Returns:
+        list: [(seq, {"event": ..., "data": ...}), ...] in publishing order. An event whose key was
+              written after its number was taken (or has expired) ends the batch, so no event is
+              ever skipped.
+    """
+    last = await cache.aget(_seq_key(request_id), 0)
+    if last <= after:
+        return []
+    keys = [_event_key(request_id, seq) for seq in range(after + 1, last + 1)]
+    stored = await cache.aget_many(keys)
+    events = []
+    for seq, key in zip(range(after + 1, last + 1), keys):
+        if key not in stored:
+            break
+        events.append((seq, stored[key]))
+    return events
+
+
+def standard_output_event_data(outputs, cached=False):
+    """Builds the payload of a 'standard_output' event from a (compile_output, compile_error, run_output, run_error, metrics) tuple."""
+    compile_output, compile_error, run_output, run_error, metrics = outputs
+    return {
+        "compile_output": compile_output,
+        "compile_error": compile_error,
+        "output": run_output,
+        "error": run_error,
+        "metrics": metrics,
+        "sandbox_failed": all(output is None for output in outputs),
+        "cached": cached,
+    }
+
+
+def test_case_event_data(index, result, cached=False):
+    """Builds the payload of a 'test_case' event from a test_results entry."""
+    return {
+        "index": index,
+        "test_case": result["test_case"],
+        "passed": result["passed"],
+        "skipped": result.get("skipped", False),
+        "actual_output": result["actual_output"],
+        "error": result["error"],
+        "cached": cached,
+    }
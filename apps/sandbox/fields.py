@@ -0,0 +1,37 @@
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+from .output import compress_text, decompress_text
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Decompresses the stored value the first time the attribute is read, then keeps the text.
+    Defines __set__ so that it is a data descriptor and reads go through __get__ even once the
+    loaded value is in the instance __dict__.
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if instance is None:
+            return value
+        text = decompress_text(value)
+        if text is not value:
+            instance.__dict__[self.field.attname] = text
+        return text
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField storing large values zlib-compressed (see output.py).
+
+    Values below SANDBOX_OUTPUT_COMPRESS_MIN_BYTES are stored as plain text, so the column stays
+    searchable for typical output and existing rows need no conversion. Loading a row does not
+    decompress anything; values()/values_list() return the stored form, use decompress_text() on it.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def get_prep_value(self, value):
+        return compress_text(super().get_prep_value(value))
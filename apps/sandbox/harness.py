@@ -0,0 +1,168 @@
+"""
+Multi-test harness for running all test inputs of a submission in a single Piston job.
+
+Instead of one Piston /execute call per test case, the user code is uploaded once as main.py next to
+a generated harness.py entry point. The harness runs main.py in a fresh interpreter subprocess for
+each input, captures stdout/stderr separately together with the run's exit code, signal, wall time,
+CPU time and memory, and prints all results as one JSON document framed by markers that include a
+per-submission nonce. Because the user program's output is captured by the harness, nothing it
+prints can be mistaken for (or corrupt) the result frame.
+
+The nonce is derived from the submission content, so identical submissions produce identical
+payloads and can share one in-flight sandbox job (see SingleFlight in utils.py).
+
+Expected outputs never enter the sandbox, so the harness cannot grade. In fail-fast mode it stops at
+the first run that exits with an error or writes to stderr; wrong-output failures are only detected
+after the job returns.
+"""
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger("sandbox")
+
+HARNESS_FILENAME = "harness.py"
+USER_CODE_FILENAME = "main.py"
+
+HARNESS_TEMPLATE = '''import json
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+INPUTS = json.loads({inputs!r})
+ARGS = json.loads({args!r})
+TIMEOUT = {timeout!r}
+MAX_OUTPUT_BYTES = {max_output_bytes!r}
+STOP_ON_ERROR_FROM = {stop_on_error_from!r}
+BEGIN = {begin!r}
+END = {end!r}
+
+def capture(data):
+    return data[:MAX_OUTPUT_BYTES].decode(errors="replace"), len(data) # Original size, the caller adds the marker
+
+
+def usage():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.monotonic(), children.ru_utime + children.ru_stime, children.ru_maxrss
+
+
+results = []
+for index, stdin in enumerate(INPUTS):
+    started, cpu_started, _ = usage()
+    try:
+        completed = subprocess.run(
+            [sys.executable, {user_file!r}, *ARGS],
+            input=stdin.encode(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=TIMEOUT,
+        )
+        stdout, stdout_bytes = capture(completed.stdout)
+        stderr, stderr_bytes = capture(completed.stderr)
+        results.append({{
+            "stdout": stdout,
+            "stderr": stderr,
+            "stdout_bytes": stdout_bytes,
+            "stderr_bytes": stderr_bytes,
+            "code": completed.returncode if completed.returncode >= 0 else None,
+            "signal": signal.Signals(-completed.returncode).name if completed.returncode < 0 else None,
+            "timed_out": False,
+        }})
+    except subprocess.TimeoutExpired as e:
+        stdout, stdout_bytes = capture(e.stdout or b"")
+        stderr, stderr_bytes = capture((e.stderr or b"") + b"TimeoutError: test case exceeded " + str(TIMEOUT).encode() + b"s")
+        results.append({{
+            "stdout": stdout,
+            "stderr": stderr,
+            "stdout_bytes": stdout_bytes,
+            "stderr_bytes": stderr_bytes,
+            "code": None,
+            "signal": "SIGKILL",
+            "timed_out": True,
+        }})
+    finished, cpu_finished, maxrss = usage()
+    results[-1].update({{
+        "wall_time": round((finished - started) * 1000),
+        "cpu_time": round((cpu_finished - cpu_started) * 1000),
+        "memory": maxrss * 1024, # Peak of all runs so far: RUSAGE_CHILDREN only keeps the maximum
+    }})
+    if STOP_ON_ERROR_FROM is not None and index >= STOP_ON_ERROR_FROM and (results[-1]["code"] != 0 or results[-1]["stderr"]):
+        break
+
+sys.stdout.write(BEGIN + json.dumps(results, ensure_ascii=True) + END)
+sys.stdout.flush()
+'''
+
+
+def build_harness(code, inputs, args_list, timeout, stop_on_error_from=None, max_output_bytes=64 * 1024):
+    """
+    Builds the Piston file list for a batched execution.
+
+    Args:
+        code (str): The user code, uploaded unchanged as main.py.
+        inputs (list): One stdin string per run, in order.
+        args_list (list): Command-line arguments passed to every run.
+        timeout (float): Wall-clock limit in seconds for each individual run.
+        stop_on_error_from (int, optional): Fail-fast mode; skip the remaining inputs after the first
+            run at or after this index that errors.
+        max_output_bytes (int): Bytes of each stream the harness reports per run; the original size is
+            reported as stdout_bytes/stderr_bytes, so large outputs do not blow up the result frame.
+
+    Returns:
+        tuple: (files, nonce) where files is the Piston "files" list (harness first, so it is the
+               entry point) and nonce identifies this submission's result frame.
+    """
+    nonce = hashlib.sha256(json.dumps([code, inputs, args_list, timeout, stop_on_error_from, max_output_bytes]).encode()).hexdigest()[:32]
+    harness = HARNESS_TEMPLATE.format(
+        inputs=json.dumps(inputs),
+        args=json.dumps(args_list),
+        timeout=timeout,
+        stop_on_error_from=stop_on_error_from,
+        max_output_bytes=max_output_bytes,
+        begin=f"<<<ICPP-RESULTS-{nonce}>>>",
+        end=f"<<<ICPP-END-{nonce}>>>",
+        user_file=USER_CODE_FILENAME,
+    )
+    files = [
+        {"name": HARNESS_FILENAME, "content": harness},
+        {"name": USER_CODE_FILENAME, "content": code},
+    ]
+    return files, nonce
+
+
+def parse_harness_output(stdout, nonce, expected_count, allow_partial=False):
+    """
+    Extracts the per-run results printed by the harness.
+
+    Args:
+        stdout (str): The harness stdout as returned by Piston.
+        nonce (str): The nonce returned by build_harness.
+        expected_count (int): Number of inputs sent to the harness.
+        allow_partial (bool): Accept fewer results, for a harness built with stop_on_error_from.
+
+    Returns:
+        list or None: One dict per input with 'stdout', 'stderr', 'stdout_bytes', 'stderr_bytes',
+                      'code', 'signal', 'timed_out', 'wall_time', 'cpu_time' (milliseconds) and
+                      'memory' (bytes), or None
+                      if the frame is missing, truncated or malformed.
+    """
+    begin = f"<<<ICPP-RESULTS-{nonce}>>>"
+    end = f"<<<ICPP-END-{nonce}>>>"
+    if not stdout:
+        return None
+    start = stdout.find(begin)
+    stop = stdout.find(end, start + len(begin)) if start != -1 else -1
+    if start == -1 or stop == -1:
+        logger.warning("parse_harness_output: Result frame not found in harness output (killed or truncated by the sandbox?)")
+        return None
+    try:
+        results = json.loads(stdout[start + len(begin):stop])
+    except ValueError as e:
+        logger.warning(f"parse_harness_output: Malformed harness result frame: {e}")
+        return None
+    if not isinstance(results, list) or not (0 < len(results) <= expected_count if allow_partial else len(results) == expected_count):
+        logger.warning(f"parse_harness_output: Expected {expected_count} results, got {len(results) if isinstance(results, list) else 'invalid payload'}")
+        return None
+    return results
@@ -0,0 +1,203 @@
+"""
+Background execution job queue.
+
+The ExecutionRequest table is the queue: a request enters job mode when queued_at is set while its
+status is still 'pending'. Workers claim jobs with a conditional UPDATE (pending -> running), so any
+number of worker threads or processes can poll the same table without an external broker.
+"""
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import ExecutionRequest, ExecutionResult
+from .utils import process_execution_request
+from .resilience import SandboxUnavailable
+from .signals import execution_finished
+from .events import publish_event
+
+logger = logging.getLogger("sandbox")
+
+
+def enqueue_execution_request(execution_request):
+    """
+    Marks an ExecutionRequest as a queued job so the background workers pick it up.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request to queue.
+
+    Returns:
+        ExecutionRequest: The queued execution request.
+
+    Raises:
+        ValueError: If the request already finished; its result is kept, run it again as a new
+                    request instead (see services.rerun_execution_request).
+    """
+    if execution_request.status in ('completed', 'failed'):
+        raise ValueError(f"Execution request ID '{execution_request.id}' already finished and cannot be queued again.")
+    execution_request.status = 'pending'
+    execution_request.queued_at = timezone.now()
+    execution_request.save(update_fields=['status', 'queued_at'])
+    logger.info(f"Execution request ID '{execution_request.id}' queued for background execution.")
+    publish_event(execution_request.id, 'queued')
+
+    pool = get_embedded_worker_pool()
+    if pool:
+        pool.wake()
+    return execution_request
+
+
+def claim_next_execution_request():
+    """
+    Atomically claims the oldest queued execution request.
+
+    Returns:
+        ExecutionRequest or None: The claimed request (status 'running'), or None if the queue is empty.
+    """
+    batch_size = getattr(settings, 'SANDBOX_WORKER_CLAIM_BATCH', 10)
+    candidate_ids = list(
+        ExecutionRequest.objects.filter(status='pending', queued_at__isnull=False)
+        .order_by('queued_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    for candidate_id in candidate_ids:
+        # Only one worker can win the pending -> running transition for a given row
+        claimed = ExecutionRequest.objects.filter(id=candidate_id, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            return ExecutionRequest.objects.select_related('exercise', 'user').get(id=candidate_id)
+    return None
+
+
+def run_next_execution_job():
+    """
+    Claims and executes one queued job.
+
+    Returns:
+        bool: True if a job was processed, False if the queue was empty or the sandbox deferred the job.
+    """
+    execution_request = claim_next_execution_request()
+    if execution_request is None:
+        return False
+
+    logger.debug(f"run_next_execution_job: Worker '{threading.current_thread().name}' picked up request ID '{execution_request.id}'")
+    try:
+        process_execution_request(execution_request)
+    except SandboxUnavailable as e:
+        # The request was put back to 'pending' and stays queued; back off instead of claiming it again at once
+        logger.info(f"Queued request ID '{execution_request.id}' deferred, sandbox unavailable. Retrying in {e.retry_after:.1f}s")
+        return False
+    except Exception as e:
+        logger.exception(f"Unhandled error while executing queued request ID '{execution_request.id}': {e}")
+        execution_request.status = 'failed'
+        execution_request.save(update_fields=['status'])
+        # Give the client a final answer; a result written before the crash is kept
+        execution_result, _ = ExecutionResult.objects.get_or_create(
+            request=execution_request,
+            defaults={"output": "Execution failed.", "error": f"Internal error while executing the request: {e}"},
+        )
+        publish_event(execution_request.id, 'finished', {"status": 'failed', "result_id": execution_result.id, "success": False})
+        execution_finished.send(sender=ExecutionRequest, execution_request=execution_request, execution_result=execution_result, success=False)
+    return True
+
+
+def requeue_stale_execution_requests(stale_after=None):
+    """
+    Puts queued jobs that have been 'running' for too long back into the queue (e.g. after a worker crash).
+
+    Args:
+        stale_after (int, optional): Age in seconds after which a running job is considered abandoned.
+
+    Returns:
+        int: Number of requeued jobs.
+    """
+    stale_after = stale_after or getattr(settings, 'SANDBOX_WORKER_STALE_AFTER', 300)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    requeued = ExecutionRequest.objects.filter(
+        status='running', queued_at__isnull=False, started_at__lt=cutoff, executionresult__isnull=True
+    ).update(status='pending', started_at=None)
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale execution job(s) running since before {cutoff}.")
+    return requeued
+
+
+class ExecutionWorkerPool:
+    """
+    A pool of daemon threads that poll the execution queue and run jobs.
+
+    Used by the run_sandbox_workers management command, and optionally embedded in the web
+    process when settings.SANDBOX_EMBEDDED_WORKERS is greater than zero.
+    """
+
+    def __init__(self, workers=None, poll_interval=None, stale_after=None):
+        self.workers = workers or getattr(settings, 'SANDBOX_WORKERS', 4)
+        self.poll_interval = poll_interval or getattr(settings, 'SANDBOX_WORKER_POLL_INTERVAL', 1.0)
+        self.stale_after = stale_after or getattr(settings, 'SANDBOX_WORKER_STALE_AFTER', 300)
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Starts the worker threads."""
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(index,), name=f"sandbox-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} sandbox execution worker(s).")
+
+    def stop(self, timeout=None):
+        """Signals the worker threads to exit and waits for them to finish their current job."""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        """Wakes idle workers immediately instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    def _run(self, index):
+        last_reclaim = None
+        while not self._stop.is_set():
+            close_old_connections() # Workers are long lived, drop connections that went stale between jobs
+            try:
+                # A single thread per pool looks for abandoned jobs, at most every tenth of the stale timeout
+                now = timezone.now()
+                if index == 0 and (last_reclaim is None or (now - last_reclaim).total_seconds() >= self.stale_after / 10):
+                    requeue_stale_execution_requests(self.stale_after)
+                    last_reclaim = now
+                processed = run_next_execution_job()
+            except Exception as e:
+                logger.exception(f"Sandbox worker loop error: {e}")
+                processed = False
+
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        close_old_connections()
+
+
+_embedded_pool = None
+_embedded_pool_lock = threading.Lock()
+
+
+def get_embedded_worker_pool():
+    """
+    Returns the in-process worker pool, starting it on first use.
+
+    Returns None when settings.SANDBOX_EMBEDDED_WORKERS is 0, in which case jobs are executed by
+    a separate `manage.py run_sandbox_workers` process.
+    """
+    global _embedded_pool
+    workers = getattr(settings, 'SANDBOX_EMBEDDED_WORKERS', 0)
+    if not workers:
+        return None
+    with _embedded_pool_lock:
+        if _embedded_pool is None:
+            _embedded_pool = ExecutionWorkerPool(workers=workers)
+            _embedded_pool.start()
+    return _embedded_pool
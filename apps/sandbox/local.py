@@ -0,0 +1,314 @@
+"""
+Local sandbox backend: runs code in Python subprocesses on the app server, without a network hop.
+
+The 'local' backend accepts the same payloads as Piston (see utils.build_piston_payload) and answers
+in Piston's response format, so it can stand in for Piston in development, tests and benchmarks.
+Each run gets:
+
+- a fresh scratch directory holding the payload files, deleted afterwards;
+- an isolated interpreter (`python -I -S`: no environment variables, user site or site-packages);
+- rlimits on CPU time, address space, file size, open files and processes, set before the code starts
+  by a small wrapper that then execs the interpreter (preexec_fn is not safe in the threaded server);
+- a wall-clock timeout, after which its whole process group is killed.
+
+stdin, stdout and stderr are files in the scratch directory, so the file size limit also caps how
+much output a runaway program can produce. At most LOCAL_SANDBOX_MAX_WORKERS runs execute at once.
+
+With LOCAL_SANDBOX_POOL_SIZE > 0, runs are handed to pre-started, pre-imported interpreters from a
+WarmWorkerPool (warm_pool.py) instead of starting a new one, and only fall back to a cold start if no
+worker is ready within POOL_ACQUIRE_TIMEOUT.
+
+This is resource limiting, not a security boundary: the code runs as the app server's user. Only use
+it for trusted deployments or behind OS-level isolation (a container or a dedicated user).
+"""
+import logging
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+from .warm_pool import WORKER_SOURCE, WarmWorkerPool
+
+logger = logging.getLogger("sandbox")
+
+LOCAL_BACKEND = 'local'
+TIMEOUT_MESSAGE = "Execution timed out after {seconds:g} seconds."
+SIGNAL_MESSAGE = "Process killed by {signal_name}."
+POOL_ACQUIRE_TIMEOUT = 0.05 # Seconds to wait for a warm worker; longer than that and a cold start is as fast
+
+# Run as `python -c LIMITS_WRAPPER_SOURCE <resource>=<limit>,... <command...>`: sets the limits, then
+# replaces itself with the command, so they apply from its first instruction
+LIMITS_WRAPPER_SOURCE = """
+import os, resource, sys
+for item in sys.argv[1].split(","):
+    limit_resource, limit = map(int, item.split("="))
+    resource.setrlimit(limit_resource, (limit, limit))
+os.execvp(sys.argv[2], sys.argv[2:])
+"""
+
+
+def get_rlimits(memory_limit=None):
+    """
+    Returns the (resource, limit) pairs applied to every local run, from the LOCAL_SANDBOX_* settings.
+
+    Args:
+        memory_limit (int, optional): Address space limit in bytes from the payload; -1 or None
+                                      means the LOCAL_SANDBOX_MEMORY_MB setting.
+    """
+    if memory_limit is None or memory_limit < 0:
+        memory_limit = getattr(settings, 'LOCAL_SANDBOX_MEMORY_MB', 256) * 1024 * 1024
+    return [
+        (resource.RLIMIT_CPU, getattr(settings, 'LOCAL_SANDBOX_CPU_SECONDS', 3)),
+        (resource.RLIMIT_AS, memory_limit),
+        (resource.RLIMIT_FSIZE, getattr(settings, 'LOCAL_SANDBOX_FILE_SIZE_KB', 1024) * 1024),
+        (resource.RLIMIT_NOFILE, getattr(settings, 'LOCAL_SANDBOX_MAX_OPEN_FILES', 64)),
+        (resource.RLIMIT_NPROC, getattr(settings, 'LOCAL_SANDBOX_MAX_PROCESSES', 64)), # Per user, not enforced for root
+        (resource.RLIMIT_CORE, 0),
+    ]
+
+
+def build_command(entry_point, args):
+    """Returns the interpreter command line running entry_point with args."""
+    python = getattr(settings, 'LOCAL_SANDBOX_PYTHON', None) or 'python3'
+    return [python, '-I', '-S', '-X', 'utf8', entry_point, *args]
+
+
+def build_limited_command(command, rlimits):
+    """Returns the command line running command under rlimits through the limits wrapper."""
+    python = getattr(settings, 'LOCAL_SANDBOX_PYTHON', None) or 'python3'
+    limits = ",".join(f"{int(limit_resource)}={int(limit)}" for limit_resource, limit in rlimits)
+    return [python, '-I', '-S', '-c', LIMITS_WRAPPER_SOURCE, limits, *command]
+
+
+def build_worker_command(preload_modules, max_jobs):
+    """Returns the command line of a warm pool worker, started with the same interpreter flags as cold runs."""
+    python = getattr(settings, 'LOCAL_SANDBOX_PYTHON', None) or 'python3'
+    return [python, '-I', '-S', '-X', 'utf8', '-c', WORKER_SOURCE, ",".join(preload_modules), str(max_jobs)]
+
+
+def write_files(workdir, files):
+    """Writes the payload files into the scratch directory. Returns the entry point (first file) name."""
+    names = []
+    for index, file in enumerate(files):
+        name = os.path.basename(file.get("name") or f"file{index}.py") # No paths outside the scratch directory
+        with open(os.path.join(workdir, name), 'w', encoding='utf-8') as handle:
+            handle.write(file.get("content", ""))
+        names.append(name)
+    return names[0]
+
+
+class LocalSandbox:
+    """
+    Runs Piston-style payloads in resource-limited subprocesses, at most `max_workers` at a time,
+    on warm pool workers when `pool_size` > 0.
+    """
+
+    def __init__(self, max_workers=4, timeout=5.0, pool_size=0, max_jobs_per_worker=50, preload_modules=()):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.preload_modules = list(preload_modules)
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.runs = 0
+        self.timeouts = 0
+        self.cold_starts = 0
+
+    def execute(self, payload):
+        """
+        Runs a Piston payload locally.
+
+        Args:
+            payload (dict): Piston payload; uses files, stdin, args, run_timeout and run_memory_limit.
+
+        Returns:
+            dict: Piston-style response {"run": {...}, "compile": {}}, or None if the run could not be started.
+        """
+        if resource is None:
+            logger.error("LocalSandbox: The local sandbox needs the resource module (POSIX only)")
+            return None
+        with self._slots:
+            with self._lock:
+                self.running += 1
+            try:
+                return {"run": self._run(payload), "compile": {}}
+            except OSError as e:
+                logger.error(f"LocalSandbox: Could not start the local run: {e}")
+                return None
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.runs += 1
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None and self.pool_size > 0: # Started on first use, not when stats are read
+                self._pool = WarmWorkerPool(
+                    build_worker_command(self.preload_modules, self.max_jobs_per_worker),
+                    env={"PATH": os.defpath, "LANG": "C.UTF-8"},
+                    cwd=getattr(settings, 'LOCAL_SANDBOX_TEMP_DIR', None),
+                    size=self.pool_size,
+                    max_jobs=self.max_jobs_per_worker,
+                )
+            return self._pool
+
+    def _run(self, payload):
+        run_timeout = payload.get("run_timeout")
+        timeout = min(self.timeout, run_timeout / 1000) if run_timeout and run_timeout > 0 else self.timeout
+        rlimits = get_rlimits(payload.get("run_memory_limit"))
+        args = [str(arg) for arg in payload.get("args") or []]
+
+        with tempfile.TemporaryDirectory(prefix="icpp-run-", dir=getattr(settings, 'LOCAL_SANDBOX_TEMP_DIR', None)) as workdir:
+            entry_point = write_files(workdir, payload.get("files") or [])
+            with open(os.path.join(workdir, ".stdin"), 'wb') as handle:
+                handle.write((payload.get("stdin") or "").encode())
+
+            outcome = None
+            pool = self._get_pool()
+            worker = pool.acquire(POOL_ACQUIRE_TIMEOUT) if pool else None
+            if worker is not None:
+                outcome = self._run_warm(pool, worker, workdir, entry_point, args, rlimits, timeout)
+            if outcome is None: # No warm worker ready in time, or it died: pay the interpreter startup
+                outcome = self._run_cold(workdir, entry_point, args, rlimits, timeout)
+            exit_code, timed_out, cpu_time, memory_kb, wall_time = outcome
+
+            with open(os.path.join(workdir, ".stdout"), 'rb') as handle:
+                stdout_text = handle.read().decode('utf-8', errors='replace')
+            with open(os.path.join(workdir, ".stderr"), 'rb') as handle:
+                stderr_text = handle.read().decode('utf-8', errors='replace')
+
+        signal_name = None
+        if exit_code < 0:
+            signal_name = signal.Signals(-exit_code).name
+            exit_code = None
+        if timed_out:
+            with self._lock:
+                self.timeouts += 1
+            stderr_text += ("\n" if stderr_text else "") + TIMEOUT_MESSAGE.format(seconds=timeout)
+        elif signal_name:
+            stderr_text += ("\n" if stderr_text else "") + SIGNAL_MESSAGE.format(signal_name=signal_name) # e.g. SIGXCPU, SIGXFSZ
+
+        return {
+            "stdout": stdout_text,
+            "stderr": stderr_text,
+            "output": stdout_text + stderr_text,
+            "code": exit_code,
+            "signal": signal_name,
+            "cpu_time": round(cpu_time * 1000), # Milliseconds, like Piston
+            "wall_time": round(wall_time * 1000),
+            "memory": memory_kb * 1024, # Bytes; ru_maxrss is in kilobytes on Linux
+        }
+
+    def _run_warm(self, pool, worker, workdir, entry_point, args, rlimits, timeout):
+        """Runs the job in a pre-forked child of a warm worker. Returns None if the worker died."""
+        job = {
+            "workdir": workdir,
+            "entry": entry_point,
+            "args": args,
+            "rlimits": rlimits,
+            "env": {"HOME": workdir, "TMPDIR": workdir},
+        }
+        started = time.monotonic()
+        result, timed_out = worker.run(job, timeout)
+        wall_time = time.monotonic() - started
+        pool.release(worker, healthy=result is not None)
+        if result is None:
+            logger.warning("LocalSandbox: A warm worker died during a run, retrying with a cold start")
+            return None
+        return os.waitstatus_to_exitcode(result["status"]), timed_out, result["cpu_time"], result["memory"], wall_time
+
+    def _run_cold(self, workdir, entry_point, args, rlimits, timeout):
+        """Starts a new interpreter for the job."""
+        with self._lock:
+            self.cold_starts += 1
+
+        with open(os.path.join(workdir, ".stdin"), 'rb') as stdin, \
+                open(os.path.join(workdir, ".stdout"), 'wb') as stdout, \
+                open(os.path.join(workdir, ".stderr"), 'wb') as stderr:
+            started = time.monotonic()
+            process = subprocess.Popen(
+                build_limited_command(build_command(entry_point, args), rlimits), # No preexec_fn: the server is multi-threaded
+                stdin=stdin,
+                stdout=stdout,
+                stderr=stderr,
+                cwd=workdir,
+                env={"PATH": os.defpath, "HOME": workdir, "TMPDIR": workdir, "LANG": "C.UTF-8"},
+                start_new_session=True, # Own process group, so a timeout also kills its children
+            )
+            timed_out = threading.Event()
+
+            def kill():
+                timed_out.set()
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+            try:
+                _, status, usage = os.wait4(process.pid, 0)
+            finally:
+                timer.cancel()
+            process.returncode = os.waitstatus_to_exitcode(status) # Already reaped by wait4
+            wall_time = time.monotonic() - started
+        return process.returncode, timed_out.is_set(), usage.ru_utime + usage.ru_stime, usage.ru_maxrss, wall_time
+
+    def stats(self):
+        with self._lock:
+            pool = self._pool
+            stats = {
+                "max_workers": self.max_workers,
+                "running": self.running,
+                "runs": self.runs,
+                "timeouts": self.timeouts,
+                "cold_starts": self.cold_starts,
+            }
+        stats["pool"] = pool.stats() if pool else None
+        return stats
+
+    def close(self):
+        """Stops the warm pool's workers."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.stop()
+
+
+_local_sandbox = None
+_local_sandbox_lock = threading.Lock()
+
+
+def get_local_sandbox():
+    """Returns the process-wide LocalSandbox, configured from settings on first use."""
+    global _local_sandbox
+    with _local_sandbox_lock:
+        if _local_sandbox is None:
+            _local_sandbox = LocalSandbox(
+                max_workers=getattr(settings, 'LOCAL_SANDBOX_MAX_WORKERS', 4),
+                timeout=getattr(settings, 'LOCAL_SANDBOX_TIMEOUT', 5.0),
+                pool_size=getattr(settings, 'LOCAL_SANDBOX_POOL_SIZE', 0),
+                max_jobs_per_worker=getattr(settings, 'LOCAL_SANDBOX_MAX_JOBS_PER_WORKER', 50),
+                preload_modules=getattr(settings, 'LOCAL_SANDBOX_PRELOAD_MODULES', []),
+            )
+        return _local_sandbox
+
+
+def reset_local_sandbox():
+    """Stops and drops the LocalSandbox so it is rebuilt from settings (used in tests)."""
+    global _local_sandbox
+    with _local_sandbox_lock:
+        local_sandbox, _local_sandbox = _local_sandbox, None
+    if local_sandbox:
+        local_sandbox.close()
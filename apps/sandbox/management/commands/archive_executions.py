@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from apps.sandbox.retention import archive_expired_executions
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives execution requests and results past their retention period to gzip-compressed JSONL "
+        "files and deletes them, keeping their counts in ArchivedExecutionStats."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Retention of runs without a submission (defaults to EXECUTION_RETENTION_DAYS).")
+        parser.add_argument('--submission-days', type=int, default=None, help="Retention of runs that graded a submission, 0 keeps them (defaults to EXECUTION_SUBMISSION_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=None, help="Requests archived per transaction (defaults to EXECUTION_ARCHIVE_BATCH_SIZE).")
+        parser.add_argument('--archive-dir', default=None, help="Directory of the archive files (defaults to EXECUTION_ARCHIVE_DIR).")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many requests would be archived.")
+
+    def handle(self, *args, **options):
+        outcome = archive_expired_executions(
+            archive_dir=options['archive_dir'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            retention_days=options['days'],
+            submission_retention_days=options['submission_days'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{outcome['archived']} execution request(s) would be archived.")
+        elif outcome['archived']:
+            self.stdout.write(self.style.SUCCESS(f"Archived {outcome['archived']} execution request(s) to {outcome['path']}."))
+        else:
+            self.stdout.write(self.style.WARNING("No execution requests are past their retention period."))
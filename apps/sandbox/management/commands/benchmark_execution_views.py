@@ -0,0 +1,155 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client, AsyncClient, override_settings
+from asgiref.sync import async_to_sync
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.lessons.models import Exercise, Lesson
+from apps.sandbox import client
+from apps.sandbox.nodes import reset_node_pools
+from apps.sandbox.resilience import reset_resilience
+
+
+class DelayedSandboxServer(ThreadingHTTPServer):
+    """Stub Piston node answering every execution with a fixed output after `delay` seconds."""
+    daemon_threads = True
+    request_queue_size = 1024 # Accept bursts of connections without dropping SYNs
+
+    def __init__(self, delay):
+        self.delay = delay
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                time.sleep(self.server.delay) # Simulated sandbox run time
+                payload = json.dumps({"run": {"stdout": "ok\n", "stderr": "", "code": 0, "signal": None}, "compile": {}}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of the sync (DRF, thread per request) and native async execution views "
+        "against a local stub sandbox that answers after a fixed delay."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Execution requests sent to each view.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once.")
+        parser.add_argument('--threads', type=int, default=8, help="Worker threads serving the sync view, like WSGI worker threads.")
+        parser.add_argument('--delay', type=float, default=0.2, help="Seconds the stub sandbox takes per call.")
+        parser.add_argument('--test-cases', type=int, default=0, help="Test cases per execution (sandbox calls per request minus one).")
+
+    def handle(self, *args, **options):
+        server = DelayedSandboxServer(options['delay'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        user, exercise = self._create_fixtures(options['test_cases'])
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            SANDBOX_NODES={"piston": [{"url": f"http://127.0.0.1:{server.server_address[1]}/api/v2/execute"}]},
+            SANDBOX_HEALTH_CHECK_INTERVAL=0,
+            SANDBOX_HTTP_POOL_MAXSIZE=max(options['concurrency'], options['threads']) * (options['test_cases'] + 1),
+            SANDBOX_MAX_CONCURRENT_EXECUTIONS=options['concurrency'],
+            SANDBOX_MAX_QUEUED_EXECUTIONS=options['requests'],
+            SANDBOX_RESULT_CACHE_ENABLED=False, # Every request must reach the sandbox
+            SANDBOX_SINGLE_FLIGHT_ENABLED=False,
+            SANDBOX_EVENTS_ENABLED=False,
+            EXECUTION_LIMITS_ENABLED=False,
+        )
+        try:
+            with overrides:
+                headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+                self.stdout.write(
+                    f"{options['requests']} requests, {options['concurrency']} in flight, "
+                    f"{options['test_cases'] + 1} sandbox call(s) of {options['delay']}s each per request"
+                )
+                for label, run in (
+                    (f"sync view ({options['threads']} threads)", self._run_sync),
+                    ("async view (1 event loop)", self._run_async),
+                ):
+                    reset_node_pools()
+                    reset_resilience()
+                    client.close_sessions()
+                    started = time.monotonic()
+                    latencies, statuses = run(options, headers, exercise.id)
+                    self._report(label, time.monotonic() - started, latencies, statuses)
+        finally:
+            server.shutdown()
+            server.server_close()
+            user.delete() # Cascades to the lesson, exercise and execution requests
+            reset_node_pools()
+            reset_resilience()
+
+    def _create_fixtures(self, test_case_count):
+        user = get_user_model().objects.create_user(username=f"benchmark-{uuid.uuid4().hex[:12]}", password=uuid.uuid4().hex)
+        lesson = Lesson.objects.create(title="Benchmark", description="Benchmark", content="Benchmark", order=0, created_by=user)
+        exercise = Exercise.objects.create(
+            title="Benchmark",
+            lesson=lesson,
+            sandbox="piston",
+            created_by=user,
+            test_cases=[{"input": str(i), "expected_output": "ok"} for i in range(test_case_count)],
+        )
+        return user, exercise
+
+    def _body(self, exercise_id, index):
+        return {"code": f"print('ok')  # {index}", "exercise": exercise_id}
+
+    def _run_sync(self, options, headers, exercise_id):
+        local = threading.local()
+
+        def send(index):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            started = time.monotonic()
+            response = local.client.post('/api/sandbox/execution-requests/', self._body(exercise_id, index), content_type='application/json', headers=headers)
+            close_old_connections()
+            return time.monotonic() - started, response.status_code
+
+        with ThreadPoolExecutor(max_workers=min(options['threads'], options['concurrency'])) as executor:
+            outcomes = list(executor.map(send, range(options['requests'])))
+        return [latency for latency, _ in outcomes], [status for _, status in outcomes]
+
+    def _run_async(self, options, headers, exercise_id):
+        async def run_all():
+            async_client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def send(index):
+                async with semaphore:
+                    started = time.monotonic()
+                    response = await async_client.post('/api/sandbox/async/execution-requests/', self._body(exercise_id, index), content_type='application/json', headers=headers)
+                    return time.monotonic() - started, response.status_code
+
+            return await asyncio.gather(*(send(index) for index in range(options['requests'])))
+
+        outcomes = async_to_sync(run_all)()
+        return [latency for latency, _ in outcomes], [status for _, status in outcomes]
+
+    def _report(self, label, elapsed, latencies, statuses):
+        latencies = sorted(latencies)
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        counts = ", ".join(f"{status}: {statuses.count(status)}" for status in sorted(set(statuses)))
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {elapsed:.2f}s, {len(latencies) / elapsed:.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms ({counts})"
+        ))
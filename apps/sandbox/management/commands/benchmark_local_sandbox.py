@@ -0,0 +1,48 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.sandbox.local import LocalSandbox
+from apps.sandbox.warm_pool import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares cold starts (a new interpreter per run) with the warm worker pool of the local sandbox, "
+        "reporting p50/p99 latency per run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=100, help="Runs per mode.")
+        parser.add_argument('--pool-size', type=int, default=4, help="Warm workers.")
+        parser.add_argument('--max-jobs', type=int, default=50, help="Jobs per warm worker before it is replaced.")
+        parser.add_argument('--code', default="import math\nprint(math.factorial(int(input())))", help="Program to run.")
+
+    def handle(self, *args, **options):
+        payload = {"files": [{"name": "main.py", "content": options['code']}], "stdin": "20", "args": []}
+        preload = getattr(settings, 'LOCAL_SANDBOX_PRELOAD_MODULES', [])
+        for label, sandbox in (
+            ("cold start", LocalSandbox(max_workers=1, pool_size=0)),
+            (f"warm pool ({options['pool_size']} workers)", LocalSandbox(max_workers=1, pool_size=options['pool_size'], max_jobs_per_worker=options['max_jobs'], preload_modules=preload)),
+        ):
+            try:
+                sandbox.execute(payload) # Starts the pool, so its first spawn is not counted
+                time.sleep(0.5)
+                latencies = []
+                for _ in range(options['runs']):
+                    started = time.monotonic()
+                    sandbox.execute(payload)
+                    latencies.append(time.monotonic() - started)
+                stats = sandbox.stats()
+            finally:
+                sandbox.close()
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: p50 {statistics.median(latencies) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms, "
+                f"cold starts {stats['cold_starts']}"
+            ))
+            if stats["pool"]:
+                pool = stats["pool"]
+                self.stdout.write(
+                    f"  worker startup p50 {pool['spawn_latency_ms']['p50']}ms, p99 {pool['spawn_latency_ms']['p99']}ms; "
+                    f"wait for a worker p50 {pool['acquire_latency_ms']['p50']}ms, p99 {pool['acquire_latency_ms']['p99']}ms"
+                )
@@ -0,0 +1,40 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.sandbox.partitioning import partition_execution_tables
+
+
+class Command(BaseCommand):
+    help = (
+        "Partitions the execution request and result tables by month on PostgreSQL (--convert, once), "
+        "then creates upcoming monthly partitions and drops empty expired ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help="Convert the tables to partitioned tables if they are not yet.")
+        parser.add_argument('--months-ahead', type=int, default=3, help="Number of future monthly partitions to keep created.")
+        parser.add_argument('--drop-empty', action='store_true', help="Drop empty partitions older than EXECUTION_RETENTION_DAYS.")
+        parser.add_argument('--dry-run', action='store_true', help="Only print the SQL statements.")
+
+    def handle(self, *args, **options):
+        drop_empty_before = None
+        retention_days = getattr(settings, 'EXECUTION_RETENTION_DAYS', 90)
+        if options['drop_empty'] and retention_days > 0:
+            drop_empty_before = (timezone.now() - timedelta(days=retention_days)).date()
+
+        try:
+            statements = partition_execution_tables(
+                convert=options['convert'],
+                months_ahead=options['months_ahead'],
+                drop_empty_before=drop_empty_before,
+                dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            for statement in statements:
+                self.stdout.write(f"{statement};")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Executed {len(statements)} partitioning statement(s)."))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.sandbox.jobs import ExecutionWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Runs background workers that execute queued sandbox execution requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Number of worker threads (defaults to SANDBOX_WORKERS).")
+        parser.add_argument('--poll-interval', type=float, default=None, help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--stale-after', type=int, default=None, help="Seconds after which a running job is considered abandoned and requeued.")
+
+    def handle(self, *args, **options):
+        pool = ExecutionWorkerPool(
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            stale_after=options['stale_after'],
+        )
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {pool.workers} sandbox worker(s). Press Ctrl+C to stop."))
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Stopping sandbox workers..."))
+            pool.stop()
+            self.stdout.write(self.style.SUCCESS("Sandbox workers stopped."))
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0003_exercise_sandbox'),
+        ('sandbox', '0007_alter_executionresult_output'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionrequest',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='executionrequest',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='executionrequest',
+            index=models.Index(fields=['status', 'queued_at'], name='sandbox_exe_status_dc336b_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0008_executionrequest_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionrequest',
+            name='fail_fast',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0009_executionrequest_fail_fast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionresult',
+            name='cpu_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='executionresult',
+            name='exit_code',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='executionresult',
+            name='peak_memory',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='executionresult',
+            name='signal',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
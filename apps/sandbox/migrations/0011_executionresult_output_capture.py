@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:44
+
+import apps.sandbox.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0010_executionresult_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionresult',
+            name='error_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='executionresult',
+            name='output_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='executionresult',
+            name='error',
+            field=apps.sandbox.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='executionresult',
+            name='output',
+            field=apps.sandbox.fields.CompressedTextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_request_created_at(apps, schema_editor):
+    """Existing results were created together with their request."""
+    ExecutionRequest = apps.get_model('sandbox', 'ExecutionRequest')
+    ExecutionResult = apps.get_model('sandbox', 'ExecutionResult')
+    ExecutionResult.objects.update(
+        created_at=models.Subquery(ExecutionRequest.objects.filter(pk=models.OuterRef('request_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0011_executionresult_output_capture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionresult',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_request_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='executionrequest',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedExecutionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sandbox', models.CharField(max_length=50)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('killed', models.PositiveIntegerField(default=0)),
+                ('execution_time_total', models.FloatField(default=0)),
+                ('execution_time_count', models.PositiveIntegerField(default=0)),
+                ('cpu_time_total', models.FloatField(default=0)),
+                ('cpu_time_count', models.PositiveIntegerField(default=0)),
+                ('peak_memory_total', models.FloatField(default=0)),
+                ('peak_memory_count', models.PositiveIntegerField(default=0)),
+                ('peak_memory_max', models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('day', 'sandbox')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sandbox', '0012_execution_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionresult',
+            name='cached',
+            field=models.BooleanField(default=False),
+        ),
+    ]
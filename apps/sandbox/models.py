@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from .fields import CompressedTextField
 User = settings.AUTH_USER_MODEL
 
 class ExecutionRequest(models.Model):
@@ -9,14 +11,22 @@ class ExecutionRequest(models.Model):
     code = models.TextField() # Stores the code to be executed
     stdin = models.TextField(blank=True, null=True) # Store stdin in the model
     args = models.TextField(blank=True, null=True) # Stores command-line arguments
-    sandbox = models.CharField(max_length=50, default="piston") # Specifies the sandbox to use (e.g., piston, custom)
-    created_at = models.DateTimeField(auto_now_add=True) # Timestamp when the request was created
+    sandbox = models.CharField(max_length=50, default="piston") # Specifies the sandbox to use (e.g., piston, custom, local)
+    fail_fast = models.BooleanField(default=False) # Stop running test cases after the first failing one (also enabled by Exercise.fail_fast)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True) # Timestamp when the request was created, indexed for retention
     status = models.CharField(max_length=20, choices=[ # Status of the execution request
         ('pending', 'Pending'),
         ('running', 'Running'),
         ('completed', 'Completed'),
         ('failed', 'Failed')
     ], default='pending')
+    queued_at = models.DateTimeField(null=True, blank=True) # Set when the request is handed to the background workers (job mode)
+    started_at = models.DateTimeField(null=True, blank=True) # Timestamp when execution started
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'queued_at']), # Used by workers to pick up queued jobs
+        ]
 
     def __str__(self):
         return f"Execution by {self.user.username} on {self.created_at}"
@@ -24,10 +34,44 @@ class ExecutionRequest(models.Model):
 class ExecutionResult(models.Model):
     """Stores the result of an execution request."""
     request = models.OneToOneField(ExecutionRequest, on_delete=models.CASCADE) # One-to-one link to the execution request
-    output = models.TextField(blank=True, null=True) # Stores the standard output of the code execution
-    error = models.TextField(blank=True, null=True) # Stores any errors during execution
-    execution_time = models.FloatField(null=True, blank=True) # Stores the execution time, if available
-    test_results = models.JSONField(default=list, blank=True, null=True) # Format: {"test_case": {"input": "input1", "expected_output": "output1"}, "actual_output": "actual output from the code", "passed": true/false}
+    output = CompressedTextField(blank=True, null=True) # Standard output of the code execution, capped at SANDBOX_OUTPUT_MAX_BYTES and compressed when large
+    error = CompressedTextField(blank=True, null=True) # Any errors during execution, capped and compressed like output
+    output_bytes = models.BigIntegerField(null=True, blank=True) # Size of the standard run's stdout before it was capped
+    error_bytes = models.BigIntegerField(null=True, blank=True) # Size of the standard run's stderr before it was capped
+    execution_time = models.FloatField(null=True, blank=True) # Wall time in seconds, summed over the standard run and all test case runs
+    cpu_time = models.FloatField(null=True, blank=True) # CPU time in seconds reported by the sandbox, summed over all runs
+    peak_memory = models.BigIntegerField(null=True, blank=True) # Highest memory use of any run, in bytes
+    exit_code = models.IntegerField(null=True, blank=True) # Exit code of the standard run, None if it was killed by a signal
+    signal = models.CharField(max_length=20, null=True, blank=True) # Signal that killed the standard run (e.g. SIGKILL), if any
+    cached = models.BooleanField(default=False) # Served from the result cache; the metrics above belong to an earlier run and are left out of analytics
+    created_at = models.DateTimeField(default=timezone.now, db_index=True) # Used by retention and monthly partitioning
+    test_results = models.JSONField(default=list, blank=True, null=True) # Format: {"test_case": {"input": "input1", "expected_output": "output1"}, "actual_output": "actual output from the code", "passed": true/false, "metrics": {"wall_time": ms, "cpu_time": ms, "memory": bytes, "exit_code": 0, "signal": null}}
+
+    def __str__(self):
+        return f"Result for {self.request.id} - {self.request.status}"
+
+
+class ArchivedExecutionStats(models.Model):
+    """
+    Daily counters of execution requests removed by the retention policy (see retention.py), so
+    analytics totals stay correct after archival. One row per day and sandbox backend.
+    """
+    day = models.DateField() # Day the archived requests were created
+    sandbox = models.CharField(max_length=50)
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    killed = models.PositiveIntegerField(default=0) # Standard run killed by a signal
+    execution_time_total = models.FloatField(default=0) # Sums and counts of the ExecutionResult measurements, for averages
+    execution_time_count = models.PositiveIntegerField(default=0)
+    cpu_time_total = models.FloatField(default=0)
+    cpu_time_count = models.PositiveIntegerField(default=0)
+    peak_memory_total = models.FloatField(default=0)
+    peak_memory_count = models.PositiveIntegerField(default=0)
+    peak_memory_max = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('day', 'sandbox')
 
     def __str__(self):
-        return f"Result for {self.request.id} - {self.request.status}"
\ No newline at end of file
+        return f"{self.total} archived execution(s) on {self.day} ({self.sandbox})"
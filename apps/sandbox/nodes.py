@@ -0,0 +1,255 @@
+"""
+Registry of sandbox nodes with load balancing and health checks.
+
+settings.SANDBOX_NODES lists the nodes of each backend type ('piston', 'custom'). Every execution
+is routed to one healthy node of its backend, either to the node with the fewest outstanding
+requests relative to its weight ('least_outstanding') or by smooth weighted round-robin
+('weighted_round_robin').
+
+A node is ejected after SANDBOX_NODE_FAILURE_THRESHOLD consecutive failed calls or probes, and is
+re-admitted after SANDBOX_NODE_RECOVERY_THRESHOLD consecutive successes. Nodes with a health_url are
+re-admitted by health probes, where any response other than 2xx/3xx counts as a failure. Nodes that
+cannot be probed (no health_url, or SANDBOX_HEALTH_CHECK_INTERVAL=0) get real traffic again once
+they have been ejected for SANDBOX_NODE_EJECTION_COOLDOWN seconds, and successful calls re-admit
+them. If every node of a backend is ejected, traffic is spread over all of them rather than failing
+outright.
+"""
+import logging
+import threading
+import time
+import requests
+from django.conf import settings
+from . import client
+
+logger = logging.getLogger("sandbox")
+
+LEAST_OUTSTANDING = 'least_outstanding'
+WEIGHTED_ROUND_ROBIN = 'weighted_round_robin'
+
+
+class SandboxNode:
+    """One sandbox server and its routing/health state. State changes are guarded by the pool lock."""
+
+    def __init__(self, url, health_url=None, weight=1):
+        self.url = url
+        self.health_url = health_url # None: not probed, recovers from real traffic after the ejection cooldown
+        self.weight = max(1, int(weight))
+        self.healthy = True
+        self.outstanding = 0
+        self.current_weight = 0 # Smooth weighted round-robin state
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.ejected_at = None
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected_at": self.ejected_at,
+        }
+
+
+class SandboxNodePool:
+    """Routes requests across the nodes of one backend type and tracks their health."""
+
+    def __init__(self, backend, nodes, strategy=LEAST_OUTSTANDING, failure_threshold=3, recovery_threshold=2,
+                 ejection_cooldown=30, active_probing=True):
+        if not nodes:
+            raise ValueError(f"No sandbox nodes configured for backend '{backend}'.")
+        self.backend = backend
+        self.nodes = nodes
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.recovery_threshold = recovery_threshold
+        self.ejection_cooldown = ejection_cooldown
+        self.active_probing = active_probing
+        self._lock = threading.Lock()
+        self._rr_offset = 0
+        self._health_thread = None
+        self._stop = threading.Event()
+
+    def acquire(self, exclude=None):
+        """
+        Picks a node for one request and counts it as outstanding.
+
+        Args:
+            exclude (SandboxNode, optional): Node to avoid, used when failing over after an error.
+
+        Returns:
+            SandboxNode: The chosen node. Must be handed back with release().
+        """
+        with self._lock:
+            candidates = [node for node in self.nodes if (node.healthy or self._cooled_down(node)) and node is not exclude]
+            if not candidates:
+                candidates = [node for node in self.nodes if node is not exclude] or self.nodes
+                logger.warning(f"No healthy '{self.backend}' sandbox nodes, routing to all {len(candidates)} node(s)")
+
+            if self.strategy == WEIGHTED_ROUND_ROBIN:
+                node = self._pick_weighted_round_robin(candidates)
+            else:
+                node = self._pick_least_outstanding(candidates)
+            node.outstanding += 1
+            node.total_requests += 1
+            return node
+
+    def _recovers_passively(self, node):
+        """Returns True if the node can only be re-admitted by successful real traffic."""
+        return not self.active_probing or node.health_url is None
+
+    def _cooled_down(self, node):
+        """Returns True if an ejected, unprobed node has waited out its cooldown and may take trial traffic."""
+        return self._recovers_passively(node) and time.time() - node.ejected_at >= self.ejection_cooldown
+
+    def _pick_least_outstanding(self, candidates):
+        # Rotate the starting point so ties are spread instead of always hitting the first node
+        self._rr_offset = (self._rr_offset + 1) % len(candidates)
+        rotated = candidates[self._rr_offset:] + candidates[:self._rr_offset]
+        return min(rotated, key=lambda node: node.outstanding / node.weight)
+
+    def _pick_weighted_round_robin(self, candidates):
+        total_weight = sum(node.weight for node in candidates)
+        for node in candidates:
+            node.current_weight += node.weight
+        chosen = max(candidates, key=lambda node: node.current_weight)
+        chosen.current_weight -= total_weight
+        return chosen
+
+    def release(self, node, success):
+        """
+        Returns a node acquired with acquire() and records the outcome of the call.
+
+        Args:
+            node (SandboxNode): The node used for the call.
+            success (bool): False if the node failed (connection error, timeout or 5xx response).
+        """
+        with self._lock:
+            node.outstanding = max(0, node.outstanding - 1)
+            self._record(node, success, source="request")
+
+    def _record(self, node, success, source):
+        if success:
+            node.consecutive_failures = 0
+            node.consecutive_successes += 1
+            # Probed nodes are only re-admitted by probes, the others by requests after the cooldown
+            recovers = source == "probe" or self._recovers_passively(node)
+            if not node.healthy and recovers and node.consecutive_successes >= self.recovery_threshold:
+                node.healthy = True
+                node.ejected_at = None
+                logger.info(f"Sandbox node {node.url} ({self.backend}) re-admitted after {node.consecutive_successes} successful {source}(s)")
+        else:
+            node.consecutive_successes = 0
+            node.consecutive_failures += 1
+            node.total_failures += 1
+            if not node.healthy:
+                node.ejected_at = time.time() # Failed while ejected, restart the cooldown
+            elif node.consecutive_failures >= self.failure_threshold:
+                node.healthy = False
+                node.ejected_at = time.time()
+                logger.warning(f"Sandbox node {node.url} ({self.backend}) ejected after {node.consecutive_failures} consecutive {source} failure(s)")
+
+    def probe(self):
+        """Runs one active health check against every node that has a health_url."""
+        for node in self.nodes:
+            if node.health_url is None:
+                continue
+            try:
+                response = client.get(node.health_url, timeout=getattr(settings, 'SANDBOX_HEALTH_CHECK_TIMEOUT', 2))
+                success = response.status_code < 400 # A 4xx means the health endpoint is missing or misrouted
+            except requests.exceptions.RequestException as e:
+                logger.debug(f"Health probe for sandbox node {node.health_url} failed: {e}")
+                success = False
+            with self._lock:
+                self._record(node, success, source="probe")
+
+    def start_health_checks(self, interval):
+        """Starts a daemon thread probing every node each `interval` seconds."""
+        if self._health_thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.probe()
+                except Exception as e:
+                    logger.exception(f"Sandbox health check loop error for backend '{self.backend}': {e}")
+
+        self._health_thread = threading.Thread(target=run, name=f"sandbox-health-{self.backend}", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+        self._health_thread = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "healthy_nodes": sum(1 for node in self.nodes if node.healthy),
+                "nodes": [node.stats() for node in self.nodes],
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def build_node_pool(backend):
+    """Creates the node pool of a backend from settings.SANDBOX_NODES."""
+    node_settings = getattr(settings, 'SANDBOX_NODES', {}).get(backend, [])
+    nodes = [
+        SandboxNode(node['url'], health_url=node.get('health_url'), weight=node.get('weight', 1))
+        for node in node_settings
+    ]
+    return SandboxNodePool(
+        backend,
+        nodes,
+        strategy=getattr(settings, 'SANDBOX_ROUTING_STRATEGY', LEAST_OUTSTANDING),
+        failure_threshold=getattr(settings, 'SANDBOX_NODE_FAILURE_THRESHOLD', 3),
+        recovery_threshold=getattr(settings, 'SANDBOX_NODE_RECOVERY_THRESHOLD', 2),
+        ejection_cooldown=getattr(settings, 'SANDBOX_NODE_EJECTION_COOLDOWN', 30),
+        active_probing=bool(getattr(settings, 'SANDBOX_HEALTH_CHECK_INTERVAL', 10)),
+    )
+
+
+def get_node_pool(backend):
+    """
+    Returns the shared node pool of a backend, creating it (and its health checker) on first use.
+
+    Args:
+        backend (str): Backend type, e.g. 'piston' or 'custom'.
+
+    Returns:
+        SandboxNodePool: The pool for that backend.
+    """
+    pool = _pools.get(backend)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(backend)
+        if pool is None:
+            pool = build_node_pool(backend)
+            interval = getattr(settings, 'SANDBOX_HEALTH_CHECK_INTERVAL', 10)
+            if interval:
+                pool.start_health_checks(interval)
+            _pools[backend] = pool
+    return pool
+
+
+def get_node_pools():
+    """Returns the node pools created so far, keyed by backend."""
+    return dict(_pools)
+
+
+def reset_node_pools():
+    """Stops health checks and drops all pools so they are rebuilt from settings (used in tests)."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.stop_health_checks()
+        _pools.clear()
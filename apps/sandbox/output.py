@@ -0,0 +1,88 @@
+"""
+Bounded output capture and compressed storage of execution output.
+
+A program printing in an infinite loop can return megabytes of stdout. Output is bounded in two places:
+
+- every stream of every sandbox run is cut to SANDBOX_OUTPUT_MAX_BYTES when the response is parsed,
+  so the result cache, progress events and ExecutionResult.output/error never hold more than that;
+- the outputs copied into each test_results entry are cut to SANDBOX_TEST_OUTPUT_MAX_BYTES after
+  grading (grading compares the full captured output).
+
+Cut text ends with TRUNCATION_MARKER, and the original byte counts are kept in the run's metrics
+(stdout_bytes/stderr_bytes) and on ExecutionResult (output_bytes/error_bytes).
+
+Text larger than SANDBOX_OUTPUT_COMPRESS_MIN_BYTES is stored zlib-compressed by CompressedTextField
+(fields.py): the column holds COMPRESSED_PREFIX followed by the base64 of the compressed UTF-8 bytes,
+and is only decompressed when the attribute is read.
+"""
+import base64
+import binascii
+import zlib
+from django.conf import settings
+
+TRUNCATION_MARKER = "\n[output truncated: showing {shown} of {total} bytes]"
+COMPRESSED_PREFIX = "\x1fzlib:" # Starts with a control character no printable output begins with
+LOG_PREVIEW_BYTES = 500 # Output quoted in log messages
+
+
+def truncate_output(text, max_bytes, total_bytes=None):
+    """
+    Cuts text to at most max_bytes of UTF-8 and appends TRUNCATION_MARKER if anything was cut.
+
+    Args:
+        text (str or None): The output; None is returned unchanged.
+        max_bytes (int): Largest number of bytes kept.
+        total_bytes (int, optional): Original size if text was already cut upstream (by the harness).
+
+    Returns:
+        tuple: (text, total_bytes) where total_bytes is the size of the original output.
+    """
+    if text is None:
+        return None, 0
+    data = text.encode('utf-8', errors='surrogatepass')
+    if total_bytes is None:
+        total_bytes = len(data)
+    if len(data) <= max_bytes and total_bytes <= len(data):
+        return text, total_bytes
+    shown = data[:max_bytes].decode('utf-8', errors='ignore') # Drops a multi-byte character split at the cut
+    return shown + TRUNCATION_MARKER.format(shown=len(shown.encode('utf-8', errors='surrogatepass')), total=total_bytes), total_bytes
+
+
+def bound_streams(run_output, run_error, metrics, max_bytes=None):
+    """
+    Caps the stdout and stderr of one run at SANDBOX_OUTPUT_MAX_BYTES each and records their original
+    sizes in metrics as stdout_bytes and stderr_bytes (sizes already reported there are kept).
+
+    Returns:
+        tuple: (run_output, run_error)
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'SANDBOX_OUTPUT_MAX_BYTES', 64 * 1024)
+    run_output, metrics["stdout_bytes"] = truncate_output(run_output, max_bytes, metrics.get("stdout_bytes"))
+    run_error, metrics["stderr_bytes"] = truncate_output(run_error, max_bytes, metrics.get("stderr_bytes"))
+    return run_output, run_error
+
+
+def log_preview(text):
+    """Returns text cut to LOG_PREVIEW_BYTES for log messages."""
+    return truncate_output(text, LOG_PREVIEW_BYTES)[0]
+
+
+def compress_text(value):
+    """Returns value in its stored form: compressed if it is large (or could be mistaken for compressed text)."""
+    if not isinstance(value, str):
+        return value
+    data = value.encode('utf-8', errors='surrogatepass')
+    if len(data) < getattr(settings, 'SANDBOX_OUTPUT_COMPRESS_MIN_BYTES', 1024) and not value.startswith(COMPRESSED_PREFIX):
+        return value
+    return COMPRESSED_PREFIX + base64.b64encode(zlib.compress(data)).decode('ascii')
+
+
+def decompress_text(value):
+    """Reverses compress_text(); other values (including unsaved text) are returned unchanged."""
+    if not isinstance(value, str) or not value.startswith(COMPRESSED_PREFIX):
+        return value
+    try:
+        return zlib.decompress(base64.b64decode(value[len(COMPRESSED_PREFIX):], validate=True)).decode('utf-8', errors='surrogatepass')
+    except (binascii.Error, zlib.error): # Output that merely starts with the prefix and was not saved yet
+        return value
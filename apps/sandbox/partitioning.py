@@ -0,0 +1,156 @@
+"""
+Optional monthly range partitioning of the execution tables on PostgreSQL.
+
+partition_execution_tables(convert=True) rebuilds sandbox_executionrequest and sandbox_executionresult as tables
+partitioned by RANGE (created_at), with one partition per month and a DEFAULT partition. Queries
+filtered on created_at (analytics trends, the retention policy) then only touch recent partitions,
+and partitions emptied by archive_executions can be dropped instead of vacuumed.
+
+PostgreSQL requires every unique constraint of a partitioned table to include the partition key, so
+the conversion:
+- makes the primary key (id, created_at);
+- turns the unique index of ExecutionResult.request into a plain index;
+- drops the foreign keys that point at the two tables (ExecutionResult.request, ExerciseSubmission's
+  links). Django emulates on_delete itself, so CASCADE/SET_NULL keep working through the ORM; only
+  the database-level integrity check is lost.
+
+Run it once with `python manage.py partition_execution_tables --convert`, then regularly (e.g.
+daily, next to archive_executions) without --convert to create upcoming months ahead of time.
+"""
+import logging
+import re
+from datetime import date
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import ExecutionRequest, ExecutionResult
+
+logger = logging.getLogger("sandbox")
+
+PARTITION_KEY = "created_at"
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def get_partitioned_tables():
+    """Returns the db_table names of the execution tables, referenced tables first."""
+    return [ExecutionRequest._meta.db_table, ExecutionResult._meta.db_table]
+
+
+def add_months(month, count):
+    """Returns the first day of the month `count` months after the date month."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(first, last):
+    """Returns the (start, end) bounds of every month from the month of first to the month of last."""
+    month, last = date(first.year, first.month, 1), date(last.year, last.month, 1)
+    bounds = []
+    while month <= last:
+        bounds.append((month, add_months(month, 1)))
+        month = add_months(month, 1)
+    return bounds
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def create_partition_sql(table, start, end, parent=None):
+    """Returns the statement creating the partition of table for [start, end), attached to parent (defaults to table)."""
+    quote = connection.ops.quote_name
+    return f"CREATE TABLE IF NOT EXISTS {quote(partition_name(table, start))} PARTITION OF {quote(parent or table)} FOR VALUES FROM ('{start}') TO ('{end}')"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+    return cursor.fetchone() is not None
+
+
+def get_conversion_sql(cursor, table, months_ahead):
+    """
+    Returns the statements converting table into a partitioned table, in order. Reads the table's
+    indexes, foreign keys and date range, so it must run in the transaction that executes them.
+    """
+    quote = connection.ops.quote_name
+    execution_tables = get_partitioned_tables()
+    staging = f"{table}_partitioned"
+
+    cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s", [table, f"{table}_pkey"])
+    index_definitions = [row[0].replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1) for row in cursor.fetchall()] # Unique needs the partition key
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid), confrelid::regclass::text FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = [(name, definition) for name, definition, target in cursor.fetchall() if target.strip('"') not in execution_tables]
+    cursor.execute(f"SELECT MIN({quote(PARTITION_KEY)}) FROM {quote(table)}")
+    oldest = cursor.fetchone()[0] or timezone.now()
+    today = timezone.now().date()
+
+    statements = [
+        f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE",
+        f"CREATE TABLE {quote(staging)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS) PARTITION BY RANGE ({quote(PARTITION_KEY)})",
+        f"ALTER TABLE {quote(staging)} ADD PRIMARY KEY (id, {quote(PARTITION_KEY)})",
+    ]
+    statements += [create_partition_sql(table, start, end, parent=staging) for start, end in month_range(oldest.date(), add_months(today, months_ahead))]
+    statements += [
+        f"CREATE TABLE {quote(table + '_pdefault')} PARTITION OF {quote(staging)} DEFAULT",
+        f"INSERT INTO {quote(staging)} OVERRIDING SYSTEM VALUE SELECT * FROM {quote(table)}",
+        f"DROP TABLE {quote(table)} CASCADE", # Also drops the foreign keys pointing at it
+        f"ALTER TABLE {quote(staging)} RENAME TO {quote(table)}",
+    ]
+    statements += index_definitions
+    statements += [f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}" for name, definition in foreign_keys]
+    statements.append(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {quote(table)}), 1))")
+    return statements
+
+
+def get_maintenance_sql(cursor, table, months_ahead, drop_empty_before=None):
+    """
+    Returns the statements creating the partitions of the current and next months_ahead months and,
+    if drop_empty_before (a date) is given, dropping empty partitions that end on or before it.
+    """
+    quote = connection.ops.quote_name
+    today = timezone.now().date()
+    statements = [create_partition_sql(table, start, end) for start, end in month_range(today, add_months(today, months_ahead))]
+    if drop_empty_before is not None:
+        cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass", [table])
+        for (partition,) in cursor.fetchall():
+            match = PARTITION_SUFFIX.search(partition.strip('"'))
+            if not match or add_months(date(int(match.group(1)), int(match.group(2)), 1), 1) > drop_empty_before:
+                continue
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {partition})")
+            if not cursor.fetchone()[0]:
+                statements.append(f"DROP TABLE {partition}")
+    return statements
+
+
+def partition_execution_tables(convert=False, months_ahead=3, drop_empty_before=None, dry_run=False):
+    """
+    Converts (with convert=True) and maintains the monthly partitions of the execution tables.
+
+    Returns:
+        list: The SQL statements executed, or that would be executed with dry_run.
+
+    Raises:
+        ValueError: If the database is not PostgreSQL, or a table is not partitioned and convert is False.
+    """
+    if connection.vendor != 'postgresql':
+        raise ValueError(f"Partitioning is only supported on PostgreSQL, not {connection.vendor}.")
+    executed = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in get_partitioned_tables():
+            if is_partitioned(cursor, table):
+                statements = get_maintenance_sql(cursor, table, months_ahead, drop_empty_before)
+            elif convert:
+                statements = get_conversion_sql(cursor, table, months_ahead)
+            else:
+                raise ValueError(f"Table '{table}' is not partitioned yet, run with --convert first.")
+            for statement in statements:
+                if not dry_run:
+                    cursor.execute(statement)
+                executed.append(statement)
+        if dry_run:
+            transaction.set_rollback(True)
+    if not dry_run:
+        logger.info(f"partition_execution_tables: Executed {len(executed)} statement(s)")
+    return executed
@@ -0,0 +1,329 @@
+"""
+Circuit breaking and load shedding for the sandbox backends.
+
+Each backend type ('piston', 'custom') has a CircuitBreaker that watches the outcome and latency of
+its recent calls. When too many of them fail or are slow, the circuit opens and further calls fail
+immediately with SandboxUnavailable instead of waiting on a sandbox that is down. After a cool-down
+the circuit lets a few trial executions through (half-open) and closes again once they succeed. A
+trial covers every sandbox call of one execution (see execution_scope()), so a submission with many
+test cases is not cut off partway through its own tests.
+
+Each backend also has an AdmissionController that bounds how many executions a process runs against
+it at once, plus a short waiting line. Requests beyond that are shed with SandboxUnavailable, so web
+workers are never all blocked on the sandbox at the same time.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from django.conf import settings
+
+logger = logging.getLogger("sandbox")
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_current_execution = contextvars.ContextVar("sandbox_execution", default=None) # ID of the execution making sandbox calls
+
+
+class SandboxUnavailable(Exception):
+    """Raised when a sandbox call is refused because the circuit is open or the backend is saturated."""
+
+    def __init__(self, message, backend, retry_after=1):
+        super().__init__(message)
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker over a sliding window of the most recent calls.
+
+    The circuit opens when, over at least `min_calls` calls in the window, the share of failed calls
+    reaches `error_rate_threshold` or the share of calls slower than `slow_call_seconds` reaches
+    `slow_call_rate_threshold`.
+    """
+
+    def __init__(self, backend, window_size=20, min_calls=10, error_rate_threshold=0.5,
+                 slow_call_seconds=10, slow_call_rate_threshold=0.8, open_seconds=30, half_open_calls=3):
+        self.backend = backend
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._calls = deque(maxlen=window_size) # (failed, slow) per call
+        self._opened_at = None
+        self._trial_executions = set() # Executions admitted while half-open
+        self._anonymous_trials = 0 # Half-open calls made outside of an execution_scope()
+        self._trial_successes = set()
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """
+        Admits one call or raises if the circuit is open.
+
+        While half-open, up to `half_open_calls` executions are admitted as trials, and every further
+        call of an admitted execution is let through too. Calls made outside of an execution_scope()
+        are trials of their own.
+
+        Raises:
+            SandboxUnavailable: While the circuit is open, or when all half-open trial slots are taken.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise SandboxUnavailable(f"The {self.backend} sandbox is temporarily unavailable.", self.backend, retry_after=remaining)
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                execution_id = _current_execution.get()
+                if execution_id is not None and execution_id in self._trial_executions:
+                    return # Later call of a trial execution
+                if len(self._trial_executions) + self._anonymous_trials >= self.half_open_calls:
+                    self.rejected += 1
+                    raise SandboxUnavailable(f"The {self.backend} sandbox is recovering, try again shortly.", self.backend, retry_after=1)
+                if execution_id is None:
+                    self._anonymous_trials += 1
+                else:
+                    self._trial_executions.add(execution_id)
+
+    def record(self, success, duration):
+        """
+        Records the outcome of a call admitted by before_call().
+
+        Args:
+            success (bool): False if the backend failed (connection error, timeout or 5xx response).
+            duration (float): Wall-clock duration of the call in seconds.
+        """
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                execution_id = _current_execution.get()
+                if execution_id is None:
+                    self._anonymous_trials = max(0, self._anonymous_trials - 1)
+                if not success or slow:
+                    self._transition(OPEN)
+                    return
+                self._trial_successes.add(execution_id if execution_id is not None else object()) # Counts executions, not calls
+                if len(self._trial_successes) >= self.half_open_calls:
+                    self._transition(CLOSED)
+                return
+
+            if self.state == OPEN: # Call admitted before the circuit opened
+                return
+
+            self._calls.append((not success, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            error_rate = sum(1 for failed, _ in self._calls if failed) / len(self._calls)
+            slow_rate = sum(1 for _, slow_call in self._calls if slow_call) / len(self._calls)
+            if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                logger.warning(f"Opening {self.backend} sandbox circuit: error rate {error_rate:.0%}, slow call rate {slow_rate:.0%} over the last {len(self._calls)} call(s)")
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        self._trial_executions.clear()
+        self._anonymous_trials = 0
+        self._trial_successes.clear()
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self._calls.clear()
+            logger.info(f"{self.backend} sandbox circuit closed again after successful trial calls")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self._calls),
+                "recent_failures": sum(1 for failed, _ in self._calls if failed),
+                "recent_slow_calls": sum(1 for _, slow in self._calls if slow),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+@contextmanager
+def execution_scope(execution_id):
+    """
+    Marks the sandbox calls made in the with-block (and in tasks or threads started with a copy of its
+    context) as calls of one execution, so a half-open circuit admits them as a single trial.
+    """
+    token = _current_execution.set(execution_id)
+    try:
+        yield
+    finally:
+        _current_execution.reset(token)
+
+
+class AdmissionController:
+    """
+    Bounds the executions running against a backend in this process, with a bounded waiting line.
+
+    Up to `max_concurrent` executions run at once; up to `max_queued` more wait at most `timeout`
+    seconds for a slot. Anything beyond that is rejected straight away.
+    """
+
+    def __init__(self, backend, max_concurrent=8, max_queued=16, timeout=10):
+        self.backend = backend
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+
+    @contextmanager
+    def admit(self):
+        """
+        Holds one execution slot for the duration of the with-block.
+
+        Raises:
+            SandboxUnavailable: If the waiting line is full or no slot frees up within the timeout.
+        """
+        with self._condition:
+            if self.running >= self.max_concurrent:
+                if self.waiting >= self.max_queued:
+                    self.shed += 1
+                    raise SandboxUnavailable(f"The {self.backend} sandbox is busy, try again shortly.", self.backend, retry_after=1)
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.running < self.max_concurrent, timeout=self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.shed += 1
+                    raise SandboxUnavailable(f"The {self.backend} sandbox is busy, try again shortly.", self.backend, retry_after=1)
+            self.running += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aadmit(self, poll_interval=0.01):
+        """
+        Async counterpart of admit() for native async views: waiting for a slot suspends the coroutine
+        (polling every `poll_interval` seconds) instead of blocking the event loop's thread.
+
+        Raises:
+            SandboxUnavailable: If the waiting line is full or no slot frees up within the timeout.
+        """
+        with self._condition:
+            queued = self.running >= self.max_concurrent
+            if queued and self.waiting >= self.max_queued:
+                self.shed += 1
+                raise SandboxUnavailable(f"The {self.backend} sandbox is busy, try again shortly.", self.backend, retry_after=1)
+            if queued:
+                self.waiting += 1
+            else:
+                self.running += 1
+                self.admitted += 1
+
+        deadline = time.monotonic() + self.timeout
+        while queued:
+            await asyncio.sleep(poll_interval)
+            with self._condition:
+                if self.running < self.max_concurrent:
+                    self.waiting -= 1
+                    self.running += 1
+                    self.admitted += 1
+                    queued = False
+                elif time.monotonic() >= deadline:
+                    self.waiting -= 1
+                    self.shed += 1
+                    raise SandboxUnavailable(f"The {self.backend} sandbox is busy, try again shortly.", self.backend, retry_after=1)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._condition:
+            self.running -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queued": self.max_queued,
+                "running": self.running,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "shed": self.shed,
+            }
+
+
+_breakers = {}
+_admission_controllers = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(backend):
+    """Returns the shared circuit breaker of a backend, configured from settings on first use."""
+    with _registry_lock:
+        breaker = _breakers.get(backend)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                backend,
+                window_size=getattr(settings, 'SANDBOX_CIRCUIT_WINDOW_SIZE', 20),
+                min_calls=getattr(settings, 'SANDBOX_CIRCUIT_MIN_CALLS', 10),
+                error_rate_threshold=getattr(settings, 'SANDBOX_CIRCUIT_ERROR_RATE', 0.5),
+                slow_call_seconds=getattr(settings, 'SANDBOX_CIRCUIT_SLOW_CALL_SECONDS', 10),
+                slow_call_rate_threshold=getattr(settings, 'SANDBOX_CIRCUIT_SLOW_CALL_RATE', 0.8),
+                open_seconds=getattr(settings, 'SANDBOX_CIRCUIT_OPEN_SECONDS', 30),
+                half_open_calls=getattr(settings, 'SANDBOX_CIRCUIT_HALF_OPEN_CALLS', 3),
+            )
+            _breakers[backend] = breaker
+        return breaker
+
+
+def get_admission_controller(backend):
+    """Returns the shared admission controller of a backend, configured from settings on first use."""
+    with _registry_lock:
+        controller = _admission_controllers.get(backend)
+        if controller is None:
+            controller = AdmissionController(
+                backend,
+                max_concurrent=getattr(settings, 'SANDBOX_MAX_CONCURRENT_EXECUTIONS', 8),
+                max_queued=getattr(settings, 'SANDBOX_MAX_QUEUED_EXECUTIONS', 16),
+                timeout=getattr(settings, 'SANDBOX_ADMISSION_TIMEOUT', 10),
+            )
+            _admission_controllers[backend] = controller
+        return controller
+
+
+def get_resilience_stats():
+    """Returns circuit breaker and admission control stats for every backend used so far."""
+    with _registry_lock:
+        breakers = dict(_breakers)
+        controllers = dict(_admission_controllers)
+    return {
+        "circuit_breakers": {backend: breaker.stats() for backend, breaker in breakers.items()},
+        "admission": {backend: controller.stats() for backend, controller in controllers.items()},
+    }
+
+
+def reset_resilience():
+    """Drops all breakers and admission controllers so they are rebuilt from settings (used in tests)."""
+    with _registry_lock:
+        _breakers.clear()
+        _admission_controllers.clear()
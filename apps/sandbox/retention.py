@@ -0,0 +1,218 @@
+"""
+Retention policy for the execution history.
+
+Every run creates an ExecutionRequest and usually an ExecutionResult. archive_expired_executions()
+moves rows past their retention period out of the database in batches:
+
+1. the batch is appended to a gzip-compressed JSONL file in EXECUTION_ARCHIVE_DIR and synced to disk;
+2. its counts and measurements are added to ArchivedExecutionStats (one row per day and sandbox);
+3. the requests are deleted, which deletes their results and unlinks any submissions.
+
+Steps 2 and 3 run in one transaction, after the archive is on disk, so a crash can at worst archive
+a batch twice; it never loses rows. Analytics add the ArchivedExecutionStats counters to the live
+tables (see get_archived_totals), so totals stay correct after archival.
+
+Policy:
+- only finished requests ('completed' or 'failed') are archived, never queued or running ones;
+- requests without a submission expire after EXECUTION_RETENTION_DAYS (0 disables archival);
+- requests that graded an exercise submission expire after EXECUTION_SUBMISSION_RETENTION_DAYS
+  (0 keeps them as long as the submission exists).
+"""
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef, Q, Sum
+from django.utils import timezone
+from apps.progress.models import ExerciseSubmission
+from .models import ExecutionRequest, ExecutionResult, ArchivedExecutionStats
+
+logger = logging.getLogger("sandbox")
+
+FINAL_STATUSES = ('completed', 'failed')
+
+
+def get_expired_requests(now=None, retention_days=None, submission_retention_days=None):
+    """
+    Returns the ExecutionRequests the retention policy allows to archive.
+
+    Args:
+        now (datetime, optional): Reference time, defaults to now.
+        retention_days (int, optional): Overrides EXECUTION_RETENTION_DAYS.
+        submission_retention_days (int, optional): Overrides EXECUTION_SUBMISSION_RETENTION_DAYS.
+
+    Returns:
+        QuerySet: Expired requests, empty if retention is disabled.
+    """
+    now = now or timezone.now()
+    if retention_days is None:
+        retention_days = getattr(settings, 'EXECUTION_RETENTION_DAYS', 90)
+    if submission_retention_days is None:
+        submission_retention_days = getattr(settings, 'EXECUTION_SUBMISSION_RETENTION_DAYS', 0)
+    if retention_days <= 0:
+        return ExecutionRequest.objects.none()
+
+    graded_submission = ExerciseSubmission.objects.filter( # Older submissions only link the result
+        Q(execution_request=OuterRef('pk')) | Q(execution_result__request=OuterRef('pk'))
+    )
+    finished = ExecutionRequest.objects.filter(status__in=FINAL_STATUSES).annotate(has_submission=Exists(graded_submission))
+    expired = Q(has_submission=False, created_at__lt=now - timedelta(days=retention_days))
+    if submission_retention_days > 0:
+        expired |= Q(has_submission=True, created_at__lt=now - timedelta(days=submission_retention_days))
+    return finished.filter(expired)
+
+
+def serialize_execution(execution_request, execution_result):
+    """Returns the archive record (one JSONL line) of a request and its result."""
+    def isoformat(value):
+        return value.isoformat() if value else None
+
+    record = {
+        "id": execution_request.id,
+        "user_id": execution_request.user_id,
+        "exercise_id": execution_request.exercise_id,
+        "code": execution_request.code,
+        "stdin": execution_request.stdin,
+        "args": execution_request.args,
+        "sandbox": execution_request.sandbox,
+        "fail_fast": execution_request.fail_fast,
+        "status": execution_request.status,
+        "created_at": isoformat(execution_request.created_at),
+        "queued_at": isoformat(execution_request.queued_at),
+        "started_at": isoformat(execution_request.started_at),
+        "result": None,
+    }
+    if execution_result is not None:
+        record["result"] = {
+            "id": execution_result.id,
+            "output": execution_result.output, # Decompressed by CompressedTextField
+            "error": execution_result.error,
+            "output_bytes": execution_result.output_bytes,
+            "error_bytes": execution_result.error_bytes,
+            "execution_time": execution_result.execution_time,
+            "cpu_time": execution_result.cpu_time,
+            "peak_memory": execution_result.peak_memory,
+            "exit_code": execution_result.exit_code,
+            "signal": execution_result.signal,
+            "cached": execution_result.cached,
+            "test_results": execution_result.test_results,
+            "created_at": isoformat(execution_result.created_at),
+        }
+    return record
+
+
+def add_to_archived_stats(executions):
+    """
+    Adds a batch of (execution_request, execution_result) pairs to the ArchivedExecutionStats counters.
+    Must run in the transaction that deletes them.
+    """
+    counters = defaultdict(lambda: defaultdict(float))
+    peaks = {}
+    for execution_request, execution_result in executions:
+        key = (timezone.localtime(execution_request.created_at).date(), execution_request.sandbox)
+        counter = counters[key]
+        counter["total"] += 1
+        if execution_request.status in FINAL_STATUSES:
+            counter[execution_request.status] += 1
+        if execution_result is None or execution_result.cached: # Cache hits did not run, see ExecutionResult.cached
+            continue
+        if execution_result.signal:
+            counter["killed"] += 1
+        for field in ("execution_time", "cpu_time", "peak_memory"):
+            value = getattr(execution_result, field)
+            if value is not None:
+                counter[f"{field}_total"] += value
+                counter[f"{field}_count"] += 1
+        if execution_result.peak_memory is not None:
+            peaks[key] = max(peaks.get(key, 0), execution_result.peak_memory)
+
+    for (day, sandbox), counter in counters.items():
+        stats, _ = ArchivedExecutionStats.objects.select_for_update().get_or_create(day=day, sandbox=sandbox)
+        ArchivedExecutionStats.objects.filter(pk=stats.pk).update(**{
+            field: F(field) + (int(value) if not field.endswith("_total") else value)
+            for field, value in counter.items()
+        })
+        if (day, sandbox) in peaks and (stats.peak_memory_max or 0) < peaks[(day, sandbox)]:
+            ArchivedExecutionStats.objects.filter(pk=stats.pk).update(peak_memory_max=peaks[(day, sandbox)])
+
+
+def archive_expired_executions(archive_dir=None, batch_size=None, now=None, dry_run=False, **policy):
+    """
+    Archives and deletes every expired execution, batch by batch (see the module docstring).
+
+    Args:
+        archive_dir (str, optional): Directory of the archive files, defaults to EXECUTION_ARCHIVE_DIR.
+        batch_size (int, optional): Requests per batch, defaults to EXECUTION_ARCHIVE_BATCH_SIZE.
+        now (datetime, optional): Reference time for the retention periods.
+        dry_run (bool): Only count the expired requests.
+        **policy: retention_days / submission_retention_days overrides, see get_expired_requests.
+
+    Returns:
+        dict: {"archived": number of requests, "path": archive file or None}
+    """
+    expired = get_expired_requests(now=now, **policy)
+    if dry_run:
+        return {"archived": expired.count(), "path": None}
+
+    archive_dir = archive_dir or getattr(settings, 'EXECUTION_ARCHIVE_DIR', 'archive')
+    batch_size = batch_size or getattr(settings, 'EXECUTION_ARCHIVE_BATCH_SIZE', 1000)
+    archived, path, archive = 0, None, None
+    try:
+        while True:
+            ids = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            if archive is None: # Only create a file if there is something to archive
+                os.makedirs(archive_dir, exist_ok=True)
+                path = os.path.join(archive_dir, f"executions-{timezone.now():%Y%m%dT%H%M%S%f}.jsonl.gz")
+                archive = gzip.open(path, 'wb')
+
+            requests = list(ExecutionRequest.objects.filter(id__in=ids).order_by('id'))
+            results = {result.request_id: result for result in ExecutionResult.objects.filter(request_id__in=ids)}
+            executions = [(execution_request, results.get(execution_request.id)) for execution_request in requests]
+            for execution_request, execution_result in executions:
+                archive.write(json.dumps(serialize_execution(execution_request, execution_result), ensure_ascii=False).encode('utf-8') + b"\n")
+            archive.flush()
+            os.fsync(archive.fileobj.fileno()) # The batch is on disk before its rows are deleted
+
+            with transaction.atomic():
+                add_to_archived_stats(executions)
+                ExecutionRequest.objects.filter(id__in=ids).delete() # Cascades to the results, unlinks submissions
+            archived += len(ids)
+            logger.info(f"archive_expired_executions: Archived {len(ids)} execution request(s) to '{path}' ({archived} so far)")
+    finally:
+        if archive is not None:
+            archive.close()
+    return {"archived": archived, "path": path}
+
+
+def get_archived_totals():
+    """Returns the summed ArchivedExecutionStats counters, all 0 (peak_memory_max None) without archived rows."""
+    totals = ArchivedExecutionStats.objects.aggregate(
+        total=Sum('total'),
+        completed=Sum('completed'),
+        failed=Sum('failed'),
+        killed=Sum('killed'),
+        execution_time_total=Sum('execution_time_total'),
+        execution_time_count=Sum('execution_time_count'),
+        cpu_time_total=Sum('cpu_time_total'),
+        cpu_time_count=Sum('cpu_time_count'),
+        peak_memory_total=Sum('peak_memory_total'),
+        peak_memory_count=Sum('peak_memory_count'),
+        peak_memory_max=Max('peak_memory_max'),
+    )
+    return {field: (value or 0) if field != 'peak_memory_max' else value for field, value in totals.items()}
+
+
+def get_archived_trend(since):
+    """Returns {day: {"total", "completed", "failed"}} of the archived executions created on or after the date since."""
+    trend = {}
+    for row in ArchivedExecutionStats.objects.filter(day__gte=since).values('day').annotate(
+        total_sum=Sum('total'), completed_sum=Sum('completed'), failed_sum=Sum('failed')
+    ):
+        trend[row['day']] = {"total": row['total_sum'], "completed": row['completed_sum'], "failed": row['failed_sum']}
+    return trend
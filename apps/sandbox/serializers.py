@@ -1,6 +1,17 @@
 from rest_framework import serializers
 from .models import ExecutionRequest, ExecutionResult
 
+def get_bypass_cache(data):
+    """
+    Returns the bypass_cache flag of execution request input. JSON booleans and form or query strings
+    ("true"/"false", "1"/"0", "yes"/"no", "on"/"off") are parsed like a BooleanField; anything else is False.
+    """
+    try:
+        return serializers.BooleanField().to_internal_value(data.get('bypass_cache', False))
+    except serializers.ValidationError:
+        return False
+
+
 class ExecutionRequestSerializer(serializers.ModelSerializer):
     """Serializer for ExecutionRequest model."""
     user = serializers.PrimaryKeyRelatedField(read_only=True) # Display user ID, make it read-only
@@ -9,10 +20,11 @@ class ExecutionRequestSerializer(serializers.ModelSerializer):
     stdin = serializers.CharField(required=False, allow_blank=True, default='')
     args = serializers.CharField(required=False, allow_blank=True, default='')
     code = serializers.CharField(required=True, error_messages={"required": "Code field is required for execution."})
+    fail_fast = serializers.BooleanField(required=False, default=False)
 
     class Meta:
         model = ExecutionRequest
-        fields = ['id', 'user', 'exercise', 'code', 'sandbox', 'created_at', 'status', 'stdin', 'args']
+        fields = ['id', 'user', 'exercise', 'code', 'sandbox', 'created_at', 'status', 'stdin', 'args', 'fail_fast']
         read_only_fields = ['id', 'created_at', 'status', 'user']
 
 
@@ -30,5 +42,5 @@ class ExecutionResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExecutionResult
         # MODIFIED: Added 'test_results' to the fields list
-        fields = ['id', 'request', 'output', 'error', 'execution_time', 'test_results']
+        fields = ['id', 'request', 'output', 'error', 'execution_time', 'cpu_time', 'peak_memory', 'exit_code', 'signal', 'output_bytes', 'error_bytes', 'cached', 'test_results']
         read_only_fields = ['id', 'request'] # request is set when creating result
\ No newline at end of file
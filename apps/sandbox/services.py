@@ -0,0 +1,113 @@
+"""
+Execution service shared by the sandbox and progress apps.
+
+Views validate their own HTTP input and then call these functions with model objects. Nothing here
+builds requests, re-authenticates or serializes: callers get ExecutionRequest / ExecutionResult
+instances back and decide how to render them.
+"""
+import logging
+from .models import ExecutionRequest
+from .utils import process_execution_request
+from .jobs import enqueue_execution_request
+
+logger = logging.getLogger("sandbox")
+
+
+def create_execution_request(user, code, exercise=None, stdin='', args='', sandbox=None, fail_fast=False):
+    """
+    Creates an ExecutionRequest for already validated input.
+
+    Args:
+        user (User): The user the execution belongs to.
+        code (str): The code to run.
+        exercise (Exercise, optional): Exercise whose test cases are run against the code.
+        stdin (str): Input for the standard run.
+        args (str): Comma-separated command-line arguments.
+        sandbox (str, optional): Sandbox backend; defaults to the exercise's sandbox, then 'piston'.
+        fail_fast (bool): Stop test evaluation at the first failure.
+
+    Returns:
+        ExecutionRequest: The saved request, status 'pending'.
+    """
+    if sandbox is None:
+        sandbox = exercise.sandbox if exercise else 'piston'
+    execution_request = ExecutionRequest.objects.create(
+        user=user,
+        exercise=exercise,
+        code=code,
+        stdin=stdin,
+        args=args,
+        sandbox=sandbox,
+        fail_fast=fail_fast,
+    )
+    logger.info(f"Execution request created by user '{user.username}' with ID '{execution_request.id}', sandbox: '{sandbox}'.")
+    return execution_request
+
+
+def rerun_execution_request(user, request_id):
+    """
+    Creates a new ExecutionRequest running the same code as one of the user's requests (existing_request_id).
+
+    The original request and its result are left as they are: a graded submission may still point
+    to that result.
+
+    Args:
+        user (User): The user asking for the run, only their own requests are copied.
+        request_id: ID of the request to run again, as sent by the client.
+
+    Returns:
+        ExecutionRequest or None: The new request, status 'pending', or None if the user has no request with this ID.
+    """
+    try:
+        execution_request = ExecutionRequest.objects.select_related('exercise').filter(pk=request_id, user=user).first()
+    except (TypeError, ValueError): # Not a valid ID
+        execution_request = None
+    if execution_request is None:
+        logger.warning(f"Execution request with ID {request_id} not found for user '{user.username}', creating new one")
+        return None
+    logger.debug(f"Running execution request ID '{execution_request.id}' again as a new request")
+    return create_execution_request(
+        user,
+        execution_request.code,
+        exercise=execution_request.exercise,
+        stdin=execution_request.stdin,
+        args=execution_request.args,
+        sandbox=execution_request.sandbox,
+        fail_fast=execution_request.fail_fast,
+    )
+
+
+def run_execution_request(execution_request, use_cache=True):
+    """
+    Runs an ExecutionRequest synchronously.
+
+    Args:
+        execution_request (ExecutionRequest): The request to run.
+        use_cache (bool): False to bypass the execution result cache.
+
+    Returns:
+        tuple: (execution_result, execution_success), see utils.process_execution_request.
+
+    Raises:
+        SandboxUnavailable: If the sandbox refused the execution; the request is marked 'failed' with an error result
+                            and can be run again with rerun_execution_request().
+    """
+    return process_execution_request(execution_request, use_cache=use_cache)
+
+
+def queue_execution_request(execution_request):
+    """
+    Hands an ExecutionRequest to the background workers (see jobs.py).
+
+    Returns:
+        ExecutionRequest: The queued request.
+
+    Raises:
+        ValueError: If the request already finished, see rerun_execution_request().
+    """
+    return enqueue_execution_request(execution_request)
+
+
+def all_tests_passed(execution_result):
+    """Returns True if every test case of an execution passed (also True for executions without test cases)."""
+    return all(result.get('passed', False) for result in execution_result.test_results or [])
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+from apps.lessons.models import Exercise
+from .cache import result_cache
+import logging
+
+logger = logging.getLogger("sandbox")
+
+# Sent once an ExecutionRequest has reached its final status, whether it ran synchronously or on a
+# background worker. Arguments: execution_request, execution_result (None if no result was written)
+# and success (False when the sandbox could not run the code).
+execution_finished = Signal()
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def invalidate_exercise_results(sender, instance, **kwargs):
+    """
+    Signal handler that drops cached execution results when an exercise changes.
+    Cache keys already include a fingerprint of the test cases, this frees the stale entries right away.
+    """
+    invalidated = result_cache.invalidate_exercise(instance.id)
+    logger.debug(f"Exercise '{instance.id}' changed, invalidated {invalidated} cached execution result(s)")
@@ -0,0 +1,139 @@
+"""
+Server-Sent Events stream of an execution's progress.
+
+The stream view is a native async Django view: while a stream waits for the next event it only holds
+an asyncio timer, not a thread, so one ASGI process (icpp/asgi.py under uvicorn) can keep thousands of
+idle streams open. Events are read from the cache-backed log in events.py.
+
+Browsers' EventSource cannot send an Authorization header. Instead of the JWT access token, such
+clients pass a stream ticket as the `ticket` query parameter: a random string issued by an
+authenticated POST (ExecutionEventsTicketAPIView), valid for SANDBOX_EVENTS_TICKET_TTL seconds and
+only for the event stream of one execution request.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+from apps.common.authentication import aauthenticate_jwt
+from .models import ExecutionRequest, ExecutionResult
+from .events import aread_events, FINISHED
+
+logger = logging.getLogger("sandbox")
+
+FINAL_STATUSES = ('completed', 'failed')
+TICKET_CACHE_PREFIX = "sandbox:stream-ticket"
+
+
+def issue_stream_ticket(user, execution_request):
+    """
+    Issues a short-lived ticket opening the event stream of one execution request.
+
+    Returns:
+        str: The ticket, to pass as the `ticket` query parameter of the stream URL.
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(f"{TICKET_CACHE_PREFIX}:{ticket}", {"user_id": user.pk, "request_id": execution_request.id}, timeout=getattr(settings, 'SANDBOX_EVENTS_TICKET_TTL', 60))
+    return ticket
+
+
+async def aget_ticket_user(ticket, request_id):
+    """Returns the user a stream ticket was issued to, or None if it is unknown, expired or for another request."""
+    grant = await cache.aget(f"{TICKET_CACHE_PREFIX}:{ticket}")
+    if grant is None or grant["request_id"] != request_id:
+        return None
+    return await get_user_model().objects.filter(pk=grant["user_id"], is_active=True).afirst()
+
+
+def format_event(event_type, data, event_id=None):
+    """Formats one Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def get_final_state(request_id):
+    """Returns the 'finished' event payload from the database if the request is final, else None."""
+    execution_request = await ExecutionRequest.objects.filter(pk=request_id).only('status').afirst()
+    if execution_request is None or execution_request.status not in FINAL_STATUSES:
+        return None
+    result_id = await ExecutionResult.objects.filter(request_id=request_id).values_list('id', flat=True).afirst()
+    return {"status": execution_request.status, "result_id": result_id, "success": result_id is not None}
+
+
+async def stream_execution_events(request_id, after=0):
+    """
+    Yields the events of an execution request as Server-Sent Events until it finishes.
+
+    Args:
+        request_id (int): The ExecutionRequest ID.
+        after (int): Last event ID the client has seen (from Last-Event-ID on reconnect).
+    """
+    poll_interval = getattr(settings, 'SANDBOX_EVENTS_POLL_INTERVAL', 0.5)
+    heartbeat = getattr(settings, 'SANDBOX_EVENTS_HEARTBEAT', 15)
+    deadline = time.monotonic() + getattr(settings, 'SANDBOX_EVENTS_STREAM_TIMEOUT', 300)
+    last_activity = time.monotonic()
+    check_database = True # Also covers requests that finished before the stream opened and whose events expired
+
+    yield "retry: 2000\n\n"
+    while time.monotonic() < deadline:
+        events = await aread_events(request_id, after)
+        for seq, event in events:
+            after = seq
+            yield format_event(event["event"], event["data"], seq)
+            if event["event"] == FINISHED:
+                return
+
+        now = time.monotonic()
+        if events:
+            last_activity = now
+        elif check_database or now - last_activity >= heartbeat:
+            final_state = await get_final_state(request_id)
+            if final_state is not None:
+                yield format_event(FINISHED, final_state)
+                return
+            if now - last_activity >= heartbeat:
+                yield ": keep-alive\n\n" # Comment line, keeps proxies from closing an idle stream
+                last_activity = now
+        check_database = False
+        await asyncio.sleep(poll_interval)
+    yield format_event("timeout", {"after": after})
+
+
+async def execution_event_stream(request, request_id):
+    """
+    Streams the progress of an execution request as Server-Sent Events.
+
+    Events: queued, started, deferred, standard_output, test_case (one per test case, in completion
+    order) and finished. The stream ends after 'finished'.
+    """
+    user = await aauthenticate_jwt(request)
+    if user is None and request.GET.get('ticket'):
+        user = await aget_ticket_user(request.GET['ticket'], request_id)
+    if user is None:
+        return JsonResponse({"error": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    execution_request = await ExecutionRequest.objects.filter(pk=request_id).only('id', 'user_id').afirst()
+    if execution_request is None:
+        logger.warning(f"Execution request with ID '{request_id}' not found.")
+        return JsonResponse({"error": "Execution request not found."}, status=404)
+    if execution_request.user_id != user.pk: # Only the requester can follow the execution
+        logger.warning(f"User '{user.username}' attempted to stream events of execution request ID '{request_id}' belonging to another user.")
+        return JsonResponse({"error": "Unauthorized access."}, status=403)
+
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        after = 0
+
+    response = StreamingHttpResponse(stream_execution_events(request_id, after), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Disable response buffering in nginx
+    return response
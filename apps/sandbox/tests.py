@@ -1,11 +1,45 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from unittest.mock import patch, Mock
 from rest_framework.test import APIRequestFactory, force_authenticate
 from django.contrib.auth import get_user_model
 from apps.lessons.models import Exercise, Lesson
-from apps.sandbox.api_views import ExecutionRequestAPIView
-from apps.sandbox.models import ExecutionRequest, ExecutionResult
+from apps.sandbox.api_views import ExecutionRequestAPIView, ExecutionResultAPIView, ExecutionEventsTicketAPIView, SandboxMetricsAPIView
+from apps.sandbox.cache import ExecutionResultCache, result_cache
+from apps.sandbox import client
+from apps.sandbox.utils import execute_code_in_sandbox, send_to_backend, sandbox_single_flight, SingleFlight, get_batch_run_timeout
+from apps.sandbox.harness import build_harness, parse_harness_output
+from apps.sandbox.nodes import SandboxNode, SandboxNodePool, get_node_pool, reset_node_pools
+from apps.sandbox.resilience import CircuitBreaker, AdmissionController, SandboxUnavailable, reset_resilience, execution_scope
+from apps.sandbox.events import publish_event, aread_events
+from apps.sandbox.local import get_local_sandbox, reset_local_sandbox
+from apps.sandbox.output import truncate_output, compress_text, decompress_text, COMPRESSED_PREFIX
+from apps.sandbox.streams import stream_execution_events
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.sandbox.jobs import enqueue_execution_request, claim_next_execution_request, run_next_execution_job
+from apps.sandbox.models import ExecutionRequest, ExecutionResult, ArchivedExecutionStats
+from apps.sandbox.retention import archive_expired_executions
+from apps.sandbox.partitioning import month_range
+from apps.progress.models import ExerciseSubmission
+from apps.analytics.api_views import SandboxAnalyticsAPIView
+from apps.common.throttling import execution_slot
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from datetime import date, timedelta
+import gzip
+import asyncio
 import json
+import os
+import requests
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 User = get_user_model()
 
@@ -13,6 +47,7 @@ User = get_user_model()
 class PistonExecutionTests(TestCase):
 
     def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
         self.user = User.objects.create_user(username='testuser', password='testpassword')
         # Create a Lesson object
         self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
@@ -20,7 +55,7 @@ class PistonExecutionTests(TestCase):
         self.exercise = Exercise.objects.create(title="Test Exercise", lesson=self.lesson, sandbox="piston", created_by=self.user)
         self.factory = APIRequestFactory()
 
-    @patch('apps.sandbox.utils.requests.post')
+    @patch('apps.sandbox.client.requests.Session.post')
     def test_successful_piston_execution(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -46,7 +81,7 @@ class PistonExecutionTests(TestCase):
         self.assertEqual(ExecutionRequest.objects.first().status, 'completed')
         mock_post.assert_called_once()
 
-    @patch('apps.sandbox.utils.requests.post')
+    @patch('apps.sandbox.client.requests.Session.post')
     def test_piston_execution_with_stdin(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -81,7 +116,7 @@ class PistonExecutionTests(TestCase):
         called_payload = mock_post.call_args.kwargs['json']
         self.assertEqual(called_payload['stdin'], stdin_text)
 
-    @patch('apps.sandbox.utils.requests.post')
+    @patch('apps.sandbox.client.requests.Session.post')
     def test_piston_execution_with_args(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -116,7 +151,7 @@ class PistonExecutionTests(TestCase):
         called_payload = mock_post.call_args.kwargs['json']
         self.assertEqual(called_payload['args'], ["arg1", "arg2", "arg3"])
 
-    @patch('apps.sandbox.utils.requests.post')
+    @patch('apps.sandbox.client.requests.Session.post')
     def test_piston_execution_compile_error(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200  # Still a successful HTTP response (from API perspective)
@@ -166,6 +201,7 @@ class PistonExecutionTests(TestCase):
 class PistonExecutionWithTestsTests(TestCase):
 
     def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
         super().setUp()
         self.user = User.objects.create_user(username='testuser_test', password='testpassword')
         self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
@@ -181,7 +217,7 @@ class PistonExecutionWithTestsTests(TestCase):
         )
         self.factory = APIRequestFactory()
 
-    @patch('apps.sandbox.utils.requests.post')
+    @patch('apps.sandbox.client.requests.Session.post')
     def test_piston_execution_with_test_cases_success(self, mock_post):
         # Mock Piston API to return successful output for all test cases
         def side_effect(url, *args, **kwargs): # Define a side effect function
@@ -211,7 +247,7 @@ class PistonExecutionWithTestsTests(TestCase):
         for test_result in result.test_results:
             self.assertTrue(test_result['passed']) # Assert all tests passed
 
-    @patch('apps.sandbox.utils.requests.post')
+    @patch('apps.sandbox.client.requests.Session.post')
     def test_piston_execution_with_test_cases_failure(self, mock_post):
         # Mock Piston API to return successful output for first test case and failure for second
         def side_effect(url, *args, **kwargs):
@@ -246,4 +282,1310 @@ class PistonExecutionWithTestsTests(TestCase):
             else:
                 failed_count += 1
         self.assertEqual(passed_count, 1) # One test case should pass
-        self.assertEqual(failed_count, 1) # One test case should fail
\ No newline at end of file
+        self.assertEqual(failed_count, 1) # One test case should fail
+
+class ParallelTestCaseExecutionTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        self.user = User.objects.create_user(username='testuser_parallel', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(
+            title="Parallel Exercise",
+            lesson=self.lesson,
+            sandbox="piston",
+            created_by=self.user,
+            test_cases=[{"input": str(i), "expected_output": str(i * 2)} for i in range(6)]
+        )
+        self.factory = APIRequestFactory()
+
+    def _post(self):
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'print(int(input()) * 2)', 'exercise': self.exercise.id, 'sandbox': 'piston'}, format='json')
+        force_authenticate(request, user=self.user)
+        return ExecutionRequestAPIView.as_view()(request)
+
+    def _doubling_side_effect(self, tracker):
+        lock = threading.Lock()
+
+        def side_effect(url, *args, **kwargs):
+            stdin = kwargs.get('json').get('stdin', '')
+            with lock:
+                tracker['in_flight'] += 1
+                tracker['peak'] = max(tracker['peak'], tracker['in_flight'])
+            # Earlier test cases answer last, so completion order is the reverse of submission order
+            time.sleep(0.05 * (6 - int(stdin)) if stdin else 0)
+            with lock:
+                tracker['in_flight'] -= 1
+            mock_response = Mock()
+            mock_response.status_code = 200
+            output = f"{int(stdin) * 2}\n" if stdin else ""
+            mock_response.json.return_value = {"run": {"stdout": output, "stderr": "", "code": 0, "signal": None}, "compile": {}}
+            return mock_response
+        return side_effect
+
+    @override_settings(SANDBOX_TEST_CASE_CONCURRENCY=4)
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_test_results_keep_exercise_order(self, mock_post):
+        tracker = {'in_flight': 0, 'peak': 0}
+        mock_post.side_effect = self._doubling_side_effect(tracker)
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 201)
+        result = ExecutionResult.objects.get()
+        self.assertEqual([r['test_case'] for r in result.test_results], self.exercise.test_cases)
+        self.assertEqual([r['actual_output'] for r in result.test_results], [str(i * 2) for i in range(6)])
+        self.assertTrue(all(r['passed'] for r in result.test_results))
+        self.assertEqual(mock_post.call_count, 7)
+        self.assertGreater(tracker['peak'], 1)
+        self.assertLessEqual(tracker['peak'], 4)
+
+    @override_settings(SANDBOX_TEST_CASE_CONCURRENCY=1)
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_concurrency_limit_is_respected(self, mock_post):
+        tracker = {'in_flight': 0, 'peak': 0}
+        mock_post.side_effect = self._doubling_side_effect(tracker)
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(tracker['peak'], 1)
+        self.assertEqual(len(ExecutionResult.objects.get().test_results), 6)
+
+    @override_settings(SANDBOX_TEST_CASE_CONCURRENCY=1)
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_fail_fast_exercise_skips_remaining_test_cases(self, mock_post):
+        tracker = {'in_flight': 0, 'peak': 0}
+        mock_post.side_effect = self._doubling_side_effect(tracker)
+        self.exercise.test_cases[1]["expected_output"] = "wrong"
+        self.exercise.fail_fast = True
+        self.exercise.save()
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 201)
+        test_results = ExecutionResult.objects.get().test_results
+        self.assertEqual(len(test_results), 6)
+        self.assertTrue(test_results[0]['passed'])
+        self.assertFalse(test_results[1]['passed'])
+        self.assertNotIn('skipped', test_results[1])
+        skipped = [r for r in test_results if r.get('skipped')]
+        self.assertGreaterEqual(len(skipped), 3) # The worker may already have picked up the next test case
+        self.assertTrue(all(not r['passed'] for r in skipped))
+        self.assertEqual(mock_post.call_count, 1 + 6 - len(skipped))
+        self.assertEqual(ExecutionRequest.objects.get().status, 'failed')
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_fail_fast_off_runs_every_test_case(self, mock_post):
+        tracker = {'in_flight': 0, 'peak': 0}
+        mock_post.side_effect = self._doubling_side_effect(tracker)
+        self.exercise.test_cases[0]["expected_output"] = "wrong"
+        self.exercise.save()
+
+        self._post()
+
+        self.assertEqual(mock_post.call_count, 7)
+        self.assertFalse(any(r.get('skipped') for r in ExecutionResult.objects.get().test_results))
+
+
+class ExecutionJobQueueTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        self.user = User.objects.create_user(username='testuser_jobs', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(
+            title="Queued Exercise",
+            lesson=self.lesson,
+            sandbox="piston",
+            created_by=self.user,
+            test_cases=[{"input": "", "expected_output": "hi"}]
+        )
+        self.factory = APIRequestFactory()
+
+    def _get_result(self, request_id):
+        request = self.factory.get(f'/api/sandbox/execution-results/{request_id}/')
+        force_authenticate(request, user=self.user)
+        return ExecutionResultAPIView.as_view()(request, request_id=request_id)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_async_mode_queues_and_worker_completes(self, mock_post):
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"run": {"stdout": "hi\n", "stderr": "", "code": 0, "signal": None}, "compile": {}}
+        mock_post.return_value = mock_response
+
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'print("hi")', 'exercise': self.exercise.id, 'sandbox': 'piston', 'mode': 'async'}, format='json')
+        force_authenticate(request, user=self.user)
+        response = ExecutionRequestAPIView.as_view()(request)
+
+        self.assertEqual(response.status_code, 202)
+        request_id = response.data['id']
+        self.assertEqual(response.data['status'], 'pending')
+        mock_post.assert_not_called()
+        self.assertEqual(self._get_result(request_id).status_code, 202)
+
+        self.assertTrue(run_next_execution_job())
+        self.assertFalse(run_next_execution_job()) # Queue is drained
+
+        execution_request = ExecutionRequest.objects.get(pk=request_id)
+        self.assertEqual(execution_request.status, 'completed')
+        self.assertIsNotNone(execution_request.started_at)
+        result_response = self._get_result(request_id)
+        self.assertEqual(result_response.status_code, 200)
+        self.assertTrue(result_response.data['test_results'][0]['passed'])
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_async_mode_runs_a_finished_request_again(self, mock_post):
+        mock_post.return_value = Mock(status_code=200, json=Mock(return_value={"run": {"stdout": "hi\n", "stderr": "", "code": 0, "signal": None}, "compile": {}}))
+        finished = ExecutionRequest.objects.create(user=self.user, exercise=self.exercise, code='print("hi")', status='failed')
+        ExecutionResult.objects.create(request=finished, output="Execution failed.", error="Sandbox unavailable")
+
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'print("hi")', 'mode': 'async', 'existing_request_id': finished.id}, format='json')
+        force_authenticate(request, user=self.user)
+        response = ExecutionRequestAPIView.as_view()(request)
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data['id'], finished.id) # Queued as a new request
+
+        self.assertTrue(run_next_execution_job())
+        self.assertEqual(ExecutionRequest.objects.get(pk=response.data['id']).status, 'completed')
+        self.assertTrue(self._get_result(response.data['id']).data['test_results'][0]['passed'])
+        self.assertEqual(ExecutionResult.objects.get(request=finished).error, "Sandbox unavailable")
+        with self.assertRaises(ValueError):
+            enqueue_execution_request(finished) # Never queued over its result
+
+    @patch('apps.sandbox.jobs.process_execution_request', side_effect=RuntimeError("worker crashed"))
+    def test_crashed_job_gets_an_error_result(self, mock_process):
+        execution_request = ExecutionRequest.objects.create(user=self.user, code='print(1)')
+        enqueue_execution_request(execution_request)
+
+        self.assertTrue(run_next_execution_job())
+        result_response = self._get_result(execution_request.id)
+        self.assertEqual(result_response.status_code, 200) # Final answer instead of 404
+        self.assertIn('worker crashed', result_response.data['error'])
+        self.assertEqual(ExecutionRequest.objects.get(pk=execution_request.id).status, 'failed')
+
+    def test_synchronous_requests_are_not_claimed_by_workers(self):
+        ExecutionRequest.objects.create(user=self.user, code='print(1)')
+        self.assertIsNone(claim_next_execution_request())
+
+    def test_claim_is_exclusive(self):
+        execution_request = ExecutionRequest.objects.create(user=self.user, code='print(1)')
+        enqueue_execution_request(execution_request)
+
+        claimed = claim_next_execution_request()
+        self.assertEqual(claimed.id, execution_request.id)
+        self.assertEqual(claimed.status, 'running')
+        self.assertIsNone(claim_next_execution_request())
+
+
+class StubSandboxServer:
+    """Local HTTP server that answers sandbox API calls with canned JSON responses."""
+
+    def __init__(self, responses=None, delay=0):
+        self.responses = list(responses or [])
+        self.delay = delay
+        self.fail_with = None # Set to an HTTP status code to make every call fail
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                stub.requests.append((self.command, self.path, body, self.client_address))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.fail_with:
+                    status_code, data = stub.fail_with, {}
+                else:
+                    status_code, data = stub.responses.pop(0) if stub.responses else (200, {"run": {"stdout": "ok\n", "stderr": "", "code": 0, "signal": None}, "compile": {}})
+                payload = json.dumps(data).encode()
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(SANDBOX_HTTP_BACKOFF_FACTOR=0, SANDBOX_HTTP_MAX_RETRIES=2)
+class SandboxClientTests(TestCase):
+
+    def setUp(self):
+        client.close_sessions()
+
+    def tearDown(self):
+        client.close_sessions()
+
+    def test_session_is_shared_per_backend(self):
+        self.assertIs(client.get_session('http://localhost:2000/api/v2/execute'), client.get_session('http://localhost:2000/api/v2/runtimes'))
+        self.assertIsNot(client.get_session('http://localhost:2000/api/v2/execute'), client.get_session('http://localhost:2001/execute'))
+
+    def test_connections_are_kept_alive(self):
+        with StubSandboxServer() as stub:
+            for _ in range(3):
+                self.assertEqual(execute_code_in_sandbox(f"{stub.url}/execute", {"code": "print(1)"})["run"]["stdout"], "ok\n")
+        self.assertEqual(len({request[3] for request in stub.requests}), 1) # All calls reused one client socket
+
+    def test_unavailable_backend_is_retried(self):
+        with StubSandboxServer(responses=[(503, {}), (200, {"output": "done"})]) as stub:
+            self.assertEqual(execute_code_in_sandbox(f"{stub.url}/execute", {"code": "print(1)"}), {"output": "done"})
+        self.assertEqual(len(stub.requests), 2)
+
+    @override_settings(SANDBOX_HTTP_READ_TIMEOUT=0.2)
+    def test_hung_backend_times_out(self):
+        with StubSandboxServer(delay=1) as stub:
+            started = time.monotonic()
+            self.assertIsNone(execute_code_in_sandbox(f"{stub.url}/execute", {"code": "print(1)"}))
+            self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(stub.requests), 1) # Read timeouts are not retried
+
+
+def run_like_piston(url, *args, **kwargs):
+    """Mock for Session.post that executes a Piston payload locally, running the first file as entry point."""
+    payload = kwargs.get('json')
+    with tempfile.TemporaryDirectory() as workdir:
+        for file in payload['files']:
+            with open(os.path.join(workdir, file['name']), 'w') as handle:
+                handle.write(file['content'])
+        completed = subprocess.run(
+            [sys.executable, payload['files'][0]['name'], *payload.get('args', [])],
+            input=payload.get('stdin', ''), capture_output=True, text=True, cwd=workdir, timeout=30
+        )
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"run": {"stdout": completed.stdout, "stderr": completed.stderr, "code": completed.returncode, "signal": None}, "compile": {}}
+    return mock_response
+
+
+class ExecutionMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        self.user = User.objects.create_user(username='testuser_metrics', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.factory = APIRequestFactory()
+
+    def _post(self, exercise, code):
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': code, 'exercise': exercise.id}, format='json')
+        force_authenticate(request, user=self.user)
+        return ExecutionRequestAPIView.as_view()(request)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_piston_metrics_are_stored_per_test_and_aggregated(self, mock_post):
+        exercise = Exercise.objects.create(title="Metrics Exercise", lesson=self.lesson, sandbox="piston", created_by=self.user, test_cases=[{"input": "1", "expected_output": "1"}, {"input": "2", "expected_output": "2"}])
+
+        def side_effect(url, *args, **kwargs):
+            stdin = kwargs.get('json').get('stdin', '')
+            mock_response = Mock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = {"run": {
+                "stdout": f"{stdin}\n", "stderr": "", "code": 0, "signal": None,
+                "cpu_time": 10 + int(stdin or 0), "wall_time": 20 + int(stdin or 0), "memory": 1000 * (int(stdin or 0) + 1),
+            }, "compile": {}}
+            return mock_response
+        mock_post.side_effect = side_effect
+
+        response = self._post(exercise, 'print(input())')
+
+        self.assertEqual(response.status_code, 201)
+        result = ExecutionResult.objects.get()
+        self.assertEqual(result.test_results[1]['metrics'], {"wall_time": 22, "cpu_time": 12, "memory": 3000, "exit_code": 0, "signal": None, "stdout_bytes": 2, "stderr_bytes": 0})
+        self.assertAlmostEqual(result.execution_time, 0.063)
+        self.assertAlmostEqual(result.cpu_time, 0.033)
+        self.assertEqual((result.peak_memory, result.exit_code, result.signal), (3000, 0, None))
+        self.assertEqual(response.data['peak_memory'], 3000)
+
+    @override_settings(LOCAL_SANDBOX_TIMEOUT=0.5)
+    def test_local_run_records_signal_and_measured_usage(self):
+        reset_local_sandbox()
+        self.addCleanup(reset_local_sandbox)
+        exercise = Exercise.objects.create(title="Local Metrics", lesson=self.lesson, sandbox="local", created_by=self.user, test_cases=[{"input": "", "expected_output": ""}])
+
+        self._post(exercise, 'while True:\n    pass')
+
+        result = ExecutionResult.objects.get()
+        self.assertEqual((result.exit_code, result.signal), (None, "SIGKILL"))
+        self.assertEqual(result.test_results[0]['metrics']['signal'], "SIGKILL")
+        self.assertGreater(result.cpu_time, 0.5) # Both runs spun until the timeout
+        self.assertGreater(result.peak_memory, 0)
+
+
+class OutputCaptureTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        self.user = User.objects.create_user(username='testuser_output', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.factory = APIRequestFactory()
+
+    def test_truncation_and_compression_round_trip(self):
+        text, total = truncate_output("é" * 10, 5)
+        self.assertEqual((text, total), ("éé\n[output truncated: showing 4 of 20 bytes]", 20)) # Never splits a character
+        self.assertEqual(truncate_output("short", 5), ("short", 5))
+        self.assertIn("showing 3 of 50 bytes", truncate_output("abc", 10, total_bytes=50)[0]) # Already cut by the harness
+
+        large = "line\n" * 1000
+        self.assertTrue(compress_text(large).startswith(COMPRESSED_PREFIX))
+        self.assertLess(len(compress_text(large)), len(large) // 10)
+        self.assertEqual(decompress_text(compress_text(large)), large)
+        self.assertEqual(compress_text("small"), "small")
+        tricky = COMPRESSED_PREFIX + "not compressed"
+        self.assertEqual(decompress_text(compress_text(tricky)), tricky)
+
+    @override_settings(SANDBOX_OUTPUT_MAX_BYTES=4096, SANDBOX_TEST_OUTPUT_MAX_BYTES=256, SANDBOX_OUTPUT_COMPRESS_MIN_BYTES=1024)
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_runaway_output_is_capped_and_stored_compressed(self, mock_post):
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"run": {"stdout": "spam\n" * 100000, "stderr": "", "code": 0, "signal": None}, "compile": {}}
+        mock_post.return_value = mock_response
+        exercise = Exercise.objects.create(title="Output Exercise", lesson=self.lesson, sandbox="piston", created_by=self.user, test_cases=[{"input": "", "expected_output": "spam"}])
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'while True: print("spam")', 'exercise': exercise.id}, format='json')
+        force_authenticate(request, user=self.user)
+
+        response = ExecutionRequestAPIView.as_view()(request)
+
+        self.assertEqual(response.status_code, 201)
+        stored = ExecutionResult.objects.values_list('output', flat=True).get()
+        self.assertTrue(stored.startswith(COMPRESSED_PREFIX))
+        self.assertLess(len(stored), 1024)
+
+        result = ExecutionResult.objects.get()
+        self.assertEqual(result.output_bytes, 500000)
+        self.assertTrue(result.output.endswith("[output truncated: showing 4096 of 500000 bytes]")) # Lazily decompressed
+        self.assertLessEqual(len(result.test_results[0]['actual_output']), 256 + 60)
+        self.assertEqual(result.test_results[0]['metrics']['stdout_bytes'], 500000)
+        self.assertFalse(result.test_results[0]['passed'])
+        self.assertEqual(response.data['output'], result.output)
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser_retention', password='testpassword')
+        self.instructor = User.objects.create_user(username='instructor_retention', password='testpassword', role='instructor')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(title="Retention Exercise", lesson=self.lesson, sandbox="piston", created_by=self.user)
+        self.archive_dir = tempfile.mkdtemp()
+
+    def create_execution(self, days_old, status='completed', **result_fields):
+        execution_request = ExecutionRequest.objects.create(user=self.user, exercise=self.exercise, code="print(1)", status=status)
+        ExecutionRequest.objects.filter(pk=execution_request.pk).update(created_at=timezone.now() - timedelta(days=days_old))
+        execution_result = None
+        if status == 'completed':
+            execution_result = ExecutionResult.objects.create(request=execution_request, output="1\n", **result_fields)
+        return execution_request, execution_result
+
+    def get_sandbox_stats(self):
+        request = APIRequestFactory().get('/api/analytics/sandbox/')
+        force_authenticate(request, user=self.instructor)
+        response = SandboxAnalyticsAPIView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data['overall_stats']
+
+    def test_expired_executions_are_archived_and_still_counted(self):
+        old, _ = self.create_execution(100, execution_time=0.5, cpu_time=0.25, peak_memory=2048, signal='SIGKILL')
+        old_failed, _ = self.create_execution(120, status='failed')
+        cache_hit, _ = self.create_execution(110, execution_time=9.0, cpu_time=9.0, peak_memory=10 ** 9, signal='SIGKILL', cached=True) # Not counted live or archived
+        recent, _ = self.create_execution(5, execution_time=1.5, cpu_time=0.75, peak_memory=1024)
+        running, _ = self.create_execution(100, status='running')
+        graded, graded_result = self.create_execution(100)
+        ExerciseSubmission.objects.create(user=self.user, exercise=self.exercise, submitted_code="print(1)", execution_request=graded, execution_result=graded_result)
+        before = self.get_sandbox_stats()
+
+        outcome = archive_expired_executions(archive_dir=self.archive_dir, batch_size=1, retention_days=90, submission_retention_days=0)
+
+        self.assertEqual(outcome["archived"], 3)
+        self.assertEqual(set(ExecutionRequest.objects.values_list('id', flat=True)), {recent.id, running.id, graded.id})
+        with gzip.open(outcome["path"], 'rt', encoding='utf-8') as archive:
+            records = [json.loads(line) for line in archive]
+        self.assertEqual([record["id"] for record in records], [old.id, old_failed.id, cache_hit.id])
+        self.assertEqual(records[0]["result"]["output"], "1\n")
+        self.assertEqual(records[0]["result"]["signal"], "SIGKILL")
+        self.assertIsNone(records[1]["result"])
+        self.assertTrue(records[2]["result"]["cached"])
+
+        self.assertEqual(sum(ArchivedExecutionStats.objects.values_list('total', flat=True)), 3)
+        after = self.get_sandbox_stats()
+        for field in ('total_executions', 'successful_executions', 'failed_executions', 'avg_execution_time_seconds',
+                      'avg_cpu_time_seconds', 'avg_peak_memory_bytes', 'max_peak_memory_bytes', 'killed_executions'):
+            self.assertEqual(after[field], before[field], field)
+        self.assertEqual(archive_expired_executions(archive_dir=self.archive_dir, retention_days=90), {"archived": 0, "path": None})
+
+    def test_partitioning_requires_postgresql(self):
+        self.assertEqual(month_range(date(2024, 11, 15), date(2025, 1, 2)), [
+            (date(2024, 11, 1), date(2024, 12, 1)), (date(2024, 12, 1), date(2025, 1, 1)), (date(2025, 1, 1), date(2025, 2, 1)),
+        ])
+        with self.assertRaises(CommandError):
+            call_command('partition_execution_tables', '--dry-run')
+
+
+class PistonBatchHarnessTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        self.user = User.objects.create_user(username='testuser_batch', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(
+            title="Batched Exercise",
+            lesson=self.lesson,
+            sandbox="piston",
+            created_by=self.user,
+            test_cases=[
+                {"input": "2 3", "expected_output": "5"},
+                {"input": "10 5", "expected_output": "15"},
+                {"input": "1 x", "expected_output": "1"},
+            ]
+        )
+        self.factory = APIRequestFactory()
+
+    def _post(self, code):
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': code, 'exercise': self.exercise.id, 'sandbox': 'piston', 'stdin': '4 4'}, format='json')
+        force_authenticate(request, user=self.user)
+        return ExecutionRequestAPIView.as_view()(request)
+
+    def test_harness_isolates_runs_and_frames_output(self):
+        code = 'import sys\nprint("<<<ICPP-END-fake>>>")\nprint(sum(map(int, input().split())))\nprint("noise", file=sys.stderr)'
+        files, nonce = build_harness(code, ["1 2", "3 4"], [], 5)
+        runs = parse_harness_output(run_like_piston(None, json={'files': files}).json()['run']['stdout'], nonce, 2)
+
+        self.assertEqual([run['stdout'] for run in runs], ["<<<ICPP-END-fake>>>\n3\n", "<<<ICPP-END-fake>>>\n7\n"])
+        self.assertEqual(runs[0]['stderr'], "noise\n")
+        self.assertEqual(runs[0]['code'], 0)
+
+    def test_truncated_output_is_rejected(self):
+        files, nonce = build_harness('print(1)', ["", ""], [], 5)
+        stdout = run_like_piston(None, json={'files': files}).json()['run']['stdout']
+        self.assertIsNone(parse_harness_output(stdout[:-10], nonce, 2))
+        self.assertIsNone(parse_harness_output(stdout, nonce, 3))
+
+    @override_settings(PISTON_BATCH_TEST_CASES=True)
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_batched_submission_uses_one_sandbox_call(self, mock_post):
+        response = self._post('a, b = input().split()\nprint(int(a) + int(b))')
+
+        self.assertEqual(response.status_code, 201)
+        mock_post.assert_called_once()
+        result = ExecutionResult.objects.get()
+        self.assertEqual(result.output, "8\n")
+        self.assertEqual([r['passed'] for r in result.test_results], [True, True, False])
+        self.assertEqual(result.test_results[1]['actual_output'], "15")
+        self.assertIn("ValueError", result.test_results[2]['error'])
+        self.assertEqual(ExecutionRequest.objects.get().status, 'failed')
+        self.assertEqual([r['metrics']['exit_code'] for r in result.test_results], [0, 0, 1]) # Measured by the harness
+        self.assertTrue(all(r['metrics']['wall_time'] is not None for r in result.test_results))
+        self.assertEqual(mock_post.call_args.kwargs['json']['run_timeout'], 4 * 3000 + 1000) # Standard run and 3 tests, 3s each
+
+    @override_settings(PISTON_BATCH_TEST_TIMEOUT=2.0, PISTON_BATCH_RUN_TIMEOUT_MAX=10000)
+    def test_batch_run_timeout_scales_with_runs_and_is_capped(self):
+        self.assertEqual(get_batch_run_timeout(2), 5000)
+        self.assertEqual(get_batch_run_timeout(20), 10000)
+        with self.settings(PISTON_BATCH_RUN_TIMEOUT=7000): # Explicit setting wins
+            self.assertEqual(get_batch_run_timeout(20), 7000)
+
+    @override_settings(PISTON_BATCH_TEST_CASES=True, SANDBOX_OUTPUT_MAX_BYTES=100)
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_harness_caps_output_per_run(self, mock_post):
+        response = self._post('print("x" * 5000)')
+
+        self.assertEqual(response.status_code, 201)
+        result = ExecutionResult.objects.get()
+        self.assertEqual(result.output_bytes, 5001)
+        self.assertIn("showing 100 of 5001 bytes", result.output)
+        self.assertEqual(result.test_results[0]['metrics']['stdout_bytes'], 5001)
+
+    @override_settings(PISTON_BATCH_TEST_CASES=True)
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_fail_fast_request_stops_harness_at_first_error(self, mock_post):
+        self.exercise.test_cases = [self.exercise.test_cases[2], self.exercise.test_cases[0], self.exercise.test_cases[1]]
+        self.exercise.save()
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'a, b = input().split()\nprint(int(a) + int(b))', 'exercise': self.exercise.id, 'stdin': '4 4', 'fail_fast': True}, format='json')
+        force_authenticate(request, user=self.user)
+
+        response = ExecutionRequestAPIView.as_view()(request)
+
+        self.assertEqual(response.status_code, 201)
+        mock_post.assert_called_once()
+        test_results = ExecutionResult.objects.get().test_results
+        self.assertIn("ValueError", test_results[0]['error'])
+        self.assertEqual([r.get('skipped', False) for r in test_results], [False, True, True])
+        self.assertTrue(ExecutionRequest.objects.get().fail_fast)
+
+    @override_settings(PISTON_BATCH_TEST_CASES=True)
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_unparseable_batch_falls_back_to_per_test_calls(self, mock_post):
+        def side_effect(url, *args, **kwargs):
+            if len(kwargs['json']['files']) > 1: # Harness job killed before printing its results
+                mock_response = Mock()
+                mock_response.status_code = 200
+                mock_response.json.return_value = {"run": {"stdout": "", "stderr": "", "code": None, "signal": "SIGKILL"}, "compile": {}}
+                return mock_response
+            return run_like_piston(url, *args, **kwargs)
+        mock_post.side_effect = side_effect
+
+        response = self._post('a, b = input().split()\nprint(int(a) + int(b))')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mock_post.call_count, 5) # Failed batch + standard run + 3 test cases
+        self.assertEqual([r['passed'] for r in ExecutionResult.objects.get().test_results], [True, True, False])
+
+
+class ExecutionResultCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        result_cache.clear()
+        self.user = User.objects.create_user(username='testuser_cache', password='testpassword')
+        self.admin = User.objects.create_user(username='testadmin_cache', password='testpassword', role='admin')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(
+            title="Cached Exercise",
+            lesson=self.lesson,
+            sandbox="piston",
+            created_by=self.user,
+            test_cases=[{"input": "x", "expected_output": "ok"}]
+        )
+        self.factory = APIRequestFactory()
+
+    def tearDown(self):
+        result_cache.clear()
+
+    def _post(self, **extra):
+        data = {'code': 'print("ok")', 'exercise': self.exercise.id, 'sandbox': 'piston', **extra}
+        request = self.factory.post('/api/sandbox/execution-requests/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return ExecutionRequestAPIView.as_view()(request)
+
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_identical_resubmission_is_served_from_cache(self, mock_post):
+        first = self._post()
+        second = self._post()
+
+        self.assertEqual(mock_post.call_count, 2) # Standard run + one test case, only for the first submission
+        self.assertEqual(first.data['test_results'], second.data['test_results'])
+        self.assertEqual(ExecutionResult.objects.count(), 2)
+        self.assertEqual(ExecutionRequest.objects.filter(status='completed').count(), 2)
+
+        request = self.factory.get('/api/sandbox/metrics/')
+        force_authenticate(request, user=self.admin)
+        stats = SandboxMetricsAPIView.as_view()(request).data['result_cache']
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_cache_hits_are_left_out_of_resource_analytics(self, mock_post):
+        mock_post.return_value = Mock(status_code=200, json=Mock(return_value={
+            "run": {"stdout": "", "stderr": "", "code": None, "signal": "SIGKILL", "cpu_time": 100, "wall_time": 200, "memory": 4096}, "compile": {},
+        }))
+        first, second = self._post(), self._post()
+        self.assertEqual(mock_post.call_count, 2) # The second submission never ran
+        self.assertEqual((first.data['cached'], second.data['cached']), (False, True))
+        self.assertEqual(second.data['cpu_time'], first.data['cpu_time']) # Still shown to the client
+
+        request = self.factory.get('/api/analytics/sandbox/')
+        force_authenticate(request, user=self.admin)
+        stats = SandboxAnalyticsAPIView.as_view()(request).data['overall_stats']
+        self.assertEqual(stats['total_executions'], 2)
+        self.assertEqual(stats['killed_executions'], 1)
+        self.assertEqual(stats['avg_cpu_time_seconds'], round(first.data['cpu_time'], 3))
+        self.assertEqual(stats['max_peak_memory_bytes'], 4096)
+
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_bypass_flag_and_different_stdin_miss(self, mock_post):
+        self._post()
+        self._post(bypass_cache=True)
+        self._post(stdin='something else')
+        self.assertEqual(mock_post.call_count, 6)
+
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_bypass_flag_from_form_input(self, mock_post):
+        self._post()
+        for value in ('false', '0'): # Strings are parsed, not tested for truthiness
+            request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'print("ok")', 'exercise': self.exercise.id, 'bypass_cache': value})
+            force_authenticate(request, user=self.user)
+            self.assertEqual(ExecutionRequestAPIView.as_view()(request).status_code, 201)
+        self.assertEqual(mock_post.call_count, 2) # Both served from the cache
+
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_changing_test_cases_invalidates(self, mock_post):
+        self._post()
+        self.assertEqual(result_cache.stats()['entries'], 1)
+
+        self.exercise.test_cases = [{"input": "x", "expected_output": "not ok"}]
+        self.exercise.save()
+        self.assertEqual(result_cache.stats()['entries'], 0)
+
+        response = self._post()
+        self.assertEqual(mock_post.call_count, 4)
+        self.assertFalse(response.data['test_results'][0]['passed'])
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_sandbox_failures_are_not_cached(self, mock_post):
+        mock_post.side_effect = requests.exceptions.ConnectionError("sandbox down")
+        self._post()
+        self.assertEqual(result_cache.stats()['entries'], 0)
+
+    def test_lru_and_ttl_eviction(self):
+        cache = ExecutionResultCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3) # Evicts 'b', the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+        expired = ExecutionResultCache(max_entries=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        client.close_sessions()
+
+    def tearDown(self):
+        client.close_sessions()
+
+    def _call_concurrently(self, url, payloads):
+        barrier = threading.Barrier(len(payloads))
+        results = [None] * len(payloads)
+
+        def call(index, payload):
+            barrier.wait()
+            results[index] = execute_code_in_sandbox(url, payload)
+
+        threads = [threading.Thread(target=call, args=(index, payload)) for index, payload in enumerate(payloads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_identical_concurrent_calls_are_coalesced(self):
+        before = sandbox_single_flight.stats()
+        with StubSandboxServer(delay=0.3) as stub:
+            results = self._call_concurrently(f"{stub.url}/execute", [{"code": "print('starter')", "stdin": ""}] * 5)
+        after = sandbox_single_flight.stats()
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(after['coalesced'] - before['coalesced'], 4)
+        self.assertEqual(after['in_flight'], 0)
+
+    def test_distinct_inputs_are_not_coalesced(self):
+        with StubSandboxServer(delay=0.1) as stub:
+            self._call_concurrently(f"{stub.url}/execute", [{"code": "print(1)", "stdin": str(i)} for i in range(3)])
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_leader_failure_is_shared(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def failing_call():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError("sandbox exploded")
+
+        def follower():
+            started.wait()
+            try:
+                flight.do('key', lambda: 'should not run')
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=follower)
+        thread.start()
+        with self.assertRaises(RuntimeError):
+            flight.do('key', failing_call)
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(flight.stats(), {"executed": 1, "coalesced": 1, "in_flight": 0})
+
+
+
+@override_settings(SANDBOX_HEALTH_CHECK_INTERVAL=0, SANDBOX_HTTP_MAX_RETRIES=0, SANDBOX_NODE_FAILURE_THRESHOLD=2, SANDBOX_NODE_RECOVERY_THRESHOLD=2)
+class SandboxNodePoolTests(TestCase):
+
+    def setUp(self):
+        reset_node_pools()
+        reset_resilience()
+        client.close_sessions()
+
+    def tearDown(self):
+        reset_node_pools()
+        reset_resilience()
+        client.close_sessions()
+
+    def _nodes(self, *stubs):
+        return {"piston": [{"url": f"{stub.url}/api/v2/execute", "health_url": f"{stub.url}/api/v2/runtimes"} for stub in stubs]}
+
+    def test_requests_are_spread_over_nodes(self):
+        with StubSandboxServer() as first, StubSandboxServer() as second:
+            with self.settings(SANDBOX_NODES=self._nodes(first, second)):
+                for i in range(6):
+                    self.assertIsNotNone(send_to_backend('piston', {"stdin": str(i)}))
+        self.assertEqual((len(first.requests), len(second.requests)), (3, 3))
+
+    def test_failing_node_is_ejected_and_readmitted_by_probes(self):
+        with StubSandboxServer() as broken, StubSandboxServer() as healthy:
+            broken.fail_with = 500
+            with self.settings(SANDBOX_NODES=self._nodes(broken, healthy)):
+                for i in range(8):
+                    send_to_backend('piston', {"stdin": str(i)})
+                pool = get_node_pool('piston')
+                self.assertFalse(pool.nodes[0].healthy)
+                self.assertEqual(len(broken.requests), 2) # Nothing routed to it after ejection
+                self.assertEqual(len(healthy.requests), 6)
+
+                broken.fail_with = None
+                pool.probe()
+                self.assertFalse(pool.nodes[0].healthy) # Needs two good probes
+                pool.probe()
+                self.assertTrue(pool.nodes[0].healthy)
+                for i in range(4):
+                    send_to_backend('piston', {"stdin": f"again {i}"})
+        self.assertGreater(len([request for request in broken.requests if request[0] == 'POST']), 2)
+
+    @override_settings(SANDBOX_NODE_EJECTION_COOLDOWN=0.05)
+    def test_unprobed_node_is_readmitted_by_traffic_after_cooldown(self):
+        with StubSandboxServer() as broken, StubSandboxServer() as healthy:
+            broken.fail_with = 500
+            with self.settings(SANDBOX_NODES={"piston": [{"url": f"{stub.url}/api/v2/execute"} for stub in (broken, healthy)]}):
+                for i in range(4):
+                    send_to_backend('piston', {"stdin": str(i)})
+                pool = get_node_pool('piston')
+                self.assertFalse(pool.nodes[0].healthy)
+
+                broken.fail_with = None
+                time.sleep(0.06)
+                for i in range(6):
+                    send_to_backend('piston', {"stdin": f"again {i}"})
+                self.assertTrue(pool.nodes[0].healthy) # No probes ran, real calls brought it back
+
+    def test_probe_answered_with_4xx_is_unhealthy(self):
+        with StubSandboxServer() as node:
+            node.fail_with = 405 # E.g. GET on a POST-only execute URL
+            pool = SandboxNodePool('custom', [SandboxNode(f"{node.url}/execute", health_url=f"{node.url}/execute")], failure_threshold=1)
+            pool.probe()
+        self.assertFalse(pool.nodes[0].healthy)
+
+    def test_unreachable_node_fails_over(self):
+        with StubSandboxServer() as healthy:
+            with StubSandboxServer() as gone:
+                nodes = self._nodes(gone, healthy)
+            with self.settings(SANDBOX_NODES=nodes): # 'gone' is shut down, connections are refused
+                results = [send_to_backend('piston', {"stdin": str(i)}) for i in range(4)]
+        self.assertTrue(all(result is not None for result in results))
+        self.assertEqual(len(healthy.requests), 4)
+
+    def test_weighted_round_robin_honours_weights(self):
+        heavy, light = SandboxNode('http://heavy', weight=3), SandboxNode('http://light', weight=1)
+        pool = SandboxNodePool('piston', [heavy, light], strategy='weighted_round_robin')
+        picks = []
+        for _ in range(8):
+            node = pool.acquire()
+            picks.append(node.url)
+            pool.release(node, success=True)
+        self.assertEqual(picks.count('http://heavy'), 6)
+        self.assertNotEqual(picks[:4], ['http://heavy'] * 3 + ['http://light']) # Smooth, not bursty
+
+    def test_least_outstanding_prefers_idle_node(self):
+        busy, idle = SandboxNode('http://busy'), SandboxNode('http://idle')
+        pool = SandboxNodePool('piston', [busy, idle])
+        busy.outstanding = 5
+        self.assertIs(pool.acquire(), idle)
+
+
+
+class CircuitBreakerTests(TestCase):
+
+    def test_opens_on_error_rate_and_recovers_through_half_open(self):
+        breaker = CircuitBreaker('piston', window_size=4, min_calls=4, error_rate_threshold=0.5, open_seconds=0.05, half_open_calls=2)
+        for success in (True, False, True, False):
+            breaker.before_call()
+            breaker.record(success, 0.01)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(SandboxUnavailable):
+            breaker.before_call()
+
+        time.sleep(0.06)
+        breaker.before_call() # First trial call moves the circuit to half-open
+        breaker.before_call()
+        self.assertEqual(breaker.state, 'half_open')
+        with self.assertRaises(SandboxUnavailable): # Only two trial calls at a time
+            breaker.before_call()
+        breaker.record(True, 0.01)
+        breaker.record(True, 0.01)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_half_open_trial_covers_every_call_of_an_execution(self):
+        breaker = CircuitBreaker('piston', window_size=2, min_calls=2, open_seconds=0.01, half_open_calls=1)
+        for _ in range(2):
+            breaker.record(False, 0.01)
+        time.sleep(0.02)
+        with execution_scope(1):
+            for _ in range(4): # Standard run and test cases of the trial execution
+                breaker.before_call()
+        with execution_scope(2):
+            with self.assertRaises(SandboxUnavailable):
+                breaker.before_call()
+        with execution_scope(1):
+            breaker.record(True, 0.01)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_failed_trial_call_reopens(self):
+        breaker = CircuitBreaker('piston', window_size=2, min_calls=2, open_seconds=0.01)
+        for _ in range(2):
+            breaker.record(False, 0.01)
+        time.sleep(0.02)
+        breaker.before_call()
+        breaker.record(False, 0.01)
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.times_opened, 2)
+
+    def test_opens_on_slow_calls(self):
+        breaker = CircuitBreaker('piston', window_size=3, min_calls=3, slow_call_seconds=1, slow_call_rate_threshold=0.6)
+        for duration in (2, 0.1, 3):
+            breaker.record(True, duration)
+        self.assertEqual(breaker.state, 'open')
+
+
+class AdmissionControllerTests(TestCase):
+
+    def test_sheds_beyond_running_and_queued_limits(self):
+        controller = AdmissionController('piston', max_concurrent=1, max_queued=1, timeout=5)
+        release = threading.Event()
+        entered = threading.Event()
+        outcomes = []
+
+        def hold_slot():
+            with controller.admit():
+                entered.set()
+                release.wait(5)
+
+        def wait_for_slot():
+            with controller.admit():
+                outcomes.append('admitted')
+
+        holder = threading.Thread(target=hold_slot)
+        holder.start()
+        entered.wait(5)
+        waiter = threading.Thread(target=wait_for_slot)
+        waiter.start()
+        while controller.stats()['waiting'] < 1:
+            time.sleep(0.01)
+
+        with self.assertRaises(SandboxUnavailable): # One running, one waiting: the third is shed
+            with controller.admit():
+                pass
+        release.set()
+        holder.join(5)
+        waiter.join(5)
+        self.assertEqual(outcomes, ['admitted'])
+        self.assertEqual(controller.stats()['shed'], 1)
+
+    def test_waiting_times_out(self):
+        controller = AdmissionController('piston', max_concurrent=0, max_queued=5, timeout=0.05)
+        with self.assertRaises(SandboxUnavailable):
+            with controller.admit():
+                pass
+
+
+@override_settings(SANDBOX_CIRCUIT_MIN_CALLS=2, SANDBOX_CIRCUIT_WINDOW_SIZE=2, SANDBOX_CIRCUIT_OPEN_SECONDS=30, SANDBOX_RESULT_CACHE_ENABLED=False)
+class SandboxLoadSheddingAPITests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        reset_resilience()
+        self.user = User.objects.create_user(username='testuser_shed', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(title="Shed Exercise", lesson=self.lesson, sandbox="piston", created_by=self.user, test_cases=[])
+        self.factory = APIRequestFactory()
+
+    def tearDown(self):
+        reset_resilience()
+
+    def _execute(self, data):
+        data = {'exercise': self.exercise.id, **data}
+        request = self.factory.post('/api/sandbox/execution-requests/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return ExecutionRequestAPIView.as_view()(request)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_open_circuit_returns_503_without_calling_sandbox(self, mock_post):
+        mock_post.side_effect = requests.exceptions.ConnectionError("refused")
+        for i in range(2): # Trip the circuit
+            self.assertEqual(self._execute({'code': f'print({i})'}).status_code, 500)
+        calls_before = mock_post.call_count
+
+        response = self._execute({'code': 'print(2)'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(mock_post.call_count, calls_before) # Failed fast
+        execution_request = ExecutionRequest.objects.get(pk=response.data['id'])
+        self.assertEqual(execution_request.status, 'failed') # Final, the result endpoint does not report it pending
+        self.assertIn('temporarily unavailable', ExecutionResult.objects.get(request=execution_request).error)
+
+        mock_post.side_effect = None
+        mock_post.return_value = Mock(status_code=200, json=Mock(return_value={"run": {"stdout": "2\n", "stderr": "", "code": 0}, "compile": {}}))
+        reset_resilience()
+        response = self._execute({'code': 'print(2)', 'existing_request_id': execution_request.id}) # Run again once the sandbox is back
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data['request'], execution_request.id) # A new request, the failed one keeps its result
+        self.assertEqual(ExecutionResult.objects.get(request_id=response.data['request']).output, "2\n")
+        self.assertIn('temporarily unavailable', ExecutionResult.objects.get(request=execution_request).error)
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_existing_request_id_of_another_user_is_not_touched(self, mock_post):
+        mock_post.return_value = Mock(status_code=200, json=Mock(return_value={"run": {"stdout": "mine\n", "stderr": "", "code": 0}, "compile": {}}))
+        owner = User.objects.create_user(username='testuser_shed_owner', password='testpassword')
+        graded_request = ExecutionRequest.objects.create(user=owner, exercise=self.exercise, code='print("theirs")', status='completed')
+        graded_result = ExecutionResult.objects.create(request=graded_request, output="theirs\n")
+        submission = ExerciseSubmission.objects.create(user=owner, exercise=self.exercise, submitted_code='print("theirs")', execution_request=graded_request, execution_result=graded_result, status='completed')
+
+        response = self._execute({'code': 'print("mine")', 'existing_request_id': graded_request.id})
+        self.assertEqual(response.status_code, 201)
+        new_request = ExecutionRequest.objects.get(pk=response.data['request'])
+        self.assertEqual((new_request.user, new_request.code), (self.user, 'print("mine")')) # Created from the posted data
+        submission.refresh_from_db()
+        self.assertEqual(submission.execution_result, graded_result)
+        self.assertEqual(ExecutionResult.objects.get(request=graded_request).output, "theirs\n")
+
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_open_circuit_defers_queued_job(self, mock_post):
+        mock_post.side_effect = requests.exceptions.ConnectionError("refused")
+        for i in range(2):
+            self._execute({'code': f'print({i})'})
+        execution_request = ExecutionRequest.objects.create(user=self.user, code='print("queued")')
+        enqueue_execution_request(execution_request)
+
+        self.assertFalse(run_next_execution_job())
+        execution_request.refresh_from_db()
+        self.assertEqual(execution_request.status, 'pending')
+        self.assertIsNotNone(execution_request.queued_at) # Still queued for a later attempt
+
+    @override_settings(SANDBOX_CIRCUIT_OPEN_SECONDS=0.05, SANDBOX_CIRCUIT_HALF_OPEN_CALLS=1, SANDBOX_TEST_CASE_CONCURRENCY=4)
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_half_open_circuit_runs_whole_submission(self, mock_post):
+        mock_post.side_effect = requests.exceptions.ConnectionError("refused")
+        for i in range(2): # Trip the circuit
+            self._execute({'code': f'print({i})'})
+        time.sleep(0.06)
+
+        def slow_response(*args, **kwargs):
+            time.sleep(0.05) # Keeps the test case calls in flight together
+            return Mock(status_code=200, json=Mock(return_value={"run": {"stdout": "ok\n", "stderr": "", "code": 0}, "compile": {}}))
+        mock_post.side_effect = slow_response
+        self.exercise.test_cases = [{"input": str(i), "expected_output": "ok"} for i in range(3)]
+        self.exercise.save()
+
+        response = self._execute({'code': 'print("ok")'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['test_results']), 3)
+
+    @override_settings(SANDBOX_MAX_CONCURRENT_EXECUTIONS=0, SANDBOX_MAX_QUEUED_EXECUTIONS=0)
+    @patch('apps.sandbox.client.requests.Session.post')
+    def test_saturated_backend_is_shed(self, mock_post):
+        response = self._execute({'code': 'print(1)'})
+        self.assertEqual(response.status_code, 503)
+        mock_post.assert_not_called()
+
+
+
+class ExecutionEventStreamTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        result_cache.clear()
+        self.user = User.objects.create_user(username='testuser_events', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(
+            title="Streamed Exercise",
+            lesson=self.lesson,
+            sandbox="piston",
+            created_by=self.user,
+            test_cases=[{"input": "1", "expected_output": "2"}, {"input": "2", "expected_output": "5"}]
+        )
+        self.factory = APIRequestFactory()
+
+    def _collect(self, request_id, after=0):
+        async def collect():
+            return [chunk async for chunk in stream_execution_events(request_id, after)]
+        return "".join(async_to_sync(collect)())
+
+    def test_events_are_read_in_order_and_resumable(self):
+        for event_type in ('queued', 'started', 'finished'):
+            publish_event(42, event_type, {"type": event_type})
+        events = async_to_sync(aread_events)(42)
+        self.assertEqual([(seq, event["event"]) for seq, event in events], [(1, 'queued'), (2, 'started'), (3, 'finished')])
+        self.assertEqual([seq for seq, _ in async_to_sync(aread_events)(42, 2)], [3])
+
+    @patch('apps.sandbox.client.requests.Session.post', side_effect=run_like_piston)
+    def test_queued_job_publishes_progress(self, mock_post):
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'print(int(input() or 0) * 2)', 'exercise': self.exercise.id, 'mode': 'async'}, format='json')
+        force_authenticate(request, user=self.user)
+        response = ExecutionRequestAPIView.as_view()(request)
+        request_id = response.data['id']
+        self.assertEqual(response.data['events_url'], f'/api/sandbox/execution-requests/{request_id}/events/')
+
+        run_next_execution_job()
+
+        events = [event for _, event in async_to_sync(aread_events)(request_id)]
+        self.assertEqual(events[0]["event"], 'queued')
+        self.assertEqual(events[1]["event"], 'started')
+        self.assertEqual(sorted(event["event"] for event in events[2:-1]), ['standard_output', 'test_case', 'test_case'])
+        test_case_events = sorted((event["data"] for event in events if event["event"] == 'test_case'), key=lambda data: data["index"])
+        self.assertEqual([data["passed"] for data in test_case_events], [True, False])
+        self.assertEqual(events[-1], {"event": "finished", "data": {"status": "failed", "result_id": ExecutionResult.objects.get().id, "success": True}})
+
+        stream = self._collect(request_id, after=1)
+        self.assertNotIn("event: queued", stream)
+        self.assertIn("id: 2\nevent: started", stream)
+        self.assertEqual(stream.rstrip().splitlines()[-2], "event: finished")
+
+    def test_stream_of_finished_request_without_events_ends_from_database(self):
+        execution_request = ExecutionRequest.objects.create(user=self.user, code='print(1)', status='completed')
+        execution_result = ExecutionResult.objects.create(request=execution_request, output="1\n")
+
+        stream = self._collect(execution_request.id)
+
+        self.assertIn(f'event: finished\ndata: {{"status": "completed", "result_id": {execution_result.id}, "success": true}}', stream)
+
+    def test_stream_view_requires_owner_token(self):
+        execution_request = ExecutionRequest.objects.create(user=self.user, code='print(1)', status='completed')
+        other_user = User.objects.create_user(username='testuser_events_other', password='testpassword')
+        url = f'/api/sandbox/execution-requests/{execution_request.id}/events/'
+        client = AsyncClient()
+
+        self.assertEqual(async_to_sync(client.get)(url).status_code, 401)
+        self.assertEqual(async_to_sync(client.get)(url, headers={'Authorization': f'Bearer {AccessToken.for_user(other_user)}'}).status_code, 403)
+        response = async_to_sync(client.get)(url, headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(async_to_sync(client.get)(url, {'token': str(AccessToken.for_user(self.user))}).status_code, 401) # Never read from the URL
+
+    def test_stream_ticket_opens_only_its_own_stream(self):
+        execution_request = ExecutionRequest.objects.create(user=self.user, code='print(1)', status='completed')
+        other_request = ExecutionRequest.objects.create(user=self.user, code='print(2)', status='completed')
+        other_user = User.objects.create_user(username='testuser_ticket_other', password='testpassword')
+        factory = APIRequestFactory()
+
+        def issue(user):
+            request = factory.post(f'/api/sandbox/execution-requests/{execution_request.id}/events/ticket/')
+            force_authenticate(request, user=user)
+            return ExecutionEventsTicketAPIView.as_view()(request, request_id=execution_request.id)
+
+        self.assertEqual(issue(other_user).status_code, 403)
+        response = issue(self.user)
+        self.assertEqual(response.status_code, 201)
+        client = AsyncClient()
+        self.assertEqual(async_to_sync(client.get)(response.data['events_url']).status_code, 200)
+        other_url = f"/api/sandbox/execution-requests/{other_request.id}/events/"
+        self.assertEqual(async_to_sync(client.get)(other_url, {'ticket': response.data['ticket']}).status_code, 401)
+        cache.clear() # Expired
+        self.assertEqual(async_to_sync(client.get)(response.data['events_url']).status_code, 401)
+
+
+@override_settings(SANDBOX_HTTP_MAX_RETRIES=0, SANDBOX_HEALTH_CHECK_INTERVAL=0, SANDBOX_RESULT_CACHE_ENABLED=False)
+class AsyncExecutionViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        reset_node_pools()
+        reset_resilience()
+        self.user = User.objects.create_user(username='testuser_async', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.exercise = Exercise.objects.create(
+            title="Async Exercise",
+            lesson=self.lesson,
+            sandbox="piston",
+            created_by=self.user,
+            test_cases=[{"input": "1", "expected_output": "ok"}, {"input": "2", "expected_output": "ok"}]
+        )
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def tearDown(self):
+        reset_node_pools()
+        reset_resilience()
+
+    def _post(self, client, data):
+        return client.post('/api/sandbox/async/execution-requests/', {'exercise': self.exercise.id, **data}, content_type='application/json', headers=self.auth)
+
+    def test_execution_runs_on_async_client(self):
+        with StubSandboxServer() as stub:
+            with self.settings(SANDBOX_NODES={"piston": [{"url": f"{stub.url}/api/v2/execute"}]}):
+                response = async_to_sync(self._post)(AsyncClient(), {'code': 'print("ok")'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['passed'] for result in response.json()['test_results']], [True, True])
+        self.assertEqual(len(stub.requests), 3) # Standard run and two test cases
+        execution_request = ExecutionRequest.objects.get()
+        self.assertEqual(execution_request.status, 'completed')
+        events = [event["event"] for _, event in async_to_sync(aread_events)(execution_request.id)]
+        self.assertEqual((events[0], events[-1]), ('started', 'finished'))
+
+        result_response = async_to_sync(AsyncClient().get)(f'/api/sandbox/async/execution-results/{execution_request.id}/', headers=self.auth)
+        self.assertEqual(result_response.json()['id'], ExecutionResult.objects.get().id)
+
+    def test_existing_request_id_runs_again_as_a_new_request_of_the_caller(self):
+        other = User.objects.create_user(username='testuser_async_other', password='testpassword')
+        theirs = ExecutionRequest.objects.create(user=other, exercise=self.exercise, code='print("theirs")', status='completed')
+        ExecutionResult.objects.create(request=theirs, output="theirs\n")
+        mine = ExecutionRequest.objects.create(user=self.user, exercise=self.exercise, code='print("ok")', status='completed')
+        ExecutionResult.objects.create(request=mine, output="ok\n")
+
+        with StubSandboxServer() as stub:
+            with self.settings(SANDBOX_NODES={"piston": [{"url": f"{stub.url}/api/v2/execute"}]}, SANDBOX_RESULT_CACHE_ENABLED=False):
+                for existing in (theirs, mine):
+                    response = async_to_sync(self._post)(AsyncClient(), {'code': 'print("ok")', 'existing_request_id': existing.id})
+                    self.assertEqual(response.status_code, 201)
+                    rerun = ExecutionRequest.objects.get(pk=response.json()['request'])
+                    self.assertNotIn(rerun.id, (theirs.id, mine.id))
+                    self.assertEqual(rerun.user, self.user)
+
+        self.assertEqual(ExecutionResult.objects.get(request=theirs).output, "theirs\n") # Results of earlier runs are kept
+        self.assertEqual(ExecutionResult.objects.get(request=mine).output, "ok\n")
+
+    def test_bypass_cache_strings_are_parsed(self):
+        with patch('apps.sandbox.async_views.aprocess_execution_request', side_effect=SandboxUnavailable("busy", 'piston')) as mock_process:
+            for value in ('false', '0', 'true'):
+                async_to_sync(self._post)(AsyncClient(), {'code': 'print(1)', 'bypass_cache': value})
+        self.assertEqual([call.kwargs['use_cache'] for call in mock_process.call_args_list], [True, True, False])
+
+    @override_settings(EXECUTION_CONCURRENCY_LIMITS={"user": 1, "role": {}, "global": None}, EXECUTION_RATE_LIMITS={})
+    def test_throttled_request_saves_nothing(self):
+        with execution_slot(self.user): # Another execution of this user is running
+            response = async_to_sync(self._post)(AsyncClient(), {'code': 'print(1)'})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(ExecutionRequest.objects.exists()) # No request left pending forever
+
+    @override_settings(EXECUTION_LIMITS_ENABLED=False, SANDBOX_TEST_CASE_CONCURRENCY=1)
+    def test_concurrent_requests_wait_on_one_event_loop(self):
+        async def post_many():
+            client = AsyncClient()
+            return await asyncio.gather(*(self._post(client, {'code': f'print("ok")  # {i}'}) for i in range(4)))
+
+        with StubSandboxServer(delay=0.3) as stub:
+            with self.settings(SANDBOX_NODES={"piston": [{"url": f"{stub.url}/api/v2/execute"}]}):
+                started = time.monotonic()
+                responses = async_to_sync(post_many)()
+                elapsed = time.monotonic() - started
+
+        self.assertEqual([response.status_code for response in responses], [201] * 4)
+        self.assertEqual(len(stub.requests), 12)
+        self.assertLess(elapsed, 2 * 3 * 0.3) # One after another would take 4 * 3 * 0.3s
+
+    def test_requires_token_and_reports_unavailable_sandbox(self):
+        response = async_to_sync(AsyncClient().post)('/api/sandbox/async/execution-requests/', {'code': 'print(1)'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+        with self.settings(SANDBOX_MAX_CONCURRENT_EXECUTIONS=0, SANDBOX_MAX_QUEUED_EXECUTIONS=0):
+            response = async_to_sync(self._post)(AsyncClient(), {'code': 'print(1)'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(ExecutionRequest.objects.get().status, 'failed')
+        self.assertTrue(ExecutionResult.objects.exists())
+
+
+@override_settings(LOCAL_SANDBOX_PYTHON=sys.executable, LOCAL_SANDBOX_TIMEOUT=5, SANDBOX_RESULT_CACHE_ENABLED=False)
+class LocalSandboxTests(TestCase):
+
+    def setUp(self):
+        cache.clear() # Execution rate and concurrency limits are kept in the cache
+        reset_local_sandbox()
+        self.user = User.objects.create_user(username='testuser_local', password='testpassword')
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="Test lesson description", content="Test lesson content", order=1, created_by=self.user)
+        self.factory = APIRequestFactory()
+
+    def tearDown(self):
+        reset_local_sandbox()
+
+    def _run(self, code, **payload):
+        return get_local_sandbox().execute({"files": [{"name": "main.py", "content": code}], "stdin": "", "args": [], **payload})["run"]
+
+    def test_runs_isolated_with_stdin_and_args(self):
+        run = self._run("import os, sys\nprint(input() * 2, sys.argv[1:], sorted(os.listdir('.')) == sorted(['main.py', '.stdin', '.stdout', '.stderr']))", stdin="ab", args=["x"])
+        self.assertEqual((run["stdout"], run["stderr"], run["code"]), ("abab ['x'] True\n", "", 0))
+
+        run = self._run("import django")
+        self.assertIn("ModuleNotFoundError", run["stderr"]) # No site-packages
+
+    def test_wall_clock_timeout_kills_the_run(self):
+        started = time.monotonic()
+        run = self._run("import time\nprint('started', flush=True)\ntime.sleep(30)", run_timeout=300)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual((run["stdout"], run["signal"], run["code"]), ("started\n", "SIGKILL", None))
+        self.assertIn("timed out after 0.3 seconds", run["stderr"])
+        self.assertEqual(get_local_sandbox().stats()["timeouts"], 1)
+
+    @override_settings(LOCAL_SANDBOX_MEMORY_MB=128, LOCAL_SANDBOX_FILE_SIZE_KB=64)
+    def test_memory_and_output_limits(self):
+        self.assertIn("MemoryError", self._run("data = bytearray(512 * 1024 * 1024)")["stderr"])
+        run = self._run("while True:\n    print('x' * 1000)")
+        self.assertLessEqual(len(run["stdout"]), 64 * 1024)
+        self.assertIn("File too large", run["stderr"])
+
+    def test_exercise_on_local_sandbox(self):
+        exercise = Exercise.objects.create(
+            title="Local Exercise",
+            lesson=self.lesson,
+            sandbox="local",
+            created_by=self.user,
+            test_cases=[{"input": "2", "expected_output": "4"}, {"input": "3", "expected_output": "9"}, {"input": "4", "expected_output": "16"}]
+        )
+        request = self.factory.post('/api/sandbox/execution-requests/', {'code': 'print(int(input() or 0) * 2)', 'exercise': exercise.id}, format='json')
+        force_authenticate(request, user=self.user)
+        response = ExecutionRequestAPIView.as_view()(request)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['passed'] for result in response.data['test_results']], [True, False, False])
+        self.assertEqual(ExecutionRequest.objects.get().status, 'failed')
+        self.assertEqual(get_local_sandbox().stats()["runs"], 4)
+
+    @override_settings(LOCAL_SANDBOX_POOL_SIZE=1, LOCAL_SANDBOX_MAX_JOBS_PER_WORKER=2)
+    def test_warm_pool_isolates_jobs_and_recycles_workers(self):
+        outputs = [self._run("import math\nprint(hasattr(math, 'leak'))\nmath.leak = True")["stdout"] for _ in range(5)]
+        self.assertEqual(outputs, ["False\n"] * 5) # Every job runs in a fresh fork of the worker
+
+        stats = get_local_sandbox().stats()
+        self.assertEqual((stats["runs"], stats["cold_starts"]), (5, 0))
+        self.assertGreaterEqual(stats["pool"]["spawned"], 3) # Replaced after every second job
+        self.assertGreaterEqual(stats["pool"]["retired"], 2)
+        self.assertIsNotNone(stats["pool"]["spawn_latency_ms"]["p99"])
+
+    @override_settings(LOCAL_SANDBOX_POOL_SIZE=0)
+    def test_cold_start_without_pool(self):
+        run = self._run("import sys\nprint(input(), sys.argv[1:])", stdin="cold", args=["y"])
+        self.assertEqual((run["stdout"], run["code"]), ("cold ['y']\n", 0))
+        stats = get_local_sandbox().stats()
+        self.assertEqual((stats["cold_starts"], stats["pool"]), (1, None))
+
+    @override_settings(LOCAL_SANDBOX_POOL_SIZE=0, LOCAL_SANDBOX_MAX_OPEN_FILES=32)
+    def test_cold_start_limits_are_set_without_preexec_fn(self):
+        with patch('apps.sandbox.local.subprocess.Popen', wraps=subprocess.Popen) as popen:
+            run = self._run("import resource, sys\nprint(resource.getrlimit(resource.RLIMIT_NOFILE), sys.argv[0])")
+        self.assertEqual(run["stdout"], "(32, 32) main.py\n") # Set by the wrapper, then the interpreter was exec'd
+        self.assertNotIn('preexec_fn', popen.call_args.kwargs)
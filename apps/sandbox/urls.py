@@ -1,7 +1,14 @@
 from django.urls import path
-from .api_views import ExecutionRequestAPIView, ExecutionResultAPIView
+from .api_views import ExecutionRequestAPIView, ExecutionResultAPIView, ExecutionEventsTicketAPIView, SandboxMetricsAPIView
+from .async_views import ExecutionRequestAsyncView, ExecutionResultAsyncView
+from .streams import execution_event_stream
 
 urlpatterns = [
     path('execution-requests/', ExecutionRequestAPIView.as_view(), name='create-execution-request'), # POST to create a new execution request
     path('execution-results/<int:request_id>/', ExecutionResultAPIView.as_view(), name='get-execution-result'), # GET to retrieve execution result by request ID
+    path('execution-requests/<int:request_id>/events/', execution_event_stream, name='execution-events'), # GET Server-Sent Events stream of execution progress (serve with ASGI)
+    path('execution-requests/<int:request_id>/events/ticket/', ExecutionEventsTicketAPIView.as_view(), name='execution-events-ticket'), # POST for a short-lived ticket opening the events stream without an Authorization header
+    path('async/execution-requests/', ExecutionRequestAsyncView.as_view(), name='async-create-execution-request'), # Native async version of create-execution-request (serve with ASGI)
+    path('async/execution-results/<int:request_id>/', ExecutionResultAsyncView.as_view(), name='async-get-execution-result'), # Native async version of get-execution-result (serve with ASGI)
+    path('metrics/', SandboxMetricsAPIView.as_view(), name='sandbox-metrics'), # GET in-process sandbox metrics (admin only)
 ]
\ No newline at end of file
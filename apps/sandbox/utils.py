@@ -1,28 +1,105 @@
 import requests
+import contextvars
+import copy
+import hashlib
 import json
 import logging
-from .models import ExecutionResult  # Import ExecutionResult model
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.utils import timezone
+from .models import ExecutionRequest, ExecutionResult  # Import ExecutionResult model
+from . import client
+from .harness import build_harness, parse_harness_output
+from .output import truncate_output, bound_streams, log_preview
+from .cache import result_cache, make_cache_key
+from .nodes import get_node_pool
+from .local import LOCAL_BACKEND, get_local_sandbox
+from .resilience import SandboxUnavailable, get_circuit_breaker, get_admission_controller, execution_scope
+from .signals import execution_finished
+from .events import publish_event, standard_output_event_data, test_case_event_data
 
 logger = logging.getLogger("sandbox") # Get logger for sandbox app
-def create_execution_result(request, compile_output, compile_error, run_output, run_error, test_results=None):
+
+PISTON_LANGUAGE = "python"
+PISTON_VERSION = "3.10.0"
+TEST_CASE_SANDBOX_ERROR = "Failed to execute test case in sandbox."
+NODE_FAILURE_ERRORS = ('connection', 'timeout', 'server') # Errors that count against a sandbox node's health
+BATCH_HARNESS_STARTUP_MS = 1000 # Added to the run_timeout of a harness job for the harness itself
+
+
+class SingleFlight:
     """
-    ...
-    Returns:
-        ExecutionResult: The created and saved ExecutionResult instance. # ADDED in description
+    Coalesces concurrent identical sandbox calls into one.
+
+    The first caller for a key (the leader) performs the call; callers arriving with the same key
+    while it is in flight wait for the leader and share its result instead of sending their own
+    request. Nothing is kept once the call finishes, completed results are the job of cache.py.
     """
-    output = run_output # Format run output
-    error = compile_error or run_error  # Determine error message (compile or run error)
-    execution_result = ExecutionResult.objects.create( # Capture the created object
-        request=request,
-        output=output,
-        error=error,
-        test_results=test_results
-    )
-    return execution_result # Return the created object # ADDED line
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {} # key -> [event, result, error]
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Runs fn() once for all concurrent callers with the same key.
+
+        Returns:
+            The result of fn(); followers receive a deep copy of the leader's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = [threading.Event(), None, None]
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return copy.deepcopy(call[1])
+
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+    def stats(self):
+        """Returns the executed/coalesced counters."""
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+sandbox_single_flight = SingleFlight()
+
+
+def get_single_flight_key(target, payload):
+    """Returns the coalescing key of a sandbox call: a hash of the endpoint (URL or backend) and the full payload."""
+    material = json.dumps([target, payload], sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
 
 def execute_code_in_sandbox(api_url, payload):
     """
-    Generic utility function to execute code in a sandbox via an API call.
+    Executes code on a specific sandbox URL, sharing the call with any identical call already in flight.
 
     Args:
         api_url (str): The URL of the sandbox API endpoint.
@@ -31,36 +108,127 @@ def execute_code_in_sandbox(api_url, payload):
     Returns:
         dict: The JSON response from the API on success, None on failure.
     """
-    headers = {'Content-Type': 'application/json'}
-    try:
-        logger.debug(f"Sending request to sandbox API: {api_url}. Payload: {payload}")
-        response = requests.post(api_url, json=payload, headers=headers) # Send payload as JSON
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        return response.json() # Parse JSON response
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error communicating with sandbox API at {api_url}: {e}. Response content: {e.response.content if e.response else 'No response content'}")
-        return None # Indicate failure
+    if not getattr(settings, 'SANDBOX_SINGLE_FLIGHT_ENABLED', True):
+        return send_sandbox_request(api_url, payload)[0]
+    key = get_single_flight_key(api_url, payload)
+    return sandbox_single_flight.do(key, lambda: send_sandbox_request(api_url, payload)[0])
 
 
-def execute_piston(execution_request, test_input=None):
+def execute_on_backend(backend, payload):
     """
-    Executes code using the Piston API.
+    Executes code on one node of a sandbox backend, sharing the call with any identical call already in flight.
+
+    When a whole class runs the same starter code at the same moment, only one request per distinct
+    (backend, payload) is sent to the sandbox; the others wait for it and reuse its response.
 
     Args:
-        execution_request (ExecutionRequest): The execution request object.
-        test_input (str, optional): Input to provide to the code as stdin. Defaults to None.
+        backend (str): Backend type from settings.SANDBOX_NODES, e.g. 'piston' or 'custom'.
+        payload (dict): The JSON payload to send to the API.
 
     Returns:
-        tuple: (compile_output, compile_error, run_output, run_error) or (None, None, None, None) on failure.
+        dict: The JSON response from the API on success, None on failure.
     """
-    piston_api_url = "http://localhost:2000/api/v2/execute"  # Piston API endpoint
-    stdin = test_input or execution_request.stdin or '' # Use empty string if stdin is None
+    if not getattr(settings, 'SANDBOX_SINGLE_FLIGHT_ENABLED', True):
+        return send_to_backend(backend, payload)
+    key = get_single_flight_key(backend, payload)
+    return sandbox_single_flight.do(key, lambda: send_to_backend(backend, payload))
+
+
+def send_to_backend(backend, payload):
+    """
+    Sends one request to a node of the backend picked by its node pool (see nodes.py).
+    The 'local' backend runs the payload in a subprocess on this server instead (see local.py).
+
+    Connection errors, timeouts and 5xx responses count against the node's health. If the node could
+    not be reached at all, the request is sent once more to a different node. The outcome and latency
+    of the call are recorded by the backend's circuit breaker (see resilience.py).
+
+    Args:
+        backend (str): Backend type, e.g. 'piston' or 'custom'.
+        payload (dict): The JSON payload to send to the API.
+
+    Returns:
+        dict: The JSON response from the API on success, None on failure.
+
+    Raises:
+        SandboxUnavailable: If the backend's circuit is open.
+    """
+    if backend == LOCAL_BACKEND:
+        return get_local_sandbox().execute(payload) # No network hop, so no node pool or circuit breaker
+    if not getattr(settings, 'SANDBOX_CIRCUIT_BREAKER_ENABLED', True):
+        return send_to_node(backend, payload)[0]
+
+    breaker = get_circuit_breaker(backend)
+    breaker.before_call() # Fails fast while the backend is known to be down
+    started = time.monotonic()
+    data, error = send_to_node(backend, payload)
+    breaker.record(error not in NODE_FAILURE_ERRORS, time.monotonic() - started)
+    return data
+
+
+def send_to_node(backend, payload):
+    """Sends one request through the backend's node pool, failing over once on connection errors. Returns (data, error)."""
+    pool = get_node_pool(backend)
+    node = pool.acquire()
+    data, error = send_sandbox_request(node.url, payload)
+    pool.release(node, success=error not in NODE_FAILURE_ERRORS)
+
+    if error == 'connection' and len(pool.nodes) > 1: # The request never reached the node, safe to fail over
+        failover_node = pool.acquire(exclude=node)
+        logger.warning(f"Sandbox node {node.url} unreachable, failing over to {failover_node.url}")
+        data, error = send_sandbox_request(failover_node.url, payload)
+        pool.release(failover_node, success=error not in NODE_FAILURE_ERRORS)
+    return data, error
+
+
+def send_sandbox_request(api_url, payload):
+    """
+    Generic utility function to send one execution request to a sandbox API.
+
+    The call goes through the pooled, keep-alive client in client.py, which applies the
+    configured timeouts and retries.
+
+    Args:
+        api_url (str): The URL of the sandbox API endpoint.
+        payload (dict): The JSON payload to send to the API.
+
+    Returns:
+        tuple: (data, error) where data is the JSON response (None on failure) and error is None or
+               one of 'connection', 'timeout', 'server', 'client', 'invalid_response'.
+    """
+    try:
+        logger.debug(f"Sending request to sandbox API: {api_url}. Payload: {payload}")
+        response = client.post_json(api_url, payload) # Send payload as JSON
+        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+        return response.json(), None # Parse JSON response
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error communicating with sandbox API at {api_url}: {e}. Response content: {e.response.content if e.response is not None else 'No response content'}")
+        if isinstance(e, requests.exceptions.ConnectionError): # Includes ConnectTimeout
+            return None, 'connection'
+        if isinstance(e, requests.exceptions.Timeout):
+            return None, 'timeout'
+        if e.response is not None and e.response.status_code < 500:
+            return None, 'client'
+        return None, 'server'
+    except ValueError as e: # Response body was not valid JSON
+        logger.error(f"Invalid JSON response from sandbox API at {api_url}: {e}")
+        return None, 'invalid_response'
+
+
+def get_args_list(execution_request):
+    """Splits the comma-separated args of an ExecutionRequest into a list."""
     args_str = execution_request.args or '' # Use empty string if args is None
-    args_list = [arg.strip() for arg in args_str.split(',') if arg.strip()]  # Split comma-separated args to list
+    return [arg.strip() for arg in args_str.split(',') if arg.strip()]  # Split comma-separated args to list
+
+
+def build_piston_payload(execution_request, test_input=None):
+    """Builds the Piston API payload for one run of an ExecutionRequest, with test_input as stdin if given."""
+    stdin = test_input or execution_request.stdin or '' # Use empty string if stdin is None
+    args_list = get_args_list(execution_request)
 
     piston_payload = {
-        "language": "python",
-        "version": "3.10.0",
+        "language": PISTON_LANGUAGE,
+        "version": PISTON_VERSION,
         "files": [
             {
                 "name": "main.py",
@@ -77,41 +245,713 @@ def execute_piston(execution_request, test_input=None):
 
     if test_input is not None:
         piston_payload["stdin"] = test_input # Override stdin if test_input is provided
+    return piston_payload
+
+
+def get_run_metrics(run, elapsed=None):
+    """
+    Extracts the timing and resource usage of one run, as stored in test_results and aggregated on ExecutionResult.
+
+    Args:
+        run (dict): A Piston "run" stage (Piston reports cpu_time/wall_time in milliseconds and memory in
+                    bytes), a local sandbox run or a harness result, which use the same fields.
+        elapsed (float, optional): Seconds the sandbox call took, used as wall time if the sandbox reports none.
+
+    Returns:
+        dict: {"wall_time": ms, "cpu_time": ms, "memory": bytes, "exit_code": int, "signal": str,
+               "stdout_bytes": int, "stderr_bytes": int}, None where unknown. The byte counts are the
+               output sizes before capping, filled in by output.bound_streams.
+    """
+    wall_time = run.get("wall_time")
+    if wall_time is None and elapsed is not None:
+        wall_time = round(elapsed * 1000)
+    return {
+        "wall_time": wall_time,
+        "cpu_time": run.get("cpu_time"),
+        "memory": run.get("memory"),
+        "exit_code": run.get("code"),
+        "signal": run.get("signal"),
+        "stdout_bytes": run.get("stdout_bytes"), # Reported by the harness, which caps output itself
+        "stderr_bytes": run.get("stderr_bytes"),
+    }
+
 
-    piston_data = execute_code_in_sandbox(piston_api_url, piston_payload)
+def aggregate_metrics(standard_metrics, test_case_results):
+    """
+    Aggregates the metrics of all runs of an execution into ExecutionResult fields.
+
+    Wall and CPU time are summed over the standard run and every test case run and converted to
+    seconds; memory is the peak of all runs. Exit code, signal and output sizes are those of the
+    standard run.
+
+    Returns:
+        dict: execution_time, cpu_time, peak_memory, exit_code, signal, output_bytes and error_bytes,
+              None where no run reported them.
+    """
+    runs = [standard_metrics] if standard_metrics else []
+    runs += [result["metrics"] for result in test_case_results if result.get("metrics")]
+
+    def total(field):
+        values = [run[field] for run in runs if run.get(field) is not None]
+        return sum(values) / 1000 if values else None # Milliseconds to seconds
+
+    memory = [run["memory"] for run in runs if run.get("memory") is not None]
+    return {
+        "execution_time": total("wall_time"),
+        "cpu_time": total("cpu_time"),
+        "peak_memory": max(memory) if memory else None,
+        "exit_code": standard_metrics.get("exit_code") if standard_metrics else None,
+        "signal": standard_metrics.get("signal") if standard_metrics else None,
+        "output_bytes": standard_metrics.get("stdout_bytes") if standard_metrics else None,
+        "error_bytes": standard_metrics.get("stderr_bytes") if standard_metrics else None,
+    }
+
+
+def parse_piston_response(piston_data, elapsed=None):
+    """
+    Turns a Piston API response into (compile_output, compile_error, run_output, run_error, metrics),
+    all None on failure. metrics is the get_run_metrics() dict of the run stage. Every stream is
+    capped at SANDBOX_OUTPUT_MAX_BYTES.
+    """
     if piston_data: # Check if we got a valid response
-        compile_output = piston_data.get("compile", {}).get("output", "")  # Get compile output, default to empty string
-        compile_error = piston_data.get("compile", {}).get("stderr", "")  # Get compile error, default to empty string
-        run_output = piston_data.get("run", {}).get("stdout", "")  # Get run output
-        run_error = piston_data.get("run", {}).get("stderr", "")  # Get run error
-        return compile_output, compile_error, run_output, run_error
-    return None, None, None, None # Indicate failure
+        max_bytes = getattr(settings, 'SANDBOX_OUTPUT_MAX_BYTES', 64 * 1024)
+        compile_output = truncate_output(piston_data.get("compile", {}).get("output", ""), max_bytes)[0]  # Get compile output, default to empty string
+        compile_error = truncate_output(piston_data.get("compile", {}).get("stderr", ""), max_bytes)[0]  # Get compile error, default to empty string
+        metrics = get_run_metrics(piston_data.get("run", {}), elapsed)
+        run_output, run_error = bound_streams(
+            piston_data.get("run", {}).get("stdout", ""),  # Get run output
+            piston_data.get("run", {}).get("stderr", ""),  # Get run error
+            metrics,
+            max_bytes,
+        )
+        return compile_output, compile_error, run_output, run_error, metrics
+    return None, None, None, None, None # Indicate failure
 
 
-def execute_custom_sandbox(execution_request, test_input=None):
+def execute_piston(execution_request, test_input=None):
     """
-    Executes code using the Custom Sandbox API.
+    Executes code using the Piston API.
 
     Args:
         execution_request (ExecutionRequest): The execution request object.
         test_input (str, optional): Input to provide to the code as stdin. Defaults to None.
 
     Returns:
-        tuple: (compile_output, compile_error, run_output, run_error) or (None, None, None, None) on failure.
-                For custom sandbox, compile_output and compile_error will be empty strings.
+        tuple: (compile_output, compile_error, run_output, run_error, metrics) or all None on failure.
     """
-    custom_sandbox_api_url = "http://localhost:2001/execute"
+    started = time.monotonic()
+    piston_data = execute_on_backend('piston', build_piston_payload(execution_request, test_input)) # Routed to a healthy Piston node
+    return parse_piston_response(piston_data, time.monotonic() - started)
+
+
+def build_custom_sandbox_payload(execution_request, test_input=None):
+    """Builds the Custom Sandbox API payload for one run of an ExecutionRequest."""
     custom_sandbox_payload = {
         "code": execution_request.code,
         #"stdin": "" # Assume custom sandbox API also takes "stdin" - adjust if needed
     }
     if test_input is not None:
         custom_sandbox_payload["stdin"] = test_input # Set stdin to test_input for test case execution
+    return custom_sandbox_payload
 
 
-    custom_sandbox_data = execute_code_in_sandbox(custom_sandbox_api_url, custom_sandbox_payload)
+def parse_custom_sandbox_response(custom_sandbox_data, elapsed=None):
+    """
+    Turns a Custom Sandbox API response into (compile_output, compile_error, run_output, run_error, metrics),
+    all None on failure. The custom sandbox reports no resource usage, so metrics mostly hold the measured wall time.
+    """
     if custom_sandbox_data: # Check for valid response
-        run_output = custom_sandbox_data.get("output", "") # Get run output
-        run_error = custom_sandbox_data.get("errors", "") # Get run error
-        return "", "", run_output, run_error # Compile output/error is not relevant for custom sandbox
-    return None, None, None, None # Indicate failure
\ No newline at end of file
+        metrics = get_run_metrics(custom_sandbox_data, elapsed)
+        run_output, run_error = bound_streams(
+            custom_sandbox_data.get("output", ""), # Get run output
+            custom_sandbox_data.get("errors", ""), # Get run error
+            metrics,
+        )
+        return "", "", run_output, run_error, metrics # Compile output/error is not relevant for custom sandbox
+    return None, None, None, None, None # Indicate failure
+
+
+def execute_custom_sandbox(execution_request, test_input=None):
+    """
+    Executes code using the Custom Sandbox API.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        test_input (str, optional): Input to provide to the code as stdin. Defaults to None.
+
+    Returns:
+        tuple: (compile_output, compile_error, run_output, run_error, metrics) or all None on failure.
+                For custom sandbox, compile_output and compile_error will be empty strings.
+    """
+    started = time.monotonic()
+    custom_sandbox_data = execute_on_backend('custom', build_custom_sandbox_payload(execution_request, test_input)) # Routed to a healthy custom sandbox node
+    return parse_custom_sandbox_response(custom_sandbox_data, time.monotonic() - started)
+
+
+def build_sandbox_call(sandbox_type, execution_request, test_input=None):
+    """
+    Returns (backend, payload, parse) for one run on the sandbox backend selected for the request,
+    where parse(response, elapsed) turns the backend's JSON response into the standard five-tuple.
+    The 'local' backend takes Piston payloads.
+    """
+    if sandbox_type == LOCAL_BACKEND:
+        return LOCAL_BACKEND, build_piston_payload(execution_request, test_input), parse_piston_response
+    if sandbox_type == 'custom':
+        return 'custom', build_custom_sandbox_payload(execution_request, test_input), parse_custom_sandbox_response
+    return 'piston', build_piston_payload(execution_request, test_input), parse_piston_response
+
+
+def get_batch_run_timeout(input_count):
+    """
+    Returns the run_timeout in milliseconds of a harness job with input_count runs: PISTON_BATCH_RUN_TIMEOUT
+    if set, else PISTON_BATCH_TEST_TIMEOUT per run plus the harness startup, capped at PISTON_BATCH_RUN_TIMEOUT_MAX.
+    A budget sized for a single run would kill larger jobs and send every test again one call at a time.
+    """
+    configured = getattr(settings, 'PISTON_BATCH_RUN_TIMEOUT', 0)
+    if configured:
+        return configured
+    per_run = getattr(settings, 'PISTON_BATCH_TEST_TIMEOUT', 3.0) * 1000
+    return int(min(per_run * input_count + BATCH_HARNESS_STARTUP_MS, getattr(settings, 'PISTON_BATCH_RUN_TIMEOUT_MAX', 30000)))
+
+
+def build_piston_batch_payload(execution_request, inputs, stop_on_error_from=None):
+    """Builds the Piston payload running every input through the multi-test harness. Returns (payload, nonce)."""
+    files, nonce = build_harness(
+        execution_request.code,
+        inputs,
+        get_args_list(execution_request),
+        getattr(settings, 'PISTON_BATCH_TEST_TIMEOUT', 3.0),
+        stop_on_error_from=stop_on_error_from,
+        max_output_bytes=getattr(settings, 'SANDBOX_OUTPUT_MAX_BYTES', 64 * 1024),
+    )
+    piston_payload = {
+        "language": PISTON_LANGUAGE,
+        "version": PISTON_VERSION,
+        "files": files,
+        "stdin": "",
+        "args": [],
+        "compile_timeout": 10000,
+        "run_timeout": get_batch_run_timeout(len(inputs)),
+        "compile_memory_limit": -1,
+        "run_memory_limit": -1
+    }
+    return piston_payload, nonce
+
+
+def parse_piston_batch_response(execution_request, piston_data, nonce, input_count, allow_partial=False):
+    """Turns the Piston response of a harness job into the return value of execute_piston_batch."""
+    if not piston_data:
+        return None
+
+    runs = parse_harness_output(piston_data.get("run", {}).get("stdout", ""), nonce, input_count, allow_partial=allow_partial)
+    if runs is None:
+        logger.warning(f"execute_piston_batch: Could not parse harness output for request ID '{execution_request.id}'. Harness stderr: {log_preview(piston_data.get('run', {}).get('stderr', ''))}")
+        return None
+
+    compile_output = piston_data.get("compile", {}).get("output", "")
+    compile_error = piston_data.get("compile", {}).get("stderr", "")
+    batch_runs = []
+    for run in runs:
+        metrics = get_run_metrics(run)
+        batch_runs.append((*bound_streams(run.get("stdout", ""), run.get("stderr", ""), metrics), metrics))
+    return compile_output, compile_error, batch_runs
+
+
+def execute_piston_batch(execution_request, inputs, stop_on_error_from=None):
+    """
+    Executes the code once per input inside a single Piston job using the multi-test harness.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        inputs (list): stdin strings, one per run.
+        stop_on_error_from (int, optional): Fail-fast mode; the harness skips the remaining inputs
+            after the first run at or after this index that errors.
+
+    Returns:
+        tuple: (compile_output, compile_error, runs) where runs is a list of (run_output, run_error, metrics)
+               in input order (shorter than inputs if the harness stopped early), or None if Piston
+               could not be reached or the harness output could not be parsed (the caller then
+               falls back to one call per run).
+    """
+    piston_payload, nonce = build_piston_batch_payload(execution_request, inputs, stop_on_error_from)
+    piston_data = execute_on_backend('piston', piston_payload)
+    return parse_piston_batch_response(execution_request, piston_data, nonce, len(inputs), allow_partial=stop_on_error_from is not None)
+
+
+def execute_in_sandbox(sandbox_type, execution_request, test_input=None):
+    """
+    Dispatches a single execution to the sandbox backend selected for the request.
+
+    Args:
+        sandbox_type (str): 'piston', 'custom' or 'local'.
+        execution_request (ExecutionRequest): The execution request object.
+        test_input (str, optional): Input to provide to the code as stdin. Defaults to None.
+
+    Returns:
+        tuple: (compile_output, compile_error, run_output, run_error, metrics) or all None on failure.
+    """
+    if sandbox_type == LOCAL_BACKEND:
+        backend, payload, parse = build_sandbox_call(sandbox_type, execution_request, test_input)
+        started = time.monotonic()
+        return parse(execute_on_backend(backend, payload), time.monotonic() - started)
+    if sandbox_type == 'custom':
+        return execute_custom_sandbox(execution_request, test_input=test_input)
+    return execute_piston(execution_request, test_input=test_input)
+
+
+def grade_test_case(test_case, run_output, run_error, metrics=None):
+    """
+    Compares the output of one run with the expected output of a test case. The outputs stored in
+    the result are capped at SANDBOX_TEST_OUTPUT_MAX_BYTES after the comparison.
+
+    Args:
+        test_case (dict): Test case in the format {"input": "...", "expected_output": "..."}.
+        run_output (str or None): stdout of the run, None if the sandbox call failed.
+        run_error (str or None): stderr of the run.
+        metrics (dict, optional): Timing and resource usage of the run, see get_run_metrics.
+
+    Returns:
+        dict: Test case result in the format stored in ExecutionResult.test_results.
+    """
+    expected_output = test_case.get("expected_output", "")
+    actual_output = run_output
+    if actual_output is None: # Sandbox API call failed for this test case
+        actual_output = ""
+        run_error = TEST_CASE_SANDBOX_ERROR
+
+    passed = False
+    if not run_error and actual_output.strip() == expected_output.strip():
+        passed = True
+
+    max_bytes = getattr(settings, 'SANDBOX_TEST_OUTPUT_MAX_BYTES', 8 * 1024)
+    return {
+        "test_case": test_case,
+        "actual_output": truncate_output(actual_output.strip(), max_bytes)[0],
+        "passed": passed,
+        "error": truncate_output(run_error.strip(), max_bytes)[0] if run_error else "",
+        "metrics": metrics
+    }
+
+
+def skip_test_case(test_case):
+    """Returns the test_results entry of a test case that was not run because an earlier one failed (fail-fast mode)."""
+    return {
+        "test_case": test_case,
+        "actual_output": "",
+        "passed": False,
+        "skipped": True,
+        "error": ""
+    }
+
+
+def is_fail_fast(execution_request):
+    """Returns True if test evaluation should stop at the first failure, set per request or per exercise."""
+    exercise = execution_request.exercise
+    return bool(execution_request.fail_fast or (exercise is not None and exercise.fail_fast))
+
+
+def run_test_case(execution_request, sandbox_type, test_case):
+    """
+    Executes one test case and compares the program output with the expected output.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        sandbox_type (str): 'piston', 'custom' or 'local'.
+        test_case (dict): Test case in the format {"input": "...", "expected_output": "..."}.
+
+    Returns:
+        dict: Test case result in the format stored in ExecutionResult.test_results.
+    """
+    test_input = test_case.get("input", "")
+    logger.debug(f"run_test_case: Executing test case: Input='{log_preview(test_input)}', Expected Output='{log_preview(test_case.get('expected_output', ''))}'")
+
+    test_compile_output, test_compile_error, test_run_output, test_run_error, test_metrics = execute_in_sandbox(sandbox_type, execution_request, test_input=test_input)
+    return grade_test_case(test_case, test_run_output, test_run_error, test_metrics)
+
+
+def grade_batch(test_cases, batch):
+    """
+    Grades the runs of a harness job (see execute_piston_batch), whose first input was the standard run.
+
+    Returns:
+        tuple: Same as execute_with_test_cases; test cases the harness did not run are skipped.
+    """
+    compile_output, compile_error, runs = batch
+    standard_output, standard_error, standard_metrics = runs[0]
+    test_case_results = [
+        grade_test_case(test_case, run_output, run_error, metrics)
+        for test_case, (run_output, run_error, metrics) in zip(test_cases, runs[1:])
+    ]
+    test_case_results += [skip_test_case(test_case) for test_case in test_cases[len(runs) - 1:]] # Not run by the harness
+    return (compile_output, compile_error, standard_output, standard_error, standard_metrics), test_case_results
+
+
+def publish_results(request_id, standard_outputs, test_case_results, cached=False):
+    """Publishes the 'standard_output' and 'test_case' events of outcomes that were all available at once."""
+    publish_event(request_id, 'standard_output', standard_output_event_data(standard_outputs, cached=cached))
+    for index, result in enumerate(test_case_results):
+        publish_event(request_id, 'test_case', test_case_event_data(index, result, cached=cached))
+
+
+def get_test_case_concurrency(test_case_count):
+    """
+    Returns the number of worker threads to use for one execution request.
+
+    The limit is read from settings.SANDBOX_TEST_CASE_CONCURRENCY and is applied per request,
+    so a single submission never holds more than that many sandbox calls open at once.
+    """
+    limit = max(1, getattr(settings, 'SANDBOX_TEST_CASE_CONCURRENCY', 4))
+    return max(1, min(limit, test_case_count))
+
+
+def get_batch_inputs(execution_request, sandbox_type, test_cases):
+    """
+    Returns the stdin of every run when an execution is sent as one Piston harness job (standard run
+    first, then each test case), or None when its runs are sent one call each.
+    """
+    if sandbox_type != 'piston' or not test_cases or not getattr(settings, 'PISTON_BATCH_TEST_CASES', False):
+        return None
+    return [execution_request.stdin or ''] + [test_case.get("input", "") for test_case in test_cases]
+
+
+def execute_with_test_cases(execution_request, sandbox_type, test_cases):
+    """
+    Runs the standard execution and all test cases.
+
+    With settings.PISTON_BATCH_TEST_CASES enabled, Piston submissions are sent as a single harness
+    job (see harness.py). Otherwise, or if the batched job fails, the runs are fanned out
+    concurrently on a bounded thread pool.
+
+    The standard run and every test case are independent sandbox calls, so they are fanned out
+    together instead of being issued one after another. Results are collected in submission
+    order, so test_results always lists test cases in the same order as Exercise.test_cases.
+
+    In fail-fast mode (see is_fail_fast), test cases still waiting for a worker are cancelled as soon
+    as one test case fails, and are reported with "skipped": True. Test cases already running finish
+    and keep their real result.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        sandbox_type (str): 'piston', 'custom' or 'local'.
+        test_cases (list): Test cases of the exercise (may be empty).
+
+    Returns:
+        tuple: ((compile_output, compile_error, run_output, run_error, metrics), test_case_results)
+    """
+    test_cases = test_cases or []
+    fail_fast = is_fail_fast(execution_request)
+
+    inputs = get_batch_inputs(execution_request, sandbox_type, test_cases)
+    if inputs is not None:
+        # One Piston job for the standard run and all test cases
+        batch = execute_piston_batch(execution_request, inputs, stop_on_error_from=1 if fail_fast else None)
+        if batch is not None:
+            standard_outputs, test_case_results = grade_batch(test_cases, batch)
+            publish_results(execution_request.id, standard_outputs, test_case_results)
+            return standard_outputs, test_case_results
+        logger.warning(f"execute_with_test_cases: Batched execution failed for request ID '{execution_request.id}', falling back to one call per test case")
+
+    max_workers = get_test_case_concurrency(len(test_cases) + 1)
+    logger.debug(f"execute_with_test_cases: Running request ID '{execution_request.id}' with {len(test_cases)} test case(s), concurrency={max_workers}")
+
+    def publish_standard_output(future):
+        if not future.cancelled() and future.exception() is None:
+            publish_event(execution_request.id, 'standard_output', standard_output_event_data(future.result()))
+
+    def publish_test_case(index, test_case):
+        def callback(future): # Runs as soon as the test case finishes, in completion order
+            if future.cancelled():
+                publish_event(execution_request.id, 'test_case', test_case_event_data(index, skip_test_case(test_case)))
+            elif future.exception() is None:
+                publish_event(execution_request.id, 'test_case', test_case_event_data(index, future.result()))
+        return callback
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sandbox-exec") as executor:
+        # Each call runs in a copy of this context, so the circuit breaker sees which execution it belongs to
+        standard_future = executor.submit(contextvars.copy_context().run, execute_in_sandbox, sandbox_type, execution_request)
+        standard_future.add_done_callback(publish_standard_output)
+        test_case_futures = [
+            executor.submit(contextvars.copy_context().run, run_test_case, execution_request, sandbox_type, test_case)
+            for test_case in test_cases
+        ]
+        for index, (test_case, future) in enumerate(zip(test_cases, test_case_futures)):
+            future.add_done_callback(publish_test_case(index, test_case))
+        if fail_fast:
+            for future in as_completed(test_case_futures):
+                if not future.cancelled() and not future.result()["passed"]:
+                    cancelled = sum(1 for pending in test_case_futures if pending.cancel()) # Stop scheduling the rest
+                    logger.debug(f"execute_with_test_cases: Fail-fast for request ID '{execution_request.id}', {cancelled} test case(s) skipped")
+                    break
+        standard_outputs = standard_future.result()
+        test_case_results = [
+            skip_test_case(test_case) if future.cancelled() else future.result()
+            for test_case, future in zip(test_cases, test_case_futures)
+        ] # Preserve test case order
+
+    return standard_outputs, test_case_results
+
+
+def get_language_version(sandbox_type):
+    """Returns the language/version identifier of a sandbox backend, used in result cache keys."""
+    if sandbox_type == 'piston':
+        return f"{PISTON_LANGUAGE}-{PISTON_VERSION}"
+    if sandbox_type == LOCAL_BACKEND:
+        return f"{LOCAL_BACKEND}-{getattr(settings, 'LOCAL_SANDBOX_PYTHON', None) or 'python3'}" # Changes with the interpreter
+    return sandbox_type
+
+
+def execute_admitted(execution_request, sandbox_type, test_cases):
+    """
+    Runs execute_with_test_cases while holding one of the backend's admission slots. All its sandbox
+    calls share one execution_scope(), so a half-open circuit admits them as a single trial.
+    """
+    with execution_scope(execution_request.id):
+        if not getattr(settings, 'SANDBOX_ADMISSION_CONTROL_ENABLED', True):
+            return execute_with_test_cases(execution_request, sandbox_type, test_cases)
+        with get_admission_controller(sandbox_type).admit():
+            return execute_with_test_cases(execution_request, sandbox_type, test_cases)
+
+
+def use_result_cache(use_cache=True):
+    """Returns True if an execution may be served from (and stored in) the result cache."""
+    return use_cache and getattr(settings, 'SANDBOX_RESULT_CACHE_ENABLED', True)
+
+
+def get_cached_outcome(execution_request, sandbox_type):
+    """
+    Looks up the outcome of an identical earlier execution in the result cache.
+
+    Returns:
+        tuple: (cache_key, outcome) where outcome is None on a cache miss.
+    """
+    cache_key = make_cache_key(execution_request, sandbox_type, get_language_version(sandbox_type), fail_fast=is_fail_fast(execution_request))
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Execution request ID '{execution_request.id}' served from result cache (key {cache_key[:12]}).")
+    return cache_key, cached
+
+
+def cache_outcome(cache_key, execution_request, outcome):
+    """Stores an execution outcome in the result cache, unless one of its sandbox calls failed."""
+    if not sandbox_call_failed(*outcome):
+        result_cache.set(cache_key, outcome, exercise_id=execution_request.exercise_id)
+
+
+def execute_with_result_cache(execution_request, sandbox_type, test_cases, use_cache=True):
+    """
+    Wraps execute_with_test_cases with the content-addressed result cache from cache.py.
+
+    Only outcomes where every sandbox call succeeded are cached, so a transient sandbox failure is
+    never replayed to later submissions. Cache misses go through the backend's admission control.
+    Cache hits carry the metrics of the runs that produced them, their ExecutionResult is flagged
+    as cached so analytics do not count those runs twice.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        sandbox_type (str): 'piston', 'custom' or 'local'.
+        test_cases (list): Test cases of the exercise (may be empty).
+        use_cache (bool): False to bypass the cache for this execution.
+
+    Returns:
+        tuple: (outcome, cached) where outcome is the same as the return value of
+               execute_with_test_cases and cached is True if it was served from the cache.
+
+    Raises:
+        SandboxUnavailable: If the backend is saturated or its circuit is open.
+    """
+    if not use_result_cache(use_cache):
+        return execute_admitted(execution_request, sandbox_type, test_cases), False
+
+    cache_key, cached = get_cached_outcome(execution_request, sandbox_type)
+    if cached is not None:
+        publish_results(execution_request.id, *cached, cached=True)
+        return cached, True
+
+    outcome = execute_admitted(execution_request, sandbox_type, test_cases)
+    cache_outcome(cache_key, execution_request, outcome)
+    return outcome, False
+
+
+def sandbox_call_failed(standard_outputs, test_case_results):
+    """Returns True if any sandbox call of an execution failed; such outcomes are never cached."""
+    return all(output is None for output in standard_outputs) or any(
+        result.get("error") == TEST_CASE_SANDBOX_ERROR for result in test_case_results
+    )
+
+
+def get_sandbox_type(execution_request):
+    """Returns the sandbox backend of an ExecutionRequest: 'custom' or 'local' if its exercise asks for it, else 'piston'."""
+    current_exercise = execution_request.exercise
+    sandbox_type = current_exercise.sandbox if current_exercise else 'piston' # Default to piston if no exercise
+    return sandbox_type if sandbox_type in ('custom', LOCAL_BACKEND) else 'piston'
+
+
+def get_standard_failure_message(sandbox_type):
+    """Returns the ExecutionResult error stored when the standard run could not reach the sandbox."""
+    if sandbox_type == 'piston':
+        return "Failed to execute code with Piston API (standard execution)."
+    if sandbox_type == LOCAL_BACKEND:
+        return "Failed to execute code with the local sandbox (standard execution)."
+    return "Failed to execute code with Custom Sandbox API (standard execution)."
+
+
+def get_final_status(execution_request, compile_error, run_error, test_cases, test_case_results):
+    """Returns the final status ('completed' or 'failed') of an execution whose sandbox calls succeeded."""
+    if compile_error:
+        logger.warning(f"Piston execution request ID '{execution_request.id}' failed due to compile error: {log_preview(compile_error)}")
+        return 'failed'
+    if run_error:
+        logger.warning(f"Sandbox execution request ID '{execution_request.id}' failed due to runtime error: {log_preview(run_error)}")
+        return 'failed'
+    if test_cases and not all(result['passed'] for result in test_case_results): # Check test case failures
+        logger.warning(f"Execution request ID '{execution_request.id}' failed because one or more test cases failed.")
+        return 'failed'
+    logger.info(f"Sandbox execution request ID '{execution_request.id}' completed successfully.")
+    return 'completed'
+
+
+def get_test_cases(execution_request):
+    """Returns the test cases run against an ExecutionRequest: those of its exercise, if any."""
+    exercise = execution_request.exercise
+    return (exercise.test_cases or []) if exercise else []
+
+
+def mark_running(execution_request):
+    """
+    Sets a request to 'running' unless a worker already claimed it (see jobs.py).
+
+    Returns:
+        list: The fields to save, empty if nothing changed.
+    """
+    if execution_request.status == 'running':
+        return []
+    execution_request.status = 'running'
+    execution_request.started_at = timezone.now()
+    return ['status', 'started_at']
+
+
+def mark_deferred(execution_request):
+    """
+    Puts a queued job refused by the sandbox back to 'pending', it stays in the queue for a later attempt.
+
+    Returns:
+        list: The fields to save.
+    """
+    execution_request.status = 'pending'
+    execution_request.started_at = None
+    return ['status', 'started_at']
+
+
+def build_failure_result(execution_request, error):
+    """Marks a request as failed and returns its (unsaved) error ExecutionResult."""
+    execution_request.status = 'failed'
+    return ExecutionResult(request=execution_request, output="Execution failed.", error=str(error))
+
+
+def build_execution_result(execution_request, sandbox_type, outcome, test_cases, cached=False):
+    """
+    Builds the ExecutionResult of an execution and sets the final status of its request.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        sandbox_type (str): 'piston', 'custom' or 'local'.
+        outcome (tuple): Same as the return value of execute_with_test_cases.
+        test_cases (list): Test cases of the exercise (may be empty).
+        cached (bool): True if the outcome was served from the result cache.
+
+    Returns:
+        tuple: (execution_result, execution_success) where execution_result is not saved yet and
+               execution_success is False when the standard run could not reach the sandbox.
+    """
+    (compile_output, compile_error, run_output, run_error, metrics), test_case_results = outcome
+    if compile_output is None and compile_error is None and run_output is None and run_error is None:
+        error_message = get_standard_failure_message(sandbox_type)
+        logger.error(f"Execution request ID '{execution_request.id}' failed: {error_message}")
+        return build_failure_result(execution_request, error_message), False
+
+    execution_request.status = get_final_status(execution_request, compile_error, run_error, test_cases, test_case_results)
+    execution_result = ExecutionResult(
+        request=execution_request,
+        output=run_output,
+        error=compile_error or run_error, # Compile error first
+        test_results=test_case_results if test_cases else None,
+        cached=cached,
+        **aggregate_metrics(metrics, test_case_results) # Aggregated timing and resource usage
+    )
+    return execution_result, True
+
+
+def get_finished_event_data(execution_request, execution_result, success):
+    """Returns the data of the 'finished' event of an execution."""
+    return {"status": execution_request.status, "result_id": execution_result.id, "success": success}
+
+
+def finish_execution(execution_request, execution_result, success):
+    """
+    Saves the result of an execution and the final status of its request (in that order, so a final
+    status always has its result), then publishes 'finished' and sends execution_finished.
+
+    Returns:
+        ExecutionResult: The saved result.
+    """
+    execution_result.save()
+    execution_request.save(update_fields=['status'])
+    logger.debug(f"finish_execution: ExecutionResult id={execution_result.id}, request ID '{execution_request.id}' is {execution_request.status}")
+    publish_event(execution_request.id, 'finished', get_finished_event_data(execution_request, execution_result, success))
+    execution_finished.send(sender=ExecutionRequest, execution_request=execution_request, execution_result=execution_result, success=success)
+    return execution_result
+
+
+def fail_refused_request(execution_request, error):
+    """
+    Marks a synchronous request refused by the sandbox (SandboxUnavailable) as failed with an error
+    result, so the result endpoints give a final answer instead of reporting it pending forever.
+
+    Returns:
+        ExecutionResult: The error result.
+    """
+    return finish_execution(execution_request, build_failure_result(execution_request, error), False)
+
+
+def process_execution_request(execution_request, use_cache=True):
+    """
+    Executes an ExecutionRequest end to end: standard run, test cases, ExecutionResult and status update.
+
+    Used both by ExecutionRequestAPIView for synchronous requests and by the background workers in
+    jobs.py for queued requests. Sends the execution_finished signal once the request is final.
+
+    Args:
+        execution_request (ExecutionRequest): The execution request object.
+        use_cache (bool): False to bypass the execution result cache.
+
+    Returns:
+        tuple: (execution_result, execution_success) where execution_success is False when the
+               sandbox API itself could not be reached.
+
+    Raises:
+        SandboxUnavailable: If the sandbox refused the execution (open circuit or too many executions
+                            in flight). A queued job is put back to 'pending' for a later attempt;
+                            any other request is marked 'failed' with an error result (see
+                            fail_refused_request) and can be run again as a new request (existing_request_id).
+    """
+    update_fields = mark_running(execution_request)
+    if update_fields:
+        execution_request.save(update_fields=update_fields)
+    publish_event(execution_request.id, 'started')
+
+    sandbox_type = get_sandbox_type(execution_request)
+    test_cases = get_test_cases(execution_request)
+    logger.debug(f"process_execution_request: Executing request ID '{execution_request.id}' with {sandbox_type} sandbox, {len(test_cases)} test case(s)")
+    try:
+        outcome, cached = execute_with_result_cache(execution_request, sandbox_type, test_cases, use_cache=use_cache)
+    except SandboxUnavailable as e:
+        logger.warning(f"Execution request ID '{execution_request.id}' rejected by the {e.backend} sandbox: {e}")
+        if execution_request.queued_at is None:
+            fail_refused_request(execution_request, e)
+            raise
+        execution_request.save(update_fields=mark_deferred(execution_request))
+        publish_event(execution_request.id, 'deferred', {"reason": str(e), "retry_after": e.retry_after})
+        raise
+
+    execution_result, execution_success = build_execution_result(execution_request, sandbox_type, outcome, test_cases, cached=cached)
+    return finish_execution(execution_request, execution_result, execution_success), execution_success
@@ -0,0 +1,322 @@
+"""
+Pre-warmed interpreter pool for the local sandbox (see local.py).
+
+Starting a Python interpreter and importing a few stdlib modules costs tens of milliseconds, more than
+most student programs take to run. The pool keeps `size` worker processes ready. Each one is an
+isolated interpreter (`python -I -S`) that has already imported LOCAL_SANDBOX_PRELOAD_MODULES and acts
+as a small fork server:
+
+1. it forks a child in advance and reports "ready <pid>";
+2. the child blocks until it receives a job, applies the job's rlimits, redirects stdin/stdout/stderr
+   to files in the job's scratch directory and runs the code as __main__ in a fresh module;
+3. the worker reaps the child and reports its exit status and resource usage;
+4. it forks the next child, until it has served `max_jobs` jobs and exits.
+
+Every job therefore runs in its own fresh process, but neither interpreter startup, imports nor the
+fork happen on the request path. Workers that are returned, retired or died are replaced by a
+background thread. Spawn latency (the cost a cold start would have paid) and acquire latency (what
+requests actually waited for a worker) are kept for p50/p99 reporting.
+"""
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("sandbox")
+
+LATENCY_SAMPLES = 1000
+
+WORKER_SOURCE = r'''
+import json, os, sys, traceback, types
+import resource
+
+for name in sys.argv[1].split(","):
+    if name:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+MAX_JOBS = int(sys.argv[2])
+control_in, control_out = sys.stdin.buffer, sys.stdout.buffer
+
+
+def run_job(job):
+    os.setsid()
+    os.environ.update(job["env"])
+    for limit_resource, limit in job["rlimits"]:
+        resource.setrlimit(limit_resource, (limit, limit))
+    os.chdir(job["workdir"])
+    for fd, name, flags in ((0, ".stdin", os.O_RDONLY), (1, ".stdout", os.O_WRONLY | os.O_CREAT | os.O_TRUNC), (2, ".stderr", os.O_WRONLY | os.O_CREAT | os.O_TRUNC)):
+        target = os.open(name, flags, 0o600)
+        os.dup2(target, fd)
+        os.close(target)
+    sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+    sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="backslashreplace", closefd=False, buffering=1)
+    if "random" in sys.modules:
+        sys.modules["random"].seed() # Do not share the pre-imported generator state between jobs
+    path = os.path.join(job["workdir"], job["entry"])
+    sys.argv = [path, *job["args"]]
+    sys.path.insert(0, job["workdir"])
+    main = types.ModuleType("__main__")
+    main.__file__ = path
+    sys.modules["__main__"] = main
+    code = 0
+    try:
+        with open(path, encoding="utf-8") as handle:
+            source = handle.read()
+        exec(compile(source, path, "exec"), main.__dict__)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next) # Hide this runner's frame
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        code = code or 120
+    os._exit(code)
+
+
+def prefork():
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as pipe:
+            data = pipe.read()
+        if not data:
+            os._exit(0)
+        run_job(json.loads(data))
+    os.close(read_fd)
+    return pid, os.fdopen(write_fd, "wb")
+
+
+for _ in range(MAX_JOBS):
+    pid, job_pipe = prefork()
+    control_out.write(b"ready %d\n" % pid)
+    control_out.flush()
+    line = control_in.readline()
+    if not line:
+        job_pipe.close() # The child reads EOF and exits
+        os.waitpid(pid, 0)
+        break
+    job_pipe.write(line)
+    job_pipe.close()
+    _, status, usage = os.wait4(pid, 0)
+    control_out.write(json.dumps({"status": status, "cpu_time": usage.ru_utime + usage.ru_stime, "memory": usage.ru_maxrss}).encode() + b"\n")
+    control_out.flush()
+'''
+
+
+def percentile(samples, fraction):
+    """Returns the given percentile (0..1) of a list of numbers, or None if it is empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class WarmWorker:
+    """One fork-server worker process and the child it has forked for the next job."""
+
+    def __init__(self, command, env, cwd):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, cwd=cwd, start_new_session=True)
+        self.child_pid = None
+        self.jobs = 0
+
+    def await_ready(self):
+        """Waits for the worker's next pre-forked child. Returns False if the worker has exited."""
+        line = self.process.stdout.readline()
+        if not line.startswith(b"ready "):
+            return False
+        self.child_pid = int(line.split()[1])
+        return True
+
+    def run(self, job, timeout):
+        """
+        Runs one job in the pre-forked child, killing the child's process group after `timeout` seconds.
+
+        Returns:
+            tuple: ({"status", "cpu_time", "memory"}, timed_out), or (None, False) if the worker died.
+        """
+        timed_out = threading.Event()
+        child_pid = self.child_pid
+
+        def kill_child():
+            timed_out.set()
+            for kill in (lambda: os.killpg(child_pid, signal.SIGKILL), lambda: os.kill(child_pid, signal.SIGKILL)):
+                try:
+                    kill() # The process group exists once the child has called setsid()
+                    break
+                except (ProcessLookupError, PermissionError):
+                    continue
+
+        timers = [threading.Timer(timeout, kill_child), threading.Timer(timeout + 5, self.process.kill)] # The worker itself should never hang
+        for timer in timers:
+            timer.start()
+        try:
+            self.process.stdin.write(json.dumps(job).encode() + b"\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        except (BrokenPipeError, OSError):
+            line = b""
+        finally:
+            for timer in timers:
+                timer.cancel()
+        self.jobs += 1
+        self.child_pid = None
+        if not line:
+            return None, False
+        return json.loads(line), timed_out.is_set()
+
+    def close(self):
+        """Stops the worker: EOF on its control pipe makes it exit, a kill follows if it does not."""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class WarmWorkerPool:
+    """Keeps `size` warm workers ready and replaces them in a background thread."""
+
+    def __init__(self, command, env, cwd=None, size=4, max_jobs=50):
+        self.command = command
+        self.env = env
+        self.cwd = cwd
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle = queue.Queue()
+        self._returned = queue.Queue()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._alive = 0
+        self.spawned = 0
+        self.retired = 0
+        self.warm_hits = 0
+        self.misses = 0
+        self.spawn_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.acquire_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._thread = threading.Thread(target=self._maintain, name="local-sandbox-pool", daemon=True)
+        self._thread.start()
+
+    def acquire(self, timeout):
+        """
+        Returns a warm worker, waiting up to `timeout` seconds for the pool to refill.
+
+        Returns:
+            WarmWorker or None: None if no worker became ready in time (the caller then starts cold).
+        """
+        started = time.monotonic()
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            self._wakeup.set()
+            try:
+                worker = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    self.misses += 1
+                return None
+        with self._lock:
+            self.warm_hits += 1
+            self.acquire_latencies.append(time.monotonic() - started)
+        return worker
+
+    def release(self, worker, healthy=True):
+        """Hands a worker back after a job; it is re-admitted once its next child is ready, or retired."""
+        if healthy and worker.jobs < self.max_jobs:
+            self._returned.put(worker)
+        else:
+            self._retire(worker)
+        self._wakeup.set()
+
+    def _retire(self, worker):
+        worker.close()
+        with self._lock:
+            self._alive -= 1
+            self.retired += 1
+
+    def _spawn(self):
+        started = time.monotonic()
+        try:
+            worker = WarmWorker(self.command, self.env, self.cwd)
+        except OSError as e:
+            logger.error(f"WarmWorkerPool: Could not start a worker: {e}")
+            return False
+        with self._lock:
+            self._alive += 1
+            self.spawned += 1
+        if not worker.await_ready():
+            logger.error("WarmWorkerPool: A new worker exited before it was ready")
+            self._retire(worker)
+            return False
+        with self._lock:
+            self.spawn_latencies.append(time.monotonic() - started)
+        self._idle.put(worker)
+        return True
+
+    def _maintain(self):
+        while not self._stopped.is_set():
+            while True: # Re-admit workers whose next child is ready
+                try:
+                    worker = self._returned.get_nowait()
+                except queue.Empty:
+                    break
+                if worker.await_ready():
+                    self._idle.put(worker)
+                else:
+                    self._retire(worker)
+            while not self._stopped.is_set() and self._alive < self.size:
+                if not self._spawn():
+                    self._stopped.wait(1) # Back off instead of spinning on a broken interpreter
+                    break
+            self._wakeup.wait(0.5)
+            self._wakeup.clear()
+
+    def stop(self):
+        """Stops the maintenance thread and all idle workers."""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        for pending in (self._idle, self._returned):
+            while True:
+                try:
+                    self._retire(pending.get_nowait())
+                except queue.Empty:
+                    break
+
+    def stats(self):
+        with self._lock:
+            spawn, acquire = list(self.spawn_latencies), list(self.acquire_latencies)
+            return {
+                "size": self.size,
+                "max_jobs": self.max_jobs,
+                "alive": self._alive,
+                "idle": self._idle.qsize(),
+                "spawned": self.spawned,
+                "retired": self.retired,
+                "warm_hits": self.warm_hits,
+                "misses": self.misses,
+                "spawn_latency_ms": {"p50": _ms(percentile(spawn, 0.5)), "p99": _ms(percentile(spawn, 0.99))},
+                "acquire_latency_ms": {"p50": _ms(percentile(acquire, 0.5)), "p99": _ms(percentile(acquire, 0.99))},
+            }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
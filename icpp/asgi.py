@@ -3,6 +3,10 @@ ASGI config for icpp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn icpp.asgi:application``) so the async
+execution event streams in apps/sandbox/streams.py and the native async execution views
+(the ``async/`` routes of the sandbox and progress apps) do not each tie up a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
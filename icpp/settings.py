@@ -1,4 +1,5 @@
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import timedelta
@@ -143,6 +144,151 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Cache. The default local-memory cache is per process; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# cache (e.g. django.core.cache.backends.redis.RedisCache, redis://localhost:6379/1) when running
+# several app processes, so execution rate and concurrency limits are enforced across all of them.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "icpp-default"),
+    }
+}
+
+# Execution limits (apps/common/throttling.py), applied per user, per role (shared by all users of
+# that role) and globally. Rate limits are token buckets: burst capacity and tokens regained per second.
+EXECUTION_LIMITS_ENABLED = os.getenv("EXECUTION_LIMITS_ENABLED", "True") == "True"
+EXECUTION_RATE_LIMITS = {
+    "user": {
+        "capacity": int(os.getenv("EXECUTION_RATE_USER_BURST", 10)),
+        "refill_rate": float(os.getenv("EXECUTION_RATE_USER_PER_SECOND", 0.5)),
+    },
+    "role": {
+        "student": {
+            "capacity": int(os.getenv("EXECUTION_RATE_STUDENT_BURST", 200)),
+            "refill_rate": float(os.getenv("EXECUTION_RATE_STUDENT_PER_SECOND", 20)),
+        },
+    },
+    "global": {
+        "capacity": int(os.getenv("EXECUTION_RATE_GLOBAL_BURST", 400)),
+        "refill_rate": float(os.getenv("EXECUTION_RATE_GLOBAL_PER_SECOND", 40)),
+    },
+}
+# Maximum executions running at the same time
+EXECUTION_CONCURRENCY_LIMITS = {
+    "user": int(os.getenv("EXECUTION_CONCURRENCY_USER", 2)),
+    "role": {
+        "student": int(os.getenv("EXECUTION_CONCURRENCY_STUDENT", 40)),
+    },
+    "global": int(os.getenv("EXECUTION_CONCURRENCY_GLOBAL", 60)),
+}
+EXECUTION_SLOT_TIMEOUT = int(os.getenv("EXECUTION_SLOT_TIMEOUT", 300))  # Seconds before a leaked slot counter expires
+EXECUTION_SLOT_RETRY_AFTER = int(os.getenv("EXECUTION_SLOT_RETRY_AFTER", 2))  # Retry-After sent when no slot is free
+
+# Sandbox execution
+# Maximum number of sandbox calls a single execution request may have in flight at once
+SANDBOX_TEST_CASE_CONCURRENCY = int(os.getenv("SANDBOX_TEST_CASE_CONCURRENCY", 4))
+# Run the standard execution and all test cases of a Piston submission as one harness job.
+# The harness output grows with the number of tests, so the Piston server's PISTON_OUTPUT_MAX_SIZE and
+# run_timeout limits must allow it; if the job is cut short, execution falls back to one call per test.
+PISTON_BATCH_TEST_CASES = os.getenv("PISTON_BATCH_TEST_CASES", "False") == "True"
+PISTON_BATCH_TEST_TIMEOUT = float(os.getenv("PISTON_BATCH_TEST_TIMEOUT", 3.0))  # Seconds per run inside the harness
+PISTON_BATCH_RUN_TIMEOUT = int(os.getenv("PISTON_BATCH_RUN_TIMEOUT", 0))  # Milliseconds for the whole harness job; 0 derives it from the test timeout and run count
+PISTON_BATCH_RUN_TIMEOUT_MAX = int(os.getenv("PISTON_BATCH_RUN_TIMEOUT_MAX", 30000))  # Cap of the derived timeout, keep within the Piston server's run_timeout limit
+# In-process cache of execution outcomes keyed by (code, stdin, args, sandbox, language version, test cases)
+SANDBOX_RESULT_CACHE_ENABLED = os.getenv("SANDBOX_RESULT_CACHE_ENABLED", "True") == "True"
+SANDBOX_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("SANDBOX_RESULT_CACHE_MAX_ENTRIES", 1024))
+SANDBOX_RESULT_CACHE_TTL = int(os.getenv("SANDBOX_RESULT_CACHE_TTL", 600))  # Seconds
+# Share one sandbox call between concurrent requests with an identical payload
+SANDBOX_SINGLE_FLIGHT_ENABLED = os.getenv("SANDBOX_SINGLE_FLIGHT_ENABLED", "True") == "True"
+# Sandbox nodes per backend type. Comma-separated URLs in PISTON_NODE_URLS / CUSTOM_SANDBOX_NODE_URLS
+# add nodes (all with weight 1); edit this dict directly for per-node weights or health URLs. Nodes
+# without a health_url are not probed, they recover from real traffic after the ejection cooldown.
+SANDBOX_NODES = {
+    "piston": [
+        {"url": url.strip(), "health_url": url.strip().replace("/execute", "/runtimes"), "weight": 1}
+        for url in os.getenv("PISTON_NODE_URLS", "http://localhost:2000/api/v2/execute").split(",") if url.strip()
+    ],
+    "custom": [
+        {"url": url.strip(), "weight": 1}
+        for url in os.getenv("CUSTOM_SANDBOX_NODE_URLS", "http://localhost:2001/execute").split(",") if url.strip()
+    ],
+}
+SANDBOX_ROUTING_STRATEGY = os.getenv("SANDBOX_ROUTING_STRATEGY", "least_outstanding")  # or "weighted_round_robin"
+SANDBOX_HEALTH_CHECK_INTERVAL = float(os.getenv("SANDBOX_HEALTH_CHECK_INTERVAL", 10))  # Seconds, 0 disables active probing
+SANDBOX_HEALTH_CHECK_TIMEOUT = float(os.getenv("SANDBOX_HEALTH_CHECK_TIMEOUT", 2))
+SANDBOX_NODE_FAILURE_THRESHOLD = int(os.getenv("SANDBOX_NODE_FAILURE_THRESHOLD", 3))  # Consecutive failures before ejection
+SANDBOX_NODE_RECOVERY_THRESHOLD = int(os.getenv("SANDBOX_NODE_RECOVERY_THRESHOLD", 2))  # Consecutive good probes (or calls, for unprobed nodes) before re-admission
+SANDBOX_NODE_EJECTION_COOLDOWN = float(os.getenv("SANDBOX_NODE_EJECTION_COOLDOWN", 30))  # Seconds before an unprobed ejected node gets traffic again
+# Circuit breaker per backend: opens when the error rate or slow call rate over the last calls is too high
+SANDBOX_CIRCUIT_BREAKER_ENABLED = os.getenv("SANDBOX_CIRCUIT_BREAKER_ENABLED", "True") == "True"
+SANDBOX_CIRCUIT_WINDOW_SIZE = int(os.getenv("SANDBOX_CIRCUIT_WINDOW_SIZE", 20))  # Calls kept in the sliding window
+SANDBOX_CIRCUIT_MIN_CALLS = int(os.getenv("SANDBOX_CIRCUIT_MIN_CALLS", 10))  # Calls needed before the rates are evaluated
+SANDBOX_CIRCUIT_ERROR_RATE = float(os.getenv("SANDBOX_CIRCUIT_ERROR_RATE", 0.5))
+SANDBOX_CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("SANDBOX_CIRCUIT_SLOW_CALL_SECONDS", 10))
+SANDBOX_CIRCUIT_SLOW_CALL_RATE = float(os.getenv("SANDBOX_CIRCUIT_SLOW_CALL_RATE", 0.8))
+SANDBOX_CIRCUIT_OPEN_SECONDS = float(os.getenv("SANDBOX_CIRCUIT_OPEN_SECONDS", 30))  # Cool-down before trial calls
+SANDBOX_CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("SANDBOX_CIRCUIT_HALF_OPEN_CALLS", 3))  # Successful trial executions needed to close
+# Admission control: executions per backend and process, beyond which requests wait briefly or get a 503
+SANDBOX_ADMISSION_CONTROL_ENABLED = os.getenv("SANDBOX_ADMISSION_CONTROL_ENABLED", "True") == "True"
+SANDBOX_MAX_CONCURRENT_EXECUTIONS = int(os.getenv("SANDBOX_MAX_CONCURRENT_EXECUTIONS", 8))
+SANDBOX_MAX_QUEUED_EXECUTIONS = int(os.getenv("SANDBOX_MAX_QUEUED_EXECUTIONS", 16))
+SANDBOX_ADMISSION_TIMEOUT = float(os.getenv("SANDBOX_ADMISSION_TIMEOUT", 10))  # Seconds a queued execution waits for a slot
+# HTTP client used for sandbox backends (one pooled keep-alive session per backend)
+SANDBOX_HTTP_CONNECT_TIMEOUT = float(os.getenv("SANDBOX_HTTP_CONNECT_TIMEOUT", 3.05))
+SANDBOX_HTTP_READ_TIMEOUT = float(os.getenv("SANDBOX_HTTP_READ_TIMEOUT", 30))
+SANDBOX_HTTP_MAX_RETRIES = int(os.getenv("SANDBOX_HTTP_MAX_RETRIES", 2))
+SANDBOX_HTTP_BACKOFF_FACTOR = float(os.getenv("SANDBOX_HTTP_BACKOFF_FACTOR", 0.3))
+SANDBOX_HTTP_POOL_CONNECTIONS = int(os.getenv("SANDBOX_HTTP_POOL_CONNECTIONS", 4))  # Number of host pools kept per session
+SANDBOX_HTTP_POOL_MAXSIZE = int(os.getenv("SANDBOX_HTTP_POOL_MAXSIZE", 32))  # Keep-alive connections per host
+# Local sandbox backend (Exercise.sandbox = "local"): runs code in rlimited subprocesses on the app server.
+# Limits resources only; the code runs as the server's user, so isolate the server (container/user) before use.
+LOCAL_SANDBOX_PYTHON = os.getenv("LOCAL_SANDBOX_PYTHON", sys.executable)  # Interpreter that runs submissions
+LOCAL_SANDBOX_MAX_WORKERS = int(os.getenv("LOCAL_SANDBOX_MAX_WORKERS", 4))  # Runs executing at once per process
+LOCAL_SANDBOX_TIMEOUT = float(os.getenv("LOCAL_SANDBOX_TIMEOUT", 5))  # Wall-clock seconds per run (capped by the payload's run_timeout)
+LOCAL_SANDBOX_CPU_SECONDS = int(os.getenv("LOCAL_SANDBOX_CPU_SECONDS", 3))
+LOCAL_SANDBOX_MEMORY_MB = int(os.getenv("LOCAL_SANDBOX_MEMORY_MB", 256))  # Address space limit
+LOCAL_SANDBOX_FILE_SIZE_KB = int(os.getenv("LOCAL_SANDBOX_FILE_SIZE_KB", 1024))  # Largest file a run may write, stdout/stderr included
+LOCAL_SANDBOX_MAX_OPEN_FILES = int(os.getenv("LOCAL_SANDBOX_MAX_OPEN_FILES", 64))
+LOCAL_SANDBOX_MAX_PROCESSES = int(os.getenv("LOCAL_SANDBOX_MAX_PROCESSES", 64))  # RLIMIT_NPROC counts all processes of the user
+LOCAL_SANDBOX_TEMP_DIR = os.getenv("LOCAL_SANDBOX_TEMP_DIR") or None  # Parent of the per-run scratch directories
+# Warm pool: pre-started interpreters with these modules imported, each job runs in a fresh fork of one
+LOCAL_SANDBOX_POOL_SIZE = int(os.getenv("LOCAL_SANDBOX_POOL_SIZE", 4))  # 0 starts a new interpreter per run
+LOCAL_SANDBOX_MAX_JOBS_PER_WORKER = int(os.getenv("LOCAL_SANDBOX_MAX_JOBS_PER_WORKER", 50))  # Jobs before a worker is replaced
+LOCAL_SANDBOX_PRELOAD_MODULES = [
+    name.strip() for name in os.getenv(
+        "LOCAL_SANDBOX_PRELOAD_MODULES", "math,random,collections,itertools,functools,re,json,string,datetime,heapq,bisect"
+    ).split(",") if name.strip()
+]
+# Output capture: every stream of every run is capped, test_results entries keep less, large stored output is compressed
+SANDBOX_OUTPUT_MAX_BYTES = int(os.getenv("SANDBOX_OUTPUT_MAX_BYTES", 64 * 1024))  # Per stream (stdout/stderr) of each run
+SANDBOX_TEST_OUTPUT_MAX_BYTES = int(os.getenv("SANDBOX_TEST_OUTPUT_MAX_BYTES", 8 * 1024))  # Per stream stored in each test_results entry
+SANDBOX_OUTPUT_COMPRESS_MIN_BYTES = int(os.getenv("SANDBOX_OUTPUT_COMPRESS_MIN_BYTES", 1024))  # ExecutionResult.output/error at least this large are stored compressed
+# Execution history retention: `python manage.py archive_executions` moves expired rows to compressed JSONL files
+EXECUTION_RETENTION_DAYS = int(os.getenv("EXECUTION_RETENTION_DAYS", 90))  # Runs without a submission, 0 disables archival
+EXECUTION_SUBMISSION_RETENTION_DAYS = int(os.getenv("EXECUTION_SUBMISSION_RETENTION_DAYS", 0))  # Runs that graded a submission, 0 keeps them
+EXECUTION_ARCHIVE_DIR = os.getenv("EXECUTION_ARCHIVE_DIR", f"{BASE_DIR}/archive")
+EXECUTION_ARCHIVE_BATCH_SIZE = int(os.getenv("EXECUTION_ARCHIVE_BATCH_SIZE", 1000))  # Requests archived and deleted per transaction
+# Execution progress events (Server-Sent Events stream), stored in the cache configured in CACHES
+SANDBOX_EVENTS_ENABLED = os.getenv("SANDBOX_EVENTS_ENABLED", "True") == "True"
+SANDBOX_EVENTS_TTL = int(os.getenv("SANDBOX_EVENTS_TTL", 600))  # Seconds events are kept
+SANDBOX_EVENTS_POLL_INTERVAL = float(os.getenv("SANDBOX_EVENTS_POLL_INTERVAL", 0.5))  # Seconds between event log reads per stream
+SANDBOX_EVENTS_HEARTBEAT = float(os.getenv("SANDBOX_EVENTS_HEARTBEAT", 15))  # Seconds between keep-alive comments on idle streams
+SANDBOX_EVENTS_STREAM_TIMEOUT = float(os.getenv("SANDBOX_EVENTS_STREAM_TIMEOUT", 300))  # Maximum lifetime of one stream
+SANDBOX_EVENTS_TICKET_TTL = int(os.getenv("SANDBOX_EVENTS_TICKET_TTL", 60))  # Seconds a stream ticket can open its stream
+# Background execution workers (job mode). Run them with `python manage.py run_sandbox_workers`,
+# or set SANDBOX_EMBEDDED_WORKERS to run that many worker threads inside the web process.
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", 4))
+SANDBOX_EMBEDDED_WORKERS = int(os.getenv("SANDBOX_EMBEDDED_WORKERS", 0))
+SANDBOX_WORKER_POLL_INTERVAL = float(os.getenv("SANDBOX_WORKER_POLL_INTERVAL", 1.0))  # Seconds between queue polls when idle
+SANDBOX_WORKER_STALE_AFTER = int(os.getenv("SANDBOX_WORKER_STALE_AFTER", 300))  # Seconds before a running job is requeued
+# Compiled quiz answer keys, cached in process and in the cache configured in CACHES
+QUIZ_ANSWER_KEY_CACHE_TTL = int(os.getenv("QUIZ_ANSWER_KEY_CACHE_TTL", 3600))  # Seconds
+QUIZ_PAYLOAD_CACHE_TTL = int(os.getenv("QUIZ_PAYLOAD_CACHE_TTL", 3600))  # Seconds a rendered student quiz is kept
+QUIZ_ITEM_ANALYSIS_CACHE_TTL = int(os.getenv("QUIZ_ITEM_ANALYSIS_CACHE_TTL", 600))  # Seconds before item analysis is recomputed
+# Bulk quiz grading (POST /api/quiz/submit/bulk/ and `python manage.py grade_quiz_submissions`)
+QUIZ_BULK_MAX_SUBMISSIONS = int(os.getenv("QUIZ_BULK_MAX_SUBMISSIONS", 5000))  # Per API request
+QUIZ_BULK_BATCH_SIZE = int(os.getenv("QUIZ_BULK_BATCH_SIZE", 500))  # Rows per INSERT
+
 LOG_DIR = f'{BASE_DIR}/logs'
 
 if not os.path.exists(LOG_DIR):
@@ -225,5 +371,10 @@ LOGGING = {
             "level": "DEBUG",
             "propagate": False,
         },
+        "common": {
+            "handlers": ["applogs", "console"],
+            "level": "DEBUG",
+            "propagate": False,
+        },
     },
 }